@@ -0,0 +1,68 @@
+"""账号 IP 分配器"""
+
+import ipaddress
+
+from django.conf import settings
+
+from apps.network.allocators import AllocationError, RangeAllocator
+
+
+def parse_ip_pools(pools: list) -> list:
+    """解析地址池配置为整数区间
+
+    支持起止范围 (10.0.0.2-10.0.3.254) 与 CIDR (10.1.0.0/24，不含网络地址与广播地址)；
+    PROXY_LOCAL_IP 落在池内时将其排除。
+
+    Returns:
+        [(start, end), ...]
+    """
+    ranges = []
+    for pool in pools:
+        try:
+            if '/' in pool:
+                network = ipaddress.IPv4Network(pool, strict=False)
+                start, end = int(network.network_address), int(network.broadcast_address)
+                if network.num_addresses > 2:
+                    start, end = start + 1, end - 1
+            else:
+                first, _, last = pool.partition('-')
+                start = int(ipaddress.IPv4Address(first.strip()))
+                end = int(ipaddress.IPv4Address((last or first).strip()))
+        except ValueError as e:
+            raise AllocationError(f'无效的地址池配置: {pool} ({e})')
+        if start > end:
+            raise AllocationError(f'无效的地址池配置: {pool}')
+        ranges.append((start, end))
+
+    local_ip = int(ipaddress.IPv4Address(settings.PROXY_LOCAL_IP))
+    result = []
+    for start, end in ranges:
+        if start <= local_ip <= end:
+            result.extend(r for r in ((start, local_ip - 1), (local_ip + 1, end)) if r[0] <= r[1])
+        else:
+            result.append((start, end))
+    return result
+
+
+class IPAllocator(RangeAllocator):
+    """账号 IP 分配器
+
+    以整数形式在数据库端查找空闲地址 (inet 减 0.0.0.0)，按 PROXY_IP_POOLS 顺序分配；
+    批量创建时可优先分配一整段连续地址。
+    """
+
+    table = 'l2tp_accounts'
+    # IPv6 地址不参与计算 (CASE 结果为 NULL，不落入任何区间)
+    column = "CASE WHEN family(assigned_ip) = 4 THEN assigned_ip - '0.0.0.0'::inet END"
+    lock_name = 'allocator:account_ip'
+
+    def ranges(self) -> list:
+        return parse_ip_pools(settings.PROXY_IP_POOLS)
+
+    def allocate(self, count: int = 1, contiguous: bool = False) -> list:
+        """分配 count 个空闲 IP（须在事务中调用）
+
+        Returns:
+            IP 字符串列表；地址池不足时返回全部剩余
+        """
+        return [str(ipaddress.IPv4Address(value)) for value in super().allocate(count, contiguous)]
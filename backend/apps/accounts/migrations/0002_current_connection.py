@@ -0,0 +1,34 @@
+# Generated manually
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_current_connection(apps, schema_editor):
+    """按现有在线连接回填当前连接（同一账号取最近一次上线）"""
+    L2TPAccount = apps.get_model('accounts', 'L2TPAccount')
+    Connection = apps.get_model('connections', 'Connection')
+
+    current = {}
+    for connection_id, account_id in (
+        Connection.objects.filter(status='online').order_by('-connected_at').values_list('id', 'account_id')
+    ):
+        current.setdefault(account_id, connection_id)
+    for account_id, connection_id in current.items():
+        L2TPAccount.objects.filter(pk=account_id).update(current_connection_id=connection_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('connections', '0002_traffic_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='l2tpaccount',
+            name='current_connection',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='connections.connection', verbose_name='当前连接'),
+        ),
+        migrations.RunPython(populate_current_connection, migrations.RunPython.noop),
+    ]
@@ -2,8 +2,7 @@
 
 import re
 
-from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 
 
 class L2TPAccount(models.Model):
@@ -20,6 +19,15 @@ class L2TPAccount(models.Model):
     assigned_ip = models.GenericIPAddressField('分配IP', unique=True)
     is_active = models.BooleanField('启用状态', default=True)
     remark = models.CharField('备注', max_length=255, blank=True, default='')
+    # 当前在线连接，由 Connection.connect / disconnect / close_missing 维护
+    current_connection = models.ForeignKey(
+        'connections.Connection',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='当前连接'
+    )
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
     updated_at = models.DateTimeField('更新时间', auto_now=True)
 
@@ -34,13 +42,8 @@ class L2TPAccount(models.Model):
 
     @property
     def is_online(self):
-        """检查账号是否在线"""
-        return hasattr(self, 'current_connection') and self.current_connection is not None
-
-    @property
-    def current_connection(self):
-        """获取当前连接"""
-        return self.connections.filter(status='online').first()
+        """检查账号是否在线（不查询连接表）"""
+        return self.current_connection_id is not None
 
     @property
     def proxy_config(self):
@@ -52,19 +55,12 @@ class L2TPAccount(models.Model):
 
     @classmethod
     def get_next_available_ip(cls):
-        """获取下一个可用的 IP 地址"""
-        import ipaddress
-
-        start_ip = ipaddress.ip_address(settings.PROXY_IP_POOL_START)
-        end_ip = ipaddress.ip_address(settings.PROXY_IP_POOL_END)
-
-        used_ips = set(cls.objects.values_list('assigned_ip', flat=True))
+        """获取下一个可用的 IP 地址
 
-        current_ip = start_ip
-        while current_ip <= end_ip:
-            ip_str = str(current_ip)
-            if ip_str not in used_ips:
-                return ip_str
-            current_ip += 1
+        调用方应在 transaction.atomic() 中完成分配与创建，分配锁持有到事务提交。
+        """
+        from .allocators import IPAllocator
 
-        return None
+        with transaction.atomic():
+            ips = IPAllocator().allocate(1)
+        return ips[0] if ips else None
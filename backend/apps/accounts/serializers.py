@@ -2,6 +2,7 @@
 
 import re
 
+from django.db import transaction
 from rest_framework import serializers
 
 from .models import L2TPAccount
@@ -74,12 +75,9 @@ class L2TPAccountCreateSerializer(serializers.ModelSerializer):
         auto_assign_ip = attrs.pop('auto_assign_ip', True)
         assigned_ip = attrs.get('assigned_ip', '')
 
-        # 如果自动分配或者 IP 为空，则自动获取下一个可用 IP
+        # 如果自动分配或者 IP 为空，则在 create 的事务中分配下一个可用 IP
         if auto_assign_ip or not assigned_ip:
-            next_ip = L2TPAccount.get_next_available_ip()
-            if not next_ip:
-                raise serializers.ValidationError({'assigned_ip': 'IP 地址池已耗尽'})
-            attrs['assigned_ip'] = next_ip
+            attrs['assigned_ip'] = ''
         else:
             # 验证 IP 地址格式
             import ipaddress
@@ -90,8 +88,16 @@ class L2TPAccountCreateSerializer(serializers.ModelSerializer):
 
         return attrs
 
+    @transaction.atomic
     def create(self, validated_data):
         auto_create_proxy = validated_data.pop('auto_create_proxy', True)
+
+        if not validated_data['assigned_ip']:
+            next_ip = L2TPAccount.get_next_available_ip()
+            if not next_ip:
+                raise serializers.ValidationError({'assigned_ip': 'IP 地址池已耗尽'})
+            validated_data['assigned_ip'] = next_ip
+
         account = super().create(validated_data)
 
         if auto_create_proxy:
@@ -102,11 +108,12 @@ class L2TPAccountCreateSerializer(serializers.ModelSerializer):
                 ProxyConfig.objects.create(account=account, listen_port=port)
 
             table_id = RoutingTable.get_next_table_id()
-            RoutingTable.objects.create(
-                account=account,
-                table_id=table_id,
-                table_name=f'rt_user_{account.id}'
-            )
+            if table_id:
+                RoutingTable.objects.create(
+                    account=account,
+                    table_id=table_id,
+                    table_name=f'rt_user_{account.id}'
+                )
 
         return account
 
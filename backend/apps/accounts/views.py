@@ -7,7 +7,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from apps.logs.models import SystemLog
-from apps.network.services import GostService, L2TPService
+from apps.network.services import L2TPService, RoutingService, RtTables, get_proxy_service
 
 from .models import L2TPAccount
 from .serializers import (
@@ -25,7 +25,8 @@ logger = logging.getLogger(__name__)
 class L2TPAccountViewSet(viewsets.ModelViewSet):
     """L2TP 账号管理接口"""
 
-    queryset = L2TPAccount.objects.all()
+    # 在线状态、当前接口与代理配置随列表一次取出
+    queryset = L2TPAccount.objects.select_related('current_connection', 'proxyconfig')
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['is_active']
     search_fields = ['username', 'assigned_ip', 'remark']
@@ -69,24 +70,16 @@ class L2TPAccountViewSet(viewsets.ModelViewSet):
 
     @transaction.atomic
     def perform_destroy(self, instance):
-        from apps.connections.models import Connection
-        from django.utils import timezone
-
         l2tp_service = L2TPService()
 
         # 1. 终止活跃的 PPP 连接
         try:
-            active_conn = Connection.objects.filter(
-                account=instance,
-                status='online'
-            ).first()
+            active_conn = instance.current_connection
             if active_conn:
                 # 终止 PPP 连接
                 l2tp_service.terminate_connection(active_conn.interface)
                 # 更新连接状态
-                active_conn.status = 'offline'
-                active_conn.disconnected_at = timezone.now()
-                active_conn.save()
+                active_conn.disconnect()
                 SystemLog.log('l2tp', f'终止连接: {active_conn.interface}', account=instance)
         except Exception as e:
             SystemLog.log_error('l2tp', f'终止连接失败: {e}', account=instance)
@@ -94,8 +87,7 @@ class L2TPAccountViewSet(viewsets.ModelViewSet):
         # 2. 停止代理
         try:
             if instance.proxy_config and instance.proxy_config.is_running:
-                gost_service = GostService()
-                gost_service.stop(instance.proxy_config.listen_port)
+                get_proxy_service(instance.proxy_config.backend).stop(instance.proxy_config.listen_port)
         except Exception:
             pass
 
@@ -105,6 +97,24 @@ class L2TPAccountViewSet(viewsets.ModelViewSet):
         except Exception:
             pass
 
+        # 4. 提交后清理路由表中的规则与路由，并移除 rt_tables 中的登记（ID 可能被新账号复用）；
+        #    定时同步只处理仍登记的表，不会再清理已删除账号的表
+        from apps.network.models import RoutingTable
+
+        table = RoutingTable.objects.filter(account=instance).values_list('table_id', 'table_name').first()
+        if table is not None:
+            def _remove_rt_table():
+                try:
+                    RoutingService().cleanup_source_routing_batch([table])
+                except Exception as e:
+                    logger.warning(f'清理路由表 {table[0]} 失败: {e}')
+                try:
+                    RtTables().update(remove=[table[0]])
+                except Exception as e:
+                    logger.warning(f'移除 rt_tables 表项失败: {e}')
+
+            transaction.on_commit(_remove_rt_table)
+
         SystemLog.log('l2tp', f'删除账号: {instance.username}')
         instance.delete()
 
@@ -135,7 +145,7 @@ class L2TPAccountViewSet(viewsets.ModelViewSet):
         """获取账号统计"""
         total = L2TPAccount.objects.count()
         active = L2TPAccount.objects.filter(is_active=True).count()
-        online = L2TPAccount.objects.filter(connections__status='online').distinct().count()
+        online = L2TPAccount.objects.filter(current_connection__isnull=False).count()
 
         return Response({
             'total': total,
@@ -153,49 +163,53 @@ class L2TPAccountViewSet(viewsets.ModelViewSet):
         if count < 1 or count > 100:
             return Response({'error': '数量必须在 1-100 之间'}, status=status.HTTP_400_BAD_REQUEST)
 
+        from apps.network.allocators import PortAllocator, RoutingTableAllocator
+        from apps.network.models import ProxyConfig, RoutingTable
+
+        from .allocators import IPAllocator
+
         created = []
 
-        for i in range(count):
-            next_ip = L2TPAccount.get_next_available_ip()
-            if not next_ip:
-                break
-
-            username = f'{prefix}_{L2TPAccount.objects.count() + 1}'
-            password = L2TPAccount.objects.make_random_password() if hasattr(L2TPAccount.objects, 'make_random_password') else f'pass_{i}'
-
-            account = L2TPAccount.objects.create(
-                username=username,
-                password=password,
-                assigned_ip=next_ip
-            )
-
-            # 同步到 chap-secrets（容器内可能不可用）
-            try:
-                l2tp_service = L2TPService()
-                l2tp_service.add_user(username, password, next_ip)
-            except Exception:
-                pass
-
-            # 创建代理配置
-            from apps.network.models import ProxyConfig, RoutingTable
-
-            port = ProxyConfig.get_next_available_port()
-            if port:
-                ProxyConfig.objects.create(account=account, listen_port=port)
-
-            table_id = RoutingTable.get_next_table_id()
-            RoutingTable.objects.create(
-                account=account,
-                table_id=table_id,
-                table_name=f'rt_user_{account.id}'
-            )
-
-            created.append({
-                'id': account.id,
-                'username': username,
-                'password': password,
-                'assigned_ip': next_ip,
-                'proxy_port': port
-            })
+        # IP、端口与路由表 ID 各一次查询批量分配，分配锁持有到事务提交，并发创建不会拿到相同资源
+        with transaction.atomic():
+            ips = IPAllocator().allocate(count, contiguous=True)
+            ports = PortAllocator().allocate(len(ips))
+            table_ids = RoutingTableAllocator().allocate(len(ips))
+
+            # 用户名序号只统计一次，账号、代理配置与路由表各一次 bulk_create，查询数与数量无关
+            base = L2TPAccount.objects.count()
+            random_password = getattr(L2TPAccount.objects, 'make_random_password', None)
+            accounts = L2TPAccount.objects.bulk_create([
+                L2TPAccount(
+                    username=f'{prefix}_{base + i + 1}',
+                    password=random_password() if random_password else f'pass_{i}',
+                    assigned_ip=next_ip
+                )
+                for i, next_ip in enumerate(ips)
+            ])
+            ProxyConfig.objects.bulk_create([
+                ProxyConfig(account=account, listen_port=port)
+                for account, port in zip(accounts, ports)
+            ])
+            RoutingTable.objects.bulk_create([
+                RoutingTable(account=account, table_id=table_id, table_name=f'rt_user_{account.id}')
+                for account, table_id in zip(accounts, table_ids)
+            ])
+
+            l2tp_service = L2TPService()
+            for i, account in enumerate(accounts):
+                # 同步到 chap-secrets（容器内可能不可用）
+                try:
+                    l2tp_service.add_user(account.username, account.password, account.assigned_ip)
+                except Exception:
+                    pass
+
+                created.append({
+                    'id': account.id,
+                    'username': account.username,
+                    'password': account.password,
+                    'assigned_ip': account.assigned_ip,
+                    'proxy_port': ports[i] if i < len(ports) else None
+                })
 
         return Response({'created': len(created), 'accounts': created})
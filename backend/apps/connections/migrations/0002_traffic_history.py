@@ -0,0 +1,49 @@
+# Generated manually
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('connections', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrafficRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.IntegerField(choices=[(60, '分钟'), (3600, '小时'), (86400, '天')], verbose_name='粒度(秒)')),
+                ('bucket', models.DateTimeField(verbose_name='时间段开始')),
+                ('bytes_sent', models.BigIntegerField(default=0, verbose_name='发送字节')),
+                ('bytes_received', models.BigIntegerField(default=0, verbose_name='接收字节')),
+                ('account', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.l2tpaccount', verbose_name='关联账号')),
+            ],
+            options={
+                'verbose_name': '流量汇总',
+                'verbose_name_plural': '流量汇总',
+                'db_table': 'traffic_rollups',
+                'indexes': [models.Index(fields=['resolution', 'bucket'], include=('bytes_sent', 'bytes_received'), name='traffic_rollup_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'resolution', 'bucket'), name='traffic_rollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrafficSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(verbose_name='时间段开始')),
+                ('bytes_sent', models.BigIntegerField(verbose_name='发送字节')),
+                ('bytes_received', models.BigIntegerField(verbose_name='接收字节')),
+                ('account', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.l2tpaccount', verbose_name='关联账号')),
+            ],
+            options={
+                'verbose_name': '流量采样',
+                'verbose_name_plural': '流量采样',
+                'db_table': 'traffic_samples',
+                'indexes': [models.Index(fields=['account', 'timestamp'], name='traffic_sample_account_ts_idx'), models.Index(fields=['timestamp'], include=('bytes_sent', 'bytes_received'), name='traffic_sample_ts_idx')],
+            },
+        ),
+    ]
@@ -58,3 +58,285 @@ class Connection(models.Model):
     def get_by_ip(cls, ip):
         """通过 IP 获取在线连接"""
         return cls.objects.filter(local_ip=ip, status='online').first()
+
+    @classmethod
+    def connect(cls, account, interface: str, peer_ip: str, local_ip: str) -> 'Connection':
+        """记录账号上线：关闭之前的在线连接，创建新连接并设为账号的当前连接"""
+        from django.db import transaction
+        from django.utils import timezone
+
+        from apps.accounts.models import L2TPAccount
+
+        with transaction.atomic():
+            # 锁定账号行，同一账号的并发上线回调串行执行
+            L2TPAccount.objects.select_for_update().filter(pk=account.pk).exists()
+            cls.objects.filter(account=account, status='online').update(
+                status='offline',
+                disconnected_at=timezone.now()
+            )
+            connection = cls.objects.create(
+                account=account,
+                interface=interface,
+                peer_ip=peer_ip,
+                local_ip=local_ip,
+                status='online'
+            )
+            L2TPAccount.objects.filter(pk=account.pk).update(current_connection=connection)
+        account.current_connection = connection
+        return connection
+
+    def disconnect(self, bytes_sent=None, bytes_received=None):
+        """记录连接下线，账号的当前连接仍指向本连接时清空"""
+        from django.db import transaction
+        from django.utils import timezone
+
+        from apps.accounts.models import L2TPAccount
+
+        self.status = 'offline'
+        self.disconnected_at = timezone.now()
+        if bytes_sent is not None:
+            self.bytes_sent = bytes_sent
+        if bytes_received is not None:
+            self.bytes_received = bytes_received
+        with transaction.atomic():
+            self.save()
+            L2TPAccount.objects.filter(pk=self.account_id, current_connection=self).update(current_connection=None)
+
+    @classmethod
+    def close_missing(cls, interfaces, before=None) -> list:
+        """将所在接口已消失的在线连接标记为离线
+
+        Args:
+            interfaces: 已不存在的接口名
+            before: 只处理此时间之前建立的连接，避免接口名被新会话复用后误关
+
+        Returns:
+            被关闭的连接列表
+        """
+        from django.utils import timezone
+
+        stale = cls.objects.filter(status='online', interface__in=list(interfaces)).select_related('account')
+        if before is not None:
+            stale = stale.filter(connected_at__lt=before)
+        stale = list(stale)
+        if stale:
+            from django.db import transaction
+
+            from apps.accounts.models import L2TPAccount
+
+            ids = [c.id for c in stale]
+            with transaction.atomic():
+                cls.objects.filter(id__in=ids).update(status='offline', disconnected_at=timezone.now())
+                L2TPAccount.objects.filter(current_connection__in=ids).update(current_connection=None)
+        return stale
+
+
+# 流量汇总粒度 (秒)
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+ROLLUP_UPSERT = """
+    INSERT INTO traffic_rollups (account_id, resolution, bucket, bytes_sent, bytes_received)
+    VALUES {values}
+    ON CONFLICT (account_id, resolution, bucket) DO UPDATE SET
+        bytes_sent = traffic_rollups.bytes_sent + EXCLUDED.bytes_sent,
+        bytes_received = traffic_rollups.bytes_received + EXCLUDED.bytes_received
+"""
+
+
+class TrafficSample(models.Model):
+    """账号流量原始采样点：每 TRAFFIC_RAW_INTERVAL 秒一个时间段内的收发字节数（只追加，批量写入）"""
+
+    class Meta:
+        db_table = 'traffic_samples'
+        verbose_name = '流量采样'
+        verbose_name_plural = '流量采样'
+        indexes = [
+            models.Index(fields=['account', 'timestamp'], name='traffic_sample_account_ts_idx'),
+            # 全部账号合计与过期清理按时间范围扫描
+            models.Index(
+                fields=['timestamp'], include=['bytes_sent', 'bytes_received'], name='traffic_sample_ts_idx'
+            ),
+        ]
+
+    account = models.ForeignKey(
+        'accounts.L2TPAccount',
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,
+        verbose_name='关联账号'
+    )
+    timestamp = models.DateTimeField('时间段开始')
+    bytes_sent = models.BigIntegerField('发送字节')
+    bytes_received = models.BigIntegerField('接收字节')
+
+
+class TrafficRollup(models.Model):
+    """账号流量汇总：按分钟/小时/天累加，每个时间段一行，写入时以 upsert 增量更新"""
+
+    class Meta:
+        db_table = 'traffic_rollups'
+        verbose_name = '流量汇总'
+        verbose_name_plural = '流量汇总'
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'resolution', 'bucket'], name='traffic_rollup_unique'),
+        ]
+        indexes = [
+            # 全部账号合计可只读索引完成
+            models.Index(
+                fields=['resolution', 'bucket'], include=['bytes_sent', 'bytes_received'],
+                name='traffic_rollup_bucket_idx'
+            ),
+        ]
+
+    RESOLUTION_CHOICES = [
+        (MINUTE, '分钟'),
+        (HOUR, '小时'),
+        (DAY, '天'),
+    ]
+
+    account = models.ForeignKey(
+        'accounts.L2TPAccount',
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,
+        verbose_name='关联账号'
+    )
+    resolution = models.IntegerField('粒度(秒)', choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField('时间段开始')
+    bytes_sent = models.BigIntegerField('发送字节', default=0)
+    bytes_received = models.BigIntegerField('接收字节', default=0)
+
+    @staticmethod
+    def _bucket(timestamp, resolution: int):
+        """时间段开始：分钟/小时按 UTC 对齐，天按本地时区的零点"""
+        from datetime import datetime
+
+        from django.utils import timezone
+
+        if resolution == DAY:
+            local = timezone.localtime(timestamp)
+            return local.replace(hour=0, minute=0, second=0, microsecond=0)
+        epoch = int(timestamp.timestamp())
+        return datetime.fromtimestamp(epoch - epoch % resolution, tz=timestamp.tzinfo)
+
+    @classmethod
+    def record(cls, timestamp, usage: dict):
+        """写入一个原始时间段的流量，并累加到各级汇总
+
+        Args:
+            timestamp: 原始时间段开始
+            usage: {account_id: (bytes_sent, bytes_received)}，为 0 的账号应事先去掉
+        """
+        from django.db import connection, transaction
+
+        if not usage:
+            return
+
+        rows = []
+        for resolution, _ in cls.RESOLUTION_CHOICES:
+            bucket = cls._bucket(timestamp, resolution)
+            rows.extend(
+                (account_id, resolution, bucket, sent, received) for account_id, (sent, received) in usage.items()
+            )
+
+        with transaction.atomic():
+            TrafficSample.objects.bulk_create(
+                TrafficSample(account_id=account_id, timestamp=timestamp, bytes_sent=sent, bytes_received=received)
+                for account_id, (sent, received) in usage.items()
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    ROLLUP_UPSERT.format(values=', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))),
+                    [value for row in rows for value in row]
+                )
+
+    @classmethod
+    def tiers(cls) -> list:
+        """[(粒度秒数, 保留时长)]，由细到粗；原始采样点作为最细一级，保留时长 None 表示永久"""
+        from datetime import timedelta
+
+        from django.conf import settings
+
+        def _days(value):
+            return timedelta(days=value) if value > 0 else None
+
+        return [
+            (settings.TRAFFIC_RAW_INTERVAL, _days(settings.TRAFFIC_RAW_RETENTION_DAYS)),
+            (MINUTE, _days(settings.TRAFFIC_MINUTE_RETENTION_DAYS)),
+            (HOUR, _days(settings.TRAFFIC_HOUR_RETENTION_DAYS)),
+            (DAY, _days(settings.TRAFFIC_DAY_RETENTION_DAYS)),
+        ]
+
+    @classmethod
+    def series(cls, start, end, account_id=None, points: int = 500) -> dict:
+        """查询流量曲线，自动选择粒度
+
+        取数据仍在保留期内、且点数不超过 points 的最细粒度；都不满足时取最粗一级。
+
+        Args:
+            start, end: 时间范围
+            account_id: 账号 ID，为空时为全部账号合计
+            points: 最多点数
+
+        Returns:
+            {'resolution': 粒度秒数, 'points': [{'time', 'bytes_sent', 'bytes_received'}]}
+        """
+        from django.db.models import Sum
+        from django.utils import timezone
+
+        now = timezone.now()
+        span = (end - start).total_seconds()
+        tiers = cls.tiers()
+        resolution = tiers[-1][0]
+        for tier, retention in tiers:
+            if span / tier <= points and (retention is None or start >= now - retention):
+                resolution = tier
+                break
+
+        if resolution == tiers[0][0]:
+            queryset = TrafficSample.objects.filter(timestamp__gte=start, timestamp__lt=end)
+            time_field = 'timestamp'
+        else:
+            queryset = cls.objects.filter(
+                resolution=resolution, bucket__gte=cls._bucket(start, resolution), bucket__lt=end
+            )
+            time_field = 'bucket'
+        if account_id is not None:
+            queryset = queryset.filter(account_id=account_id)
+
+        rows = (
+            queryset.values(time_field)
+            .annotate(sent=Sum('bytes_sent'), received=Sum('bytes_received'))
+            .order_by(time_field)
+            .values_list(time_field, 'sent', 'received')
+        )
+        return {
+            'resolution': resolution,
+            'points': [
+                {'time': time, 'bytes_sent': sent, 'bytes_received': received} for time, sent, received in rows
+            ],
+        }
+
+    @classmethod
+    def prune(cls) -> dict:
+        """删除超过保留期的原始采样点与汇总
+
+        Returns:
+            {粒度秒数: 删除行数}
+        """
+        from django.utils import timezone
+
+        now = timezone.now()
+        deleted = {}
+        for index, (resolution, retention) in enumerate(cls.tiers()):
+            if retention is None:
+                continue
+            if index == 0:
+                deleted[resolution] = TrafficSample.objects.filter(timestamp__lt=now - retention).delete()[0]
+            else:
+                deleted[resolution] = cls.objects.filter(
+                    resolution=resolution, bucket__lt=now - retention
+                ).delete()[0]
+        return deleted
@@ -59,4 +59,6 @@ class AccountConnectionSummarySerializer(serializers.Serializer):
     total_bytes_sent = serializers.IntegerField()
     total_bytes_received = serializers.IntegerField()
     total_bytes = serializers.IntegerField()
+    send_rate = serializers.FloatField()
+    receive_rate = serializers.FloatField()
     connection_count = serializers.IntegerField()
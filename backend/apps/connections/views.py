@@ -9,14 +9,15 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from django.db.models import Sum, Count, Max
+from django.db.models import BooleanField, Count, ExpressionWrapper, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 
 from apps.accounts.models import L2TPAccount
 from apps.logs.models import SystemLog
 from apps.network.models import ProxyConfig, RoutingTable
-from apps.network.services import GostService, RoutingService
+from apps.network.services import RoutingService, TrafficSampler, get_proxy_service
 
-from .models import Connection
+from .models import Connection, TrafficRollup
 from .serializers import AccountConnectionSummarySerializer, ConnectionSerializer
 
 
@@ -58,68 +59,72 @@ class ConnectionViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['get'])
     def by_account(self, request):
-        """按账号汇总连接信息 - 每个账号仅显示一条记录"""
+        """按账号汇总连接信息 - 每个账号仅显示一条记录
+
+        汇总、状态筛选与排序 (在线优先、按用户名) 在一次查询中完成，在线状态取自账号的当前连接，
+        各账号的当前/最新连接再取一次；在线账号的实时流量取自 netmon 的采样缓存。
+        """
         # 获取筛选参数
         status_filter = request.query_params.get('status', '')
 
-        # 获取所有账号
-        accounts = L2TPAccount.objects.all()
+        connections = Connection.objects.filter(account=OuterRef('pk'))
+        # 离线账号取最近一次连接
+        latest = connections.order_by('-connected_at').values('id')[:1]
+        # 历史总流量（已断开的连接）
+        historical = (
+            connections.filter(status='offline').values('account')
+            .annotate(sent=Sum('bytes_sent'), received=Sum('bytes_received'))
+        )
+        accounts = L2TPAccount.objects.annotate(
+            online=ExpressionWrapper(Q(current_connection__isnull=False), output_field=BooleanField()),
+            latest_connection_id=Coalesce('current_connection_id', Subquery(latest)),
+            historical_sent=Coalesce(Subquery(historical.values('sent')), 0),
+            historical_received=Coalesce(Subquery(historical.values('received')), 0),
+            connection_count=Coalesce(
+                Subquery(connections.values('account').annotate(count=Count('id')).values('count')), 0
+            ),
+        ).order_by('-online', 'username')
+
+        # 应用状态筛选
+        if status_filter in ('online', 'offline'):
+            accounts = accounts.filter(online=status_filter == 'online')
+
+        accounts = list(accounts)
+        current = Connection.objects.in_bulk([a.latest_connection_id for a in accounts if a.latest_connection_id])
+        traffic = TrafficSampler.current()['interfaces'] if any(a.online for a in accounts) else {}
 
         result = []
         for account in accounts:
-            # 获取该账号的所有连接
-            connections = Connection.objects.filter(account=account)
-
-            # 计算历史总流量（已断开的连接）
-            historical_traffic = connections.filter(status='offline').aggregate(
-                total_sent=Sum('bytes_sent'),
-                total_received=Sum('bytes_received'),
-            )
-
-            # 获取当前/最新连接
-            current_conn = connections.filter(status='online').first()
-            if not current_conn:
-                current_conn = connections.order_by('-connected_at').first()
-
-            # 确定状态
-            is_online = connections.filter(status='online').exists()
-            conn_status = 'online' if is_online else 'offline'
-
-            # 应用状态筛选
-            if status_filter and conn_status != status_filter:
-                continue
+            current_conn = current.get(account.latest_connection_id)
 
             # 计算流量：历史 + 当前会话实时流量
-            total_sent = historical_traffic['total_sent'] or 0
-            total_received = historical_traffic['total_received'] or 0
-
-            # 如果在线，读取当前接口的实时流量
-            if is_online and current_conn:
-                realtime = self._get_interface_traffic(current_conn.interface)
-                total_sent += realtime['tx_bytes']
-                total_received += realtime['rx_bytes']
+            total_sent = account.historical_sent
+            total_received = account.historical_received
+            realtime = {}
+            if account.online and current_conn:
+                realtime = traffic.get(current_conn.interface, {})
+                total_sent += realtime.get('tx_bytes', 0)
+                total_received += realtime.get('rx_bytes', 0)
 
             # 构建汇总数据
-            summary = {
+            result.append({
                 'account_id': account.id,
                 'username': account.username,
                 'assigned_ip': account.assigned_ip,
                 'interface': current_conn.interface if current_conn else '',
                 'peer_ip': current_conn.peer_ip if current_conn else '',
                 'local_ip': current_conn.local_ip if current_conn else '',
-                'status': conn_status,
+                'status': 'online' if account.online else 'offline',
                 'duration': current_conn.duration if current_conn else 0,
                 'connected_at': current_conn.connected_at if current_conn else None,
                 'disconnected_at': current_conn.disconnected_at if current_conn else None,
                 'total_bytes_sent': total_sent,
                 'total_bytes_received': total_received,
                 'total_bytes': total_sent + total_received,
-                'connection_count': connections.count(),
-            }
-            result.append(summary)
-
-        # 按状态和用户名排序（在线的排前面）
-        result.sort(key=lambda x: (0 if x['status'] == 'online' else 1, x['username']))
+                'send_rate': realtime.get('tx_rate', 0),
+                'receive_rate': realtime.get('rx_rate', 0),
+                'connection_count': account.connection_count,
+            })
 
         serializer = AccountConnectionSummarySerializer(result, many=True)
         return Response({
@@ -127,20 +132,37 @@ class ConnectionViewSet(viewsets.ReadOnlyModelViewSet):
             'results': serializer.data
         })
 
-    def _get_interface_traffic(self, interface: str) -> dict:
-        """读取接口实时流量统计"""
-        result = {'tx_bytes': 0, 'rx_bytes': 0}
+    @action(detail=False, methods=['get'])
+    def traffic(self, request):
+        """PPP 接口实时流量：累计收发字节数与收发速率 (字节/秒)"""
+        return Response(TrafficSampler.current())
+
+    @action(detail=False, methods=['get'])
+    def traffic_history(self, request):
+        """流量历史曲线
+
+        参数: account (账号 ID，缺省为全部账号合计)、start / end (ISO 时间，缺省为最近 24 小时)、
+        points (最多点数，默认 500)。按时间范围与点数自动选择原始/分钟/小时/天粒度。
+        """
+        from datetime import timedelta
+
+        from django.utils.dateparse import parse_datetime
+
+        params = request.query_params
         try:
-            tx_path = f'/sys/class/net/{interface}/statistics/tx_bytes'
-            rx_path = f'/sys/class/net/{interface}/statistics/rx_bytes'
-
-            with open(tx_path, 'r') as f:
-                result['tx_bytes'] = int(f.read().strip())
-            with open(rx_path, 'r') as f:
-                result['rx_bytes'] = int(f.read().strip())
-        except (FileNotFoundError, ValueError, PermissionError):
-            pass
-        return result
+            end = parse_datetime(params['end']) if params.get('end') else timezone.now()
+            start = parse_datetime(params['start']) if params.get('start') else end - timedelta(days=1)
+            account_id = int(params['account']) if params.get('account') else None
+            points = min(max(int(params.get('points', 500)), 1), 5000)
+        except ValueError:
+            return Response({'error': '参数格式错误'}, status=status.HTTP_400_BAD_REQUEST)
+        if start is None or end is None:
+            return Response({'error': '时间格式错误'}, status=status.HTTP_400_BAD_REQUEST)
+        start, end = (timezone.make_aware(t) if timezone.is_naive(t) else t for t in (start, end))
+        if start >= end:
+            return Response({'error': '时间范围无效'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(TrafficRollup.series(start, end, account_id=account_id, points=points))
 
 
 class PPPCallbackView(APIView):
@@ -197,20 +219,8 @@ class PPPCallbackView(APIView):
                               details={'interface': interface})
             return Response({'error': '未找到对应的账号'}, status=status.HTTP_404_NOT_FOUND)
 
-        # 关闭之前的连接
-        Connection.objects.filter(account=account, status='online').update(
-            status='offline',
-            disconnected_at=timezone.now()
-        )
-
-        # 创建新连接记录
-        connection = Connection.objects.create(
-            account=account,
-            interface=interface,
-            peer_ip=peer_ip,
-            local_ip=local_ip,
-            status='online'
-        )
+        # 关闭之前的连接，创建新连接记录并设为账号的当前连接
+        connection = Connection.connect(account, interface=interface, peer_ip=peer_ip, local_ip=local_ip)
 
         # 更新路由表和启动代理
         # IP 说明:
@@ -240,14 +250,15 @@ class PPPCallbackView(APIView):
 
                 # 自动启动代理
                 if proxy_config.auto_start:
-                    gost_service = GostService()
+                    proxy_service = get_proxy_service(proxy_config.backend)
                     try:
-                        pid = gost_service.start(
+                        pid = proxy_service.start(
                             port=proxy_config.listen_port,
                             bind_ip=server_ppp_ip,
                             interface=interface
                         )
                         proxy_config.gost_pid = pid
+                        proxy_config.gost_worker = proxy_service.get_worker(proxy_config.listen_port)
                         proxy_config.is_running = True
                         proxy_config.save()
                     except Exception as e:
@@ -291,10 +302,10 @@ class PPPCallbackView(APIView):
         # 停止代理（容器内可能不可用）
         try:
             if account.proxy_config and account.proxy_config.is_running:
-                gost_service = GostService()
-                gost_service.stop(account.proxy_config.listen_port)
+                get_proxy_service(account.proxy_config.backend).stop(account.proxy_config.listen_port)
                 account.proxy_config.is_running = False
                 account.proxy_config.gost_pid = None
+                account.proxy_config.gost_worker = None
                 account.proxy_config.save()
         except Exception:
             pass
@@ -304,11 +315,10 @@ class PPPCallbackView(APIView):
             routing_table = account.routing_table
             if routing_table.is_active:
                 routing_service = RoutingService()
-                routing_service.cleanup_routing(
-                    interface=interface,
+                routing_service.cleanup_source_routing(
                     table_id=routing_table.table_id,
                     table_name=routing_table.table_name,
-                    proxy_port=account.proxy_config.listen_port if account.proxy_config else 0
+                    local_ip=connection.peer_ip
                 )
                 routing_table.interface = ''
                 routing_table.is_active = False
@@ -317,11 +327,7 @@ class PPPCallbackView(APIView):
             SystemLog.log_error('routing', f'清理路由失败: {e}', account=account)
 
         # 更新连接状态和流量统计
-        connection.status = 'offline'
-        connection.disconnected_at = timezone.now()
-        connection.bytes_sent = bytes_sent
-        connection.bytes_received = bytes_received
-        connection.save()
+        connection.disconnect(bytes_sent=bytes_sent, bytes_received=bytes_received)
 
         SystemLog.log_connection(
             f'Client 下线: {account.username}',
@@ -0,0 +1,154 @@
+"""系统日志缓冲写入"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection
+
+logger = logging.getLogger(__name__)
+
+# 抽样策略只作用于这些级别，警告与错误在队列满之前全部保留
+SAMPLED_LEVELS = ('info', 'debug')
+
+
+class LogBuffer:
+    """系统日志缓冲队列
+
+    SystemLog.log 将记录放入进程内队列，后台线程每 LOG_BUFFER_INTERVAL 秒或积压 LOG_BUFFER_BATCH 条时
+    以 bulk_create 批量写入，进程退出时写入剩余记录。队列最多 LOG_BUFFER_SIZE 条，积压时按 LOG_BUFFER_POLICY：
+    drop 在队列满后丢弃新记录；sample 在积压超过一半后 info/debug 记录每 LOG_BUFFER_SAMPLE 条保留 1 条，
+    队列满后同样丢弃。丢弃的数量在下一批写入时以一条警告日志记录。
+    """
+
+    def __init__(self, size: int | None = None, batch: int | None = None, interval: float | None = None,
+                 policy: str | None = None, sample: int | None = None):
+        self.size = size or settings.LOG_BUFFER_SIZE
+        self.batch = batch or settings.LOG_BUFFER_BATCH
+        self.interval = interval or settings.LOG_BUFFER_INTERVAL
+        self.policy = policy or settings.LOG_BUFFER_POLICY
+        self.sample = sample or settings.LOG_BUFFER_SAMPLE
+        self._reset()
+        atexit.register(self.flush)
+        # fork 出的子进程 (Celery prefork、gunicorn) 不继承父进程的队列与写入线程
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._seen = 0
+        self.dropped = 0
+        self.sampled = 0
+
+    def add(self, record) -> bool:
+        """放入队列
+
+        Returns:
+            False 表示按策略丢弃
+        """
+        with self._lock:
+            pending = len(self._queue)
+            if pending >= self.size:
+                self.dropped += 1
+                return False
+            if self.policy == 'sample' and pending >= self.size // 2 and record.level in SAMPLED_LEVELS:
+                self._seen += 1
+                if self._seen % self.sample:
+                    self.sampled += 1
+                    return False
+            self._queue.append(record)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='systemlog-writer', daemon=True)
+                self._thread.start()
+        if pending + 1 >= self.batch:
+            self._wake.set()
+        return True
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f'写入系统日志失败: {e}')
+
+    def _take(self) -> list:
+        from .models import SystemLog
+
+        with self._lock:
+            records = [self._queue.popleft() for _ in range(min(self.batch, len(self._queue)))]
+            if self.dropped or self.sampled:
+                records.append(SystemLog(
+                    log_type='system',
+                    level='warning',
+                    message=f'日志队列积压: 丢弃 {self.dropped} 条, 抽样略过 {self.sampled} 条',
+                    details={'dropped': self.dropped, 'sampled': self.sampled, 'policy': self.policy},
+                ))
+                self.dropped = self.sampled = 0
+        return records
+
+    def _write(self, records: list) -> bool:
+        from apps.accounts.models import L2TPAccount
+
+        from .models import SystemLog
+
+        for record in records:
+            # 入队后关联账号在本进程中被删除 (实例 pk 已清空)，与同步写入时的 SET_NULL 一致
+            if record.account_id and SystemLog.account.is_cached(record) and record.account.pk is None:
+                record.account = None
+
+        for _ in range(2):
+            try:
+                SystemLog.objects.bulk_create(records)
+                return True
+            except IntegrityError:
+                # 关联账号已在其他进程中被删除
+                account_ids = {record.account_id for record in records if record.account_id}
+                existing = set(L2TPAccount.objects.filter(id__in=account_ids).values_list('id', flat=True))
+                for record in records:
+                    if record.account_id and record.account_id not in existing:
+                        record.account = None
+            except DatabaseError as e:
+                # 连接已断开 (数据库重启等)，重新连接后重试一次
+                logger.warning(f'写入系统日志失败，重试: {e}')
+                connection.close()
+        return False
+
+    def flush(self) -> int:
+        """写入队列中的全部记录
+
+        Returns:
+            写入条数
+        """
+        written = 0
+        with self._flush_lock:
+            while records := self._take():
+                if self._write(records):
+                    written += len(records)
+                else:
+                    logger.error(f'写入系统日志失败，丢弃 {len(records)} 条')
+        return written
+
+    def __len__(self):
+        return len(self._queue)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_log_buffer() -> LogBuffer:
+    """进程内共享的日志缓冲队列"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = LogBuffer()
+    return _buffer
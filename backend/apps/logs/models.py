@@ -1,6 +1,10 @@
 """系统日志模型"""
 
-from django.db import models
+from functools import partial
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
 
 
 class SystemLog(models.Model):
@@ -41,15 +45,20 @@ class SystemLog(models.Model):
     )
     ip_address = models.GenericIPAddressField('IP地址', null=True, blank=True)
     interface = models.CharField('接口名', max_length=16, blank=True, default='')
-    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    # 缓冲写入时保留调用时刻而非写入时刻
+    created_at = models.DateTimeField('创建时间', default=timezone.now, editable=False)
 
     def __str__(self):
         return f'[{self.level.upper()}] {self.log_type}: {self.message[:50]}'
 
     @classmethod
     def log(cls, log_type, message, level='info', account=None, ip_address=None, interface='', details=None):
-        """创建日志记录"""
-        return cls.objects.create(
+        """创建日志记录
+
+        LOG_BUFFER_SIZE > 0 时放入进程内队列由后台线程批量写入 (见 LogBuffer)，返回未保存的记录；
+        在事务中调用时事务提交后才入队，事务回滚则不写入，与同步写入一致。
+        """
+        record = cls(
             log_type=log_type,
             message=message,
             level=level,
@@ -58,6 +67,14 @@ class SystemLog(models.Model):
             interface=interface,
             details=details
         )
+        if not settings.LOG_BUFFER_SIZE:
+            record.save()
+            return record
+
+        from .buffer import get_log_buffer
+
+        transaction.on_commit(partial(get_log_buffer().add, record))
+        return record
 
     @classmethod
     def log_connection(cls, message, account=None, interface='', level='info', details=None):
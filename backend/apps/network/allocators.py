@@ -0,0 +1,144 @@
+"""资源分配器
+
+在数据库端以窗口函数查找空闲区间 (gap query)，一次查询取出 N 个空闲值；
+并发分配由 Postgres 事务级咨询锁 (pg_advisory_xact_lock) 串行化，
+锁持有到调用方事务提交，期间其他分配方看不到尚未提交的占用。
+"""
+
+from django.conf import settings
+from django.db import connection
+
+# 在 [start, end] 内查找空闲区间：已用值两端各补一个哨兵，相邻已用值之间即空闲区间
+GAPS_CTE = '''
+    WITH used AS (
+        SELECT ({column})::bigint AS value FROM {table}
+        WHERE ({column})::bigint BETWEEN %(start)s AND %(end)s
+        UNION ALL SELECT %(start)s::bigint - 1
+        UNION ALL SELECT %(end)s::bigint + 1
+    ), gaps AS (
+        SELECT value + 1 AS gap_start, LEAD(value) OVER (ORDER BY value) - 1 AS gap_end
+        FROM used
+    )
+'''
+
+# 按顺序返回空闲区间，累计长度覆盖所需数量后不再返回更多区间
+GAP_QUERY = GAPS_CTE + '''
+    , sized AS (
+        SELECT gap_start, gap_end,
+               SUM(gap_end - gap_start + 1) OVER (ORDER BY gap_start) - (gap_end - gap_start + 1) AS preceding
+        FROM gaps
+        WHERE gap_start <= gap_end
+    )
+    SELECT gap_start, gap_end FROM sized WHERE preceding < %(count)s ORDER BY gap_start
+'''
+
+# 第一个能容纳所需数量的连续空闲区间
+BLOCK_QUERY = GAPS_CTE + '''
+    SELECT gap_start, gap_end FROM gaps
+    WHERE gap_end - gap_start + 1 >= %(count)s
+    ORDER BY gap_start
+    LIMIT 1
+'''
+
+
+class AllocationError(Exception):
+    """资源分配异常"""
+    pass
+
+
+class RangeAllocator:
+    """整数区间分配器
+
+    子类指定表名、列表达式 (可转换为 bigint) 与锁名，并给出可分配区间。
+    """
+
+    table = ''
+    column = ''
+    lock_name = ''
+
+    def ranges(self) -> list:
+        """可分配区间 [(start, end), ...]，按顺序分配"""
+        raise NotImplementedError
+
+    def _lock(self, cursor):
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [self.lock_name])
+
+    def _free(self, cursor, start: int, end: int, count: int, contiguous: bool = False) -> list:
+        """从单个区间内取出至多 count 个空闲值；contiguous 时只取一整段连续值"""
+        query = BLOCK_QUERY if contiguous else GAP_QUERY
+        cursor.execute(
+            query.format(table=self.table, column=self.column),
+            {'start': start, 'end': end, 'count': count}
+        )
+        values = []
+        for gap_start, gap_end in cursor.fetchall():
+            values.extend(range(gap_start, min(gap_end, gap_start + count - len(values) - 1) + 1))
+        return values
+
+    def allocate(self, count: int = 1, contiguous: bool = False) -> list:
+        """分配 count 个空闲值
+
+        必须在 transaction.atomic() 中调用，并在同一事务内写入分配结果。
+
+        Args:
+            count: 数量
+            contiguous: 优先分配一整段连续值，没有足够长的空闲段时退化为按顺序填补空隙
+
+        Returns:
+            升序排列的空闲值；资源不足时返回全部剩余
+        """
+        if not connection.in_atomic_block:
+            raise AllocationError('资源分配必须在事务中进行')
+        if count < 1:
+            return []
+
+        with connection.cursor() as cursor:
+            self._lock(cursor)
+            if contiguous and count > 1:
+                for start, end in self.ranges():
+                    values = self._free(cursor, start, end, count, contiguous=True)
+                    if values:
+                        return values
+
+            values = []
+            for start, end in self.ranges():
+                values.extend(self._free(cursor, start, end, count - len(values)))
+                if len(values) >= count:
+                    break
+        return values
+
+
+class PortAllocator(RangeAllocator):
+    """代理监听端口分配器 (PROXY_PORT_START - PROXY_PORT_END)"""
+
+    table = 'proxy_configs'
+    column = 'listen_port'
+    lock_name = 'allocator:proxy_port'
+
+    def ranges(self) -> list:
+        return [(settings.PROXY_PORT_START, settings.PROXY_PORT_END)]
+
+
+class RoutingTableAllocator(RangeAllocator):
+    """策略路由表 ID 分配器 (ROUTING_TABLE_ID_START - ROUTING_TABLE_ID_END)
+
+    账号删除后释放的 ID 会被重新分配；内核保留的 default/main/local 表 (253-255) 不参与分配。
+    """
+
+    table = 'routing_tables'
+    column = 'table_id'
+    lock_name = 'allocator:routing_table'
+
+    RESERVED = (253, 254, 255)
+
+    def ranges(self) -> list:
+        ranges = [(settings.ROUTING_TABLE_ID_START, settings.ROUTING_TABLE_ID_END)]
+        for reserved in self.RESERVED:
+            split = []
+            for start, end in ranges:
+                if start <= reserved <= end:
+                    split.extend(r for r in ((start, reserved - 1), (reserved + 1, end)) if r[0] <= r[1])
+                else:
+                    split.append((start, end))
+            ranges = split
+        return ranges
@@ -25,23 +25,39 @@ class NetworkConfig(AppConfig):
                 pass
 
     def _sync_proxy_states(self):
-        """同步代理状态与实际进程"""
+        """同步代理状态与实际进程（受监管时由监管服务恢复并回写状态）"""
+        from django.conf import settings
+
+        if settings.GOST_SUPERVISOR_SOCKET:
+            return
+
         try:
             from .models import ProxyConfig
-            from .services import GostService
+            from .services import get_gost_service
 
-            gost_service = GostService()
+            gost_service = get_gost_service()
             updated_count = 0
 
-            for proxy in ProxyConfig.objects.filter(is_running=True):
+            # 内置 Socks5 引擎的监听由 socks5_server 恢复，端口保持开放
+            running_ports = list(
+                ProxyConfig.objects.filter(is_running=True, backend='socks5').values_list('listen_port', flat=True)
+            )
+
+            for proxy in ProxyConfig.objects.filter(is_running=True, backend='gost'):
                 status = gost_service.get_status(proxy.listen_port)
-                if not status['running']:
+                if status['running']:
+                    running_ports.append(proxy.listen_port)
+                else:
                     proxy.is_running = False
                     proxy.gost_pid = None
+                    proxy.gost_worker = None
                     proxy.exit_ip = None
-                    proxy.save(update_fields=['is_running', 'gost_pid', 'exit_ip'])
+                    proxy.save(update_fields=['is_running', 'gost_pid', 'gost_worker', 'exit_ip'])
                     updated_count += 1
 
+            # 防火墙端口集合整体重建（重启后 ipset/nft 集合可能已丢失）
+            gost_service.firewall.sync_ports(running_ports)
+
             if updated_count > 0:
                 from apps.logs.models import SystemLog
                 SystemLog.log_info(
@@ -0,0 +1,233 @@
+"""API 查询数与耗时基准命令"""
+
+import json
+import platform
+import statistics
+import time
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .generate_fixtures import MAX_ACCOUNTS, FixtureGenerator
+
+# 替代外部服务返回的地址 (TEST-NET-3)
+BENCH_IP = '203.0.113.1'
+
+
+def _stop_proxies():
+    from ...models import ProxyConfig
+
+    ProxyConfig.objects.update(is_running=False, gost_pid=None, gost_worker=None)
+
+
+# 参与测试的 POST 动作: (路由名称, 请求体, 测量前的准备)；每次请求在回滚的保存点中执行，互不影响
+POST_ENDPOINTS = [
+    ('account-batch-create', {'count': 20, 'prefix': 'benchpost'}, None),
+    ('proxy-start-all', {}, _stop_proxies),
+    ('proxy-stop-all', {}, None),
+    ('proxy-refresh-exit-ips', {'force': 'true'}, None),
+    ('routing-table-reconcile', {}, None),
+]
+
+
+@contextmanager
+def mock_services():
+    """替换访问外部环境的服务 (代理进程、内核路由、防火墙、chap-secrets、出口/本机 IP 检测、任务队列)，
+    只保留数据库访问"""
+    from ...services import ExitIPProber, IPDetectService, L2TPService, RoutingService
+    from ...tasks import detect_exit_ips
+
+    proxy = mock.MagicMock()
+    proxy.start.return_value = 0
+    proxy.get_worker.return_value = None
+    proxy.stop_many.side_effect = lambda ports, timeout=None: dict.fromkeys(ports, True)
+    patches = [
+        mock.patch('apps.network.services.bulk.get_proxy_service', return_value=proxy),
+        mock.patch('apps.network.services.bulk.FirewallService'),
+        mock.patch.object(RoutingService, 'apply_changes', return_value=set()),
+        mock.patch.object(RoutingService, 'list_rules', return_value=[]),
+        mock.patch.object(RoutingService, 'list_routes', return_value=[]),
+        mock.patch.object(RoutingService, 'list_marks', return_value={}),
+        mock.patch.object(L2TPService, 'add_user'),
+        mock.patch.object(ExitIPProber, 'probe', side_effect=lambda ports: dict.fromkeys(ports, BENCH_IP)),
+        mock.patch.object(IPDetectService, 'detect_all', return_value={'public_ip': BENCH_IP, 'private_ip': None}),
+        mock.patch.object(detect_exit_ips, 'apply_async'),
+    ]
+    with ExitStack() as stack:
+        for patch in patches:
+            stack.enter_context(patch)
+        yield
+
+
+def _endpoints() -> list:
+    """枚举 /api/ 下全部 GET 端点
+
+    Returns:
+        [(名称, 视图类, 是否需要 pk)]；带 pk 以外参数的路由 (如批量任务查询) 不参与测试
+    """
+    def _walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from _walk(pattern.url_patterns)
+            else:
+                yield pattern
+
+    endpoints = {}
+    for pattern in _walk(get_resolver().url_patterns):
+        view = getattr(pattern.callback, 'cls', None)
+        if view is None or not pattern.name or pattern.name in endpoints:
+            continue
+        actions = getattr(pattern.callback, 'actions', None)
+        if (actions is not None and 'get' not in actions) or (actions is None and not hasattr(view, 'get')):
+            continue
+        params = set(pattern.pattern.regex.groupindex)
+        if params - {'pk'}:
+            continue
+        try:
+            path = reverse(pattern.name, kwargs={'pk': 0} if params else None)
+        except Exception:
+            continue
+        if path.startswith('/api/'):
+            endpoints[pattern.name] = (view, bool(params))
+    return sorted((name, view, detail) for name, (view, detail) in endpoints.items())
+
+
+class Command(BaseCommand):
+    help = (
+        '按多个数据规模生成测试数据 (在回滚的事务中)，记录每个 API GET 端点与批量 POST 动作的查询数与耗时；'
+        '外部服务以模拟替代，查询数随数据规模增长 (N+1) 时失败'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='10,1000,10000', help='账号数量，逗号分隔')
+        parser.add_argument('--connections', type=int, default=3, help='每个账号的连接记录数')
+        parser.add_argument('--logs', type=int, default=5, help='每个账号的日志数')
+        parser.add_argument('--seed', type=int, default=0, help='测试数据随机种子')
+        parser.add_argument('--repeat', type=int, default=3, help='每个端点的测量次数 (取中位数)')
+        parser.add_argument('--tolerance', type=int, default=0, help='允许的查询数增长')
+        parser.add_argument('--exclude', default='', help='跳过的端点名称，逗号分隔')
+        parser.add_argument('--json', dest='report', help='JSON 报告输出路径')
+
+    def handle(self, *args, **options):
+        scales = sorted({int(n) for n in options['scales'].split(',')})
+        if not scales or scales[0] < 1 or scales[-1] > MAX_ACCOUNTS:
+            raise CommandError(f'账号数量须在 1 - {MAX_ACCOUNTS} 之间')
+        excluded = {name.strip() for name in options['exclude'].split(',') if name.strip()}
+        endpoints = [e for e in _endpoints() if e[0] not in excluded]
+        actions = [a for a in POST_ENDPOINTS if a[0] not in excluded]
+
+        results = []
+        for scale in scales:
+            self.stdout.write(f'数据规模: {scale} 个账号')
+            with mock_services():
+                results.extend(self._run_scale(scale, endpoints, actions, options))
+
+        regressions = self._regressions(results, scales, options['tolerance'])
+        self._print(results, scales)
+
+        if options['report']:
+            report = {
+                'generated_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'scales': scales,
+                'results': results,
+                'regressions': regressions,
+            }
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f'报告已写入 {options["report"]}')
+
+        if regressions:
+            for r in regressions:
+                self.stderr.write(f'查询数随数据规模增长: {r["endpoint"]} {r["queries"]}')
+            raise CommandError(f'{len(regressions)} 个端点存在 N+1 查询')
+
+    def _run_scale(self, scale: int, endpoints: list, actions: list, options: dict) -> list:
+        results = []
+        with transaction.atomic():
+            started = time.perf_counter()
+            # 在事务内单进程写入，测试结束后整体回滚
+            generator = FixtureGenerator(seed=options['seed'], prefix=f'bench{scale}_')
+            generator.create_accounts(scale)
+            generator.create_connections(scale * options['connections'])
+            generator.create_logs(scale * options['logs'])
+            self.stdout.write(f'  生成数据 {time.perf_counter() - started:.1f}s')
+
+            user = get_user_model().objects.create(username=f'bench_{scale}', is_staff=True, is_superuser=True)
+            client = APIClient(SERVER_NAME='localhost')
+            client.raise_request_exception = False
+            client.force_authenticate(user)
+
+            requests = []
+            for name, view, detail in endpoints:
+                kwargs = None
+                if detail:
+                    pk = view.queryset.order_by('-pk').values_list('pk', flat=True).first()
+                    if pk is None:
+                        continue
+                    kwargs = {'pk': pk}
+                requests.append((name, 'get', reverse(name, kwargs=kwargs), None, None))
+            requests.extend((name, 'post', reverse(name), data, setup) for name, data, setup in actions)
+
+            for name, method, path, data, setup in requests:
+                timings = []
+                # 预热一次，缓存与惰性初始化不计入
+                for _ in range(max(options['repeat'], 1) + 1):
+                    with transaction.atomic():
+                        if setup:
+                            setup()
+                        with CaptureQueriesContext(connection) as queries:
+                            started = time.perf_counter()
+                            if method == 'get':
+                                response = client.get(path)
+                            else:
+                                response = client.post(path, data, format='json')
+                            timings.append((time.perf_counter() - started) * 1000)
+                        transaction.set_rollback(True)
+                results.append({
+                    'endpoint': name,
+                    'method': method.upper(),
+                    'path': path,
+                    'scale': scale,
+                    'status': response.status_code,
+                    'queries': len(queries),
+                    'ms': round(statistics.median(timings[1:]), 2),
+                })
+            transaction.set_rollback(True)
+        return results
+
+    @staticmethod
+    def _regressions(results: list, scales: list, tolerance: int) -> list:
+        """最小规模与更大规模下查询数之差超过 tolerance 的端点"""
+        by_endpoint = {}
+        for r in results:
+            by_endpoint.setdefault(r['endpoint'], {})[r['scale']] = r['queries']
+        regressions = []
+        for endpoint, counts in sorted(by_endpoint.items()):
+            base = counts.get(scales[0])
+            if base is not None and any(n - base > tolerance for n in counts.values()):
+                regressions.append({'endpoint': endpoint, 'queries': {str(s): counts.get(s) for s in scales}})
+        return regressions
+
+    def _print(self, results: list, scales: list):
+        table = {}
+        for r in results:
+            table.setdefault(r['endpoint'], {})[r['scale']] = r
+        header = f'{"端点":<32}' + ''.join(f'{f"{s} 查询/ms":>20}' for s in scales)
+        self.stdout.write(header)
+        for endpoint, rows in sorted(table.items()):
+            cells = []
+            for s in scales:
+                r = rows.get(s)
+                cell = f'{r["queries"]}/{r["ms"]:.1f}' if r else '-'
+                if r and r['status'] >= 400:
+                    cell += f' [{r["status"]}]'
+                cells.append(f'{cell:>20}')
+            self.stdout.write(f'{endpoint:<32}' + ''.join(cells))
@@ -0,0 +1,191 @@
+"""Socks5 转发性能测试命令"""
+
+import json
+import os
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _sink_server() -> tuple:
+    """启动丢弃全部数据的 TCP 服务，返回 (socket, port)"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', 0))
+    server.listen(128)
+
+    def _drain(conn):
+        buffer = bytearray(CHUNK_SIZE)
+        with conn:
+            while conn.recv_into(buffer):
+                pass
+
+    def _accept():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=_drain, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=_accept, daemon=True).start()
+    return server, server.getsockname()[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_port(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise CommandError(f'代理端口 {port} 未就绪')
+
+
+def _push(proxy_port: int, sink_port: int, total: int):
+    """经 Socks5 代理向 sink 发送 total 字节"""
+    payload = b'\0' * CHUNK_SIZE
+    with socket.create_connection(('127.0.0.1', proxy_port)) as sock:
+        sock.sendall(b'\x05\x01\x00')
+        if sock.recv(2) != b'\x05\x00':
+            raise CommandError('Socks5 方法协商失败')
+        sock.sendall(b'\x05\x01\x00\x01' + socket.inet_aton('127.0.0.1') + struct.pack('!H', sink_port))
+        reply = sock.recv(10)
+        if len(reply) < 2 or reply[1] != 0:
+            raise CommandError(f'Socks5 CONNECT 失败: {reply!r}')
+
+        sent = 0
+        while sent < total:
+            n = min(CHUNK_SIZE, total - sent)
+            sock.sendall(payload[:n])
+            sent += n
+        sock.shutdown(socket.SHUT_WR)
+        # 等待代理关闭连接，确保数据已全部转发
+        while sock.recv(CHUNK_SIZE):
+            pass
+
+
+class Command(BaseCommand):
+    help = '测试 Socks5 转发路径的 CPU 开销 (CPU 秒/GB)：内置引擎 copy/splice 模式与 Gost 对比'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1024, help='每个连接发送的数据量 (MB)')
+        parser.add_argument('--streams', type=int, default=4, help='并发连接数')
+        parser.add_argument('--modes', default='copy,splice,gost', help='测试的转发路径，逗号分隔')
+        parser.add_argument('--interface', default='lo', help='出站绑定接口')
+        parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+
+    def handle(self, *args, **options):
+        total = options['size'] * CHUNK_SIZE
+        streams = options['streams']
+        sink, sink_port = _sink_server()
+        results = []
+
+        try:
+            for mode in options['modes'].split(','):
+                mode = mode.strip()
+                if mode == 'gost' and not shutil.which(settings.GOST_BIN_PATH):
+                    self.stderr.write(f'跳过 gost: 未找到 {settings.GOST_BIN_PATH}')
+                    continue
+                results.append(self._run(mode, options['interface'], sink_port, total, streams))
+        finally:
+            sink.close()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f'{"路径":<8}{"数据量(GB)":>12}{"耗时(s)":>10}{"吞吐(MB/s)":>12}{"CPU(s)":>10}{"CPU秒/GB":>10}')
+        for r in results:
+            self.stdout.write(
+                f'{r["mode"]:<8}{r["gb"]:>12.2f}{r["elapsed"]:>10.2f}{r["mb_per_sec"]:>12.1f}'
+                f'{r["cpu"]:>10.2f}{r["cpu_per_gb"]:>10.3f}'
+            )
+
+    def _start_proxy(self, mode: str, interface: str, port: int, workdir: Path) -> int:
+        """启动被测代理进程，返回 PID"""
+        if mode == 'gost':
+            process = subprocess.Popen(
+                [settings.GOST_BIN_PATH, '-L', f'socks5://127.0.0.1:{port}?interface={interface}'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            return process.pid
+
+        from ...socks5 import Socks5Engine
+        from ...socks5.relay import resolve_mode
+
+        if resolve_mode(mode) != mode:
+            raise CommandError(f'当前平台不支持 {mode} 转发模式')
+
+        state_file = workdir / 'listeners.json'
+        state_file.write_text(json.dumps({str(port): interface}))
+        pid = os.fork()
+        if pid:
+            return pid
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        engine = Socks5Engine(
+            control_socket=str(workdir / 'control.sock'),
+            state_file=str(state_file),
+            relay_mode=mode,
+        )
+        try:
+            engine.run()
+        finally:
+            os._exit(0)
+
+    def _run(self, mode: str, interface: str, sink_port: int, total: int, streams: int) -> dict:
+        port = _free_port()
+        with tempfile.TemporaryDirectory() as workdir:
+            pid = self._start_proxy(mode, interface, port, Path(workdir))
+            try:
+                _wait_port(port)
+                errors = []
+
+                def _worker():
+                    try:
+                        _push(port, sink_port, total)
+                    except Exception as e:
+                        errors.append(e)
+
+                threads = [threading.Thread(target=_worker) for _ in range(streams)]
+                started = time.monotonic()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.monotonic() - started
+                if errors:
+                    raise CommandError(f'{mode} 转发失败: {errors[0]}')
+            finally:
+                os.kill(pid, signal.SIGTERM)
+                _, _, usage = os.wait4(pid, 0)
+
+        cpu = usage.ru_utime + usage.ru_stime
+        gb = total * streams / 1024 ** 3
+        return {
+            'mode': mode,
+            'gb': gb,
+            'elapsed': elapsed,
+            'mb_per_sec': gb * 1024 / elapsed,
+            'cpu': cpu,
+            'cpu_per_gb': cpu / gb,
+        }
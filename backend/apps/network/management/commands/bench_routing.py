@@ -0,0 +1,169 @@
+"""策略路由模式性能测试命令"""
+
+import ctypes
+import errno
+import ipaddress
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...services import RoutingService
+
+CLONE_NEWNET = 0x40000000
+
+# 测试网络命名空间内的地址规划：与 xl2tpd 一致，全部会话的服务器端地址相同 (local ip)，
+# 每个账号一个点对点接口 (veth，对端丢弃报文)，对端地址取自 PEER_NET
+SERVER_IP = '10.255.255.1'
+PEER_NET = ipaddress.IPv4Network('10.128.0.0/16')
+DEVICE_PREFIX = 'bench'
+TARGET = ('198.51.100.10', 80)
+TABLE_BASE = 1000
+
+
+def _unshare_net():
+    """进入新的网络命名空间，测试规则不影响主机"""
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(CLONE_NEWNET) != 0:
+        code = ctypes.get_errno()
+        raise OSError(code, f'创建网络命名空间失败: {os.strerror(code)}')
+
+
+def _connect_latency(interface: str) -> int:
+    """与代理出站连接相同，绑定服务器地址与账号接口后发起一次非阻塞 TCP 连接
+    (路由查找、nftables 输出钩子 + 发出 SYN)，返回耗时 (纳秒)"""
+    started = time.perf_counter_ns()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, interface.encode())
+        sock.bind((SERVER_IP, 0))
+        sock.setblocking(False)
+        code = sock.connect_ex(TARGET)
+        if code != errno.EINPROGRESS:
+            raise OSError(code, f'连接失败: {os.strerror(code)}')
+        return time.perf_counter_ns() - started
+    finally:
+        sock.close()
+
+
+def _measure(mode: str, accounts: int, samples: int) -> dict:
+    """在独立网络命名空间中配置 accounts 个账号的路由并测量连接建立耗时"""
+    _unshare_net()
+    interfaces = [f'{DEVICE_PREFIX}{i}' for i in range(accounts)]
+    peers = [str(PEER_NET[i + 1]) for i in range(accounts)]
+    commands = ['link set lo up']
+    for interface, peer in zip(interfaces, peers):
+        commands += [
+            f'link add {interface} type veth peer name {interface}p',
+            f'link set {interface}p up',
+            f'link set {interface} up',
+            f'addr add {SERVER_IP} peer {peer}/32 dev {interface}',
+            # 对端使用静态邻居表项，不触发 ARP
+            f'neigh add {peer} lladdr 02:00:00:00:00:02 dev {interface} nud permanent',
+        ]
+    result = subprocess.run(['ip', '-batch', '-'], capture_output=True, text=True, input='\n'.join(commands) + '\n')
+    if result.returncode != 0:
+        raise RuntimeError(f'测试网络配置失败: {result.stderr.strip()}')
+
+    # 与生产路径一致：source 模式每个账号一条 from <服务器地址> 规则，
+    # fwmark 模式规则按 mark 选表，mark 由 nftables 接口映射在连接上设置
+    routing = RoutingService(mode=mode)
+    tables = [TABLE_BASE + i for i in range(accounts)]
+    ops = []
+    checked = set()
+    for table, peer, interface in zip(tables, peers, interfaces):
+        table_ops, check = routing._setup_ops(table, SERVER_IP, peer, interface)
+        checked.update(len(ops) + i for i in (0, *check))
+        ops.extend(table_ops)
+
+    started = time.perf_counter()
+    # 删除可能不存在的旧规则失败不影响测试
+    failed = routing.apply_changes(ops) & checked
+    setup = time.perf_counter() - started
+    if failed:
+        raise RuntimeError(f'{len(failed)} 条路由变更失败')
+
+    def _once(index: int) -> int:
+        return _connect_latency(interfaces[index])
+
+    for index in range(min(accounts, 100)):
+        _once(index)
+    latencies = sorted(_once(random.randrange(accounts)) for _ in range(samples))
+    worst = sorted(_once(accounts - 1) for _ in range(samples))
+
+    return {
+        'mode': mode,
+        'accounts': accounts,
+        'setup_ms': setup * 1000,
+        'mean_us': sum(latencies) / len(latencies) / 1000,
+        'p50_us': latencies[len(latencies) // 2] / 1000,
+        'p99_us': latencies[int(len(latencies) * 0.99)] / 1000,
+        'last_us': worst[len(worst) // 2] / 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        '对比 source / fwmark 两种策略路由模式下的连接建立耗时 (需 root，在独立网络命名空间中运行，'
+        '不修改主机路由)；fwmark 模式的连接经 nftables 源地址映射打标记'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', default='100,1000,4000', help='账号数量，逗号分隔')
+        parser.add_argument('--modes', default='source,fwmark', help='测试的路由模式，逗号分隔')
+        parser.add_argument('--samples', type=int, default=5000, help='每组测量的连接数')
+        parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+
+    def handle(self, *args, **options):
+        results = []
+        for accounts in (int(n) for n in options['accounts'].split(',')):
+            if not 0 < accounts < PEER_NET.num_addresses - 1:
+                raise CommandError(f'账号数量须在 1 - {PEER_NET.num_addresses - 2} 之间')
+            for mode in (m.strip() for m in options['modes'].split(',')):
+                if mode not in ('source', 'fwmark'):
+                    raise CommandError(f'未知的路由模式: {mode}')
+                if mode == 'fwmark' and not shutil.which('nft'):
+                    raise CommandError('fwmark 模式需要 nft 命令')
+                results.append(self._run(mode, accounts, options['samples']))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(
+            f'{"模式":<8}{"账号数":>8}{"配置(ms)":>10}{"平均(us)":>10}{"P50(us)":>10}{"P99(us)":>10}{"末位(us)":>10}'
+        )
+        for r in results:
+            self.stdout.write(
+                f'{r["mode"]:<8}{r["accounts"]:>8}{r["setup_ms"]:>10.1f}{r["mean_us"]:>10.2f}'
+                f'{r["p50_us"]:>10.2f}{r["p99_us"]:>10.2f}{r["last_us"]:>10.2f}'
+            )
+
+    def _run(self, mode: str, accounts: int, samples: int) -> dict:
+        """在子进程中测量，子进程退出后网络命名空间随之销毁"""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if not pid:
+            os.close(read_fd)
+            try:
+                result = _measure(mode, accounts, samples)
+            except Exception as e:
+                result = {'error': str(e)}
+            with os.fdopen(write_fd, 'w') as pipe:
+                json.dump(result, pipe)
+            os._exit(0)
+
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            output = pipe.read()
+        os.waitpid(pid, 0)
+
+        result = json.loads(output or '{"error": "测试进程异常退出"}')
+        if 'error' in result:
+            raise CommandError(f'{mode} / {accounts}: {result["error"]}')
+        return result
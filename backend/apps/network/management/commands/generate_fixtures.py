@@ -0,0 +1,321 @@
+"""大规模测试数据生成命令"""
+
+import contextlib
+import ipaddress
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections as db_connections
+from django.db import transaction
+from django.utils import timezone
+
+# 测试数据使用的地址、端口与路由表 ID 区间，与 IP 地址池、代理端口范围错开
+IP_BASE = ipaddress.IPv4Address('10.128.0.0')
+PORT_BASE = 20000
+TABLE_BASE = 100000
+MAX_ACCOUNTS = 65535 - PORT_BASE
+
+# 每块使用独立的随机序列，生成结果与并行进程数无关
+LOG_CHUNK = 100000
+ACCOUNT_CHUNK = 500
+
+# 日志类型/级别分布与消息模板，取自各服务实际写入的日志
+LOG_TYPES = [('connection', 45), ('proxy', 25), ('routing', 15), ('l2tp', 10), ('system', 5)]
+LOG_LEVELS = [('info', 85), ('warning', 9), ('error', 4), ('debug', 2)]
+LOG_MESSAGES = {
+    'connection': ['Client 上线: {username}', 'Client 下线: {username}', '检测到僵死连接: {username}'],
+    'proxy': ['代理启动成功: 端口 {port}', '代理停止成功: 端口 {port}', '代理重新绑定: 端口 {port}'],
+    'routing': ['策略路由配置完成: {interface}', '策略路由清理完成: {interface}', '源路由清理完成: table={table}'],
+    'l2tp': ['创建账号: {username}', '更新账号: {username}', '终止连接: {interface}'],
+    'system': ['清理了 {n} 个僵死进程记录', 'xl2tpd 服务重启'],
+}
+
+# fork 出的工作进程通过该全局变量取得生成器
+_generator = None
+
+
+def _run_chunk(task: tuple):
+    method, chunk = task
+    return getattr(_generator, method)(chunk)
+
+
+@contextlib.contextmanager
+def _explicit_timestamps(*fields):
+    """暂时关闭 auto_now_add，bulk_create 写入生成的时间"""
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, saved):
+            field.auto_now_add = value
+
+
+class FixtureGenerator:
+    """按种子生成确定的大规模测试数据
+
+    账号及一一对应的代理配置、路由表；历史连接 (时长与流量为对数正态分布，在线账号的最后一次连接在线)；
+    系统日志 (类型/级别按实际比例)。全部以 bulk_create 分批写入。连接与日志按块生成，每块的随机序列
+    只由种子与块号决定，workers > 1 时由多个进程并行写入，同一种子与截止时间生成相同的数据。
+    """
+
+    def __init__(self, seed: int = 0, prefix: str = 'fx', until: datetime | None = None, days: int = 30,
+                 batch_size: int = 5000, workers: int = 1, progress=None):
+        self.seed = seed
+        self.prefix = prefix
+        self.until = until or timezone.now()
+        self.days = days
+        self.batch_size = batch_size
+        self.workers = workers
+        # progress(表名, 已写入行数)
+        self.progress = progress or (lambda table, count: None)
+        # [(账号 ID, 用户名)]、在线账号序号与每个账号的连接数
+        self.accounts = []
+        self.online = set()
+        self.sessions = []
+
+    def _random(self, table: str, chunk: int = 0) -> random.Random:
+        return random.Random(f'{self.seed}:{table}:{chunk}')
+
+    def _bulk_create(self, model, objects) -> int:
+        count = 0
+        iterator = iter(objects)
+        while batch := list(itertools.islice(iterator, self.batch_size)):
+            model.objects.bulk_create(batch)
+            count += len(batch)
+        return count
+
+    def _map(self, method: str, chunks: list):
+        """逐块执行 method，workers > 1 时在 fork 出的进程中并行执行 (各自建立数据库连接)"""
+        if self.workers <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                yield getattr(self, method)(chunk)
+            return
+
+        global _generator
+        _generator = self
+        db_connections.close_all()
+        with multiprocessing.get_context('fork').Pool(min(self.workers, len(chunks))) as pool:
+            yield from pool.imap_unordered(_run_chunk, [(method, chunk) for chunk in chunks])
+
+    def create_accounts(self, count: int, online: float = 0.5) -> list:
+        """生成账号、代理配置与路由表
+
+        Args:
+            count: 账号数
+            online: 在线账号比例，其代理为运行状态、路由表已激活并绑定接口
+
+        Returns:
+            [(账号 ID, 用户名)]
+        """
+        from apps.accounts.models import L2TPAccount
+
+        from ...models import ProxyConfig, RoutingTable
+
+        if count > MAX_ACCOUNTS:
+            raise ValueError(f'账号数不能超过 {MAX_ACCOUNTS}')
+        rng = self._random('accounts')
+        self.online = {i for i in range(count) if rng.random() < online}
+
+        created = [
+            L2TPAccount(
+                username=f'{self.prefix}{i:06d}',
+                password=f'{rng.getrandbits(48):012x}',
+                assigned_ip=str(IP_BASE + i + 1),
+                is_active=rng.random() < 0.95,
+            )
+            for i in range(count)
+        ]
+        with transaction.atomic():
+            self._bulk_create(L2TPAccount, created)
+            self._bulk_create(ProxyConfig, (
+                ProxyConfig(account_id=account.id, listen_port=PORT_BASE + i, is_running=i in self.online,
+                            auto_start=rng.random() < 0.9)
+                for i, account in enumerate(created)
+            ))
+            self._bulk_create(RoutingTable, (
+                RoutingTable(account_id=account.id, table_id=TABLE_BASE + i, table_name=f'rt_user_{account.id}',
+                             interface=f'ppp{i}' if i in self.online else '', is_active=i in self.online)
+                for i, account in enumerate(created)
+            ))
+        self.progress('l2tp_accounts', count)
+        self.accounts = [(account.id, account.username) for account in created]
+        return self.accounts
+
+    def _connection_chunk(self, chunk: int) -> tuple:
+        """逐个账号从截止时间向前排列互不重叠的连接，返回 (写入行数, 在线连接 [(账号 ID, 连接 ID)])"""
+        from apps.connections.models import Connection
+
+        rng = self._random('connections', chunk)
+        total = len(self.accounts)
+        current = []
+
+        def _rows():
+            for i in range(chunk * ACCOUNT_CHUNK, min((chunk + 1) * ACCOUNT_CHUNK, total)):
+                account_id = self.accounts[i][0]
+                online = i in self.online
+                ip = str(IP_BASE + i + 1)
+                # 账号的平均速率 (字节/秒)，中位数约 20KB/s
+                rate = rng.lognormvariate(math.log(20000), 1.0)
+                end = self.until
+                for n in range(self.sessions[i]):
+                    duration = min(max(rng.lognormvariate(math.log(3600), 1.2), 30), 7 * 86400)
+                    is_current = online and n == 0
+                    if not is_current:
+                        # 与后一次连接之间的间隔，平均 30 分钟
+                        end -= timedelta(seconds=rng.expovariate(1 / 1800))
+                    start = end - timedelta(seconds=duration)
+                    sent = int(rate * duration * rng.lognormvariate(0, 0.5))
+                    session = Connection(
+                        account_id=account_id,
+                        interface=f'ppp{i}' if is_current else f'ppp{rng.randrange(total)}',
+                        peer_ip=ip,
+                        local_ip=ip,
+                        status='online' if is_current else 'offline',
+                        connected_at=start,
+                        disconnected_at=None if is_current else end,
+                        bytes_sent=sent,
+                        bytes_received=int(sent * rng.uniform(0.05, 0.3)),
+                    )
+                    if is_current:
+                        current.append(session)
+                    yield session
+                    end = start
+
+        with _explicit_timestamps(Connection._meta.get_field('connected_at')):
+            count = self._bulk_create(Connection, _rows())
+        return count, [(session.account_id, session.id) for session in current]
+
+    def create_connections(self, count: int) -> int:
+        """生成 count 次历史连接 (每个在线账号至少一次)，并设置在线账号的当前连接"""
+        from apps.accounts.models import L2TPAccount
+
+        total = len(self.accounts)
+        if not total:
+            return 0
+        rng = self._random('sessions')
+        per_account, extra = divmod(count, total)
+        self.sessions = [
+            max(per_account + (rng.random() * total < extra), 1 if i in self.online else 0)
+            for i in range(total)
+        ]
+
+        created = 0
+        current = []
+        for rows, online in self._map('_connection_chunk', list(range(math.ceil(total / ACCOUNT_CHUNK)))):
+            created += rows
+            current.extend(online)
+            self.progress('connections', created)
+        L2TPAccount.objects.bulk_update(
+            [L2TPAccount(id=account_id, current_connection_id=connection_id) for account_id, connection_id in current],
+            ['current_connection'], batch_size=self.batch_size,
+        )
+        return created
+
+    def _log_chunk(self, chunk: tuple) -> int:
+        from apps.logs.models import SystemLog
+
+        index, count = chunk
+        rng = self._random('logs', index)
+        total = len(self.accounts)
+        offset = index * LOG_CHUNK
+        size = min(LOG_CHUNK, count - offset)
+        types, type_weights = zip(*LOG_TYPES)
+        levels, level_weights = zip(*LOG_LEVELS)
+        type_weights = list(itertools.accumulate(type_weights))
+        level_weights = list(itertools.accumulate(level_weights))
+        start = self.until - timedelta(days=self.days)
+        step = timedelta(days=self.days) / count
+
+        def _rows():
+            # 按时间先后写入，与实际的自增 ID 顺序一致
+            for n, log_type, level in zip(
+                range(offset, offset + size),
+                rng.choices(types, cum_weights=type_weights, k=size),
+                rng.choices(levels, cum_weights=level_weights, k=size),
+            ):
+                i = rng.randrange(total) if total and log_type != 'system' else None
+                account_id, username = self.accounts[i] if i is not None else (None, '')
+                interface = f'ppp{i}' if i is not None else ''
+                yield SystemLog(
+                    log_type=log_type,
+                    level=level,
+                    message=rng.choice(LOG_MESSAGES[log_type]).format(
+                        username=username, port=PORT_BASE + (i or 0), interface=interface,
+                        table=f'rt_user_{account_id}', n=rng.randrange(1, 10),
+                    ),
+                    account_id=account_id,
+                    interface=interface if log_type in ('connection', 'routing') else '',
+                    created_at=start + step * (n + rng.random()),
+                )
+
+        return self._bulk_create(SystemLog, _rows())
+
+    def create_logs(self, count: int) -> int:
+        """生成 count 条系统日志，均匀分布在截止时间前 days 天内"""
+        created = 0
+        for rows in self._map('_log_chunk', [(index, count) for index in range(math.ceil(count / LOG_CHUNK))]):
+            created += rows
+            self.progress('system_logs', created)
+        return created
+
+
+class Command(BaseCommand):
+    help = (
+        '按种子生成大规模测试数据：账号及代理配置、路由表，历史连接与系统日志 (bulk_create 分批写入)，'
+        '用于性能测试与复现规模问题'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=1000, help='账号数')
+        parser.add_argument('--connections', type=int, default=100000, help='历史连接数')
+        parser.add_argument('--logs', type=int, default=1000000, help='系统日志数')
+        parser.add_argument('--online', type=float, default=0.5, help='在线账号比例')
+        parser.add_argument('--days', type=int, default=30, help='日志时间跨度 (天)')
+        parser.add_argument('--until', help='数据截止时间 (ISO 格式)，默认当天零点；相同种子与截止时间生成相同数据')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子')
+        parser.add_argument('--prefix', default='fx', help='账号用户名前缀')
+        parser.add_argument('--batch-size', type=int, default=5000, help='每批写入行数')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行写入进程数')
+
+    def handle(self, *args, **options):
+        from apps.accounts.models import L2TPAccount
+
+        if not 1 <= options['accounts'] <= MAX_ACCOUNTS:
+            raise CommandError(f'账号数须在 1 - {MAX_ACCOUNTS} 之间')
+        if L2TPAccount.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f'已存在前缀为 {options["prefix"]} 的账号，请更换 --prefix')
+
+        if options['until']:
+            until = datetime.fromisoformat(options['until'])
+            if timezone.is_naive(until):
+                until = timezone.make_aware(until)
+        else:
+            until = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        started = time.perf_counter()
+
+        def _progress(table: str, count: int):
+            self.stdout.write(f'  {table}: {count} 行 ({time.perf_counter() - started:.0f}s)')
+
+        generator = FixtureGenerator(
+            seed=options['seed'], prefix=options['prefix'], until=until, days=options['days'],
+            batch_size=options['batch_size'], workers=options['workers'], progress=_progress,
+        )
+        accounts = len(generator.create_accounts(options['accounts'], online=options['online']))
+        connections = generator.create_connections(options['connections'])
+        logs = generator.create_logs(options['logs'])
+
+        total = accounts * 3 + connections + logs
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'账号 {accounts} 个，历史连接 {connections} 次，系统日志 {logs} 条；'
+            f'共 {total} 行，耗时 {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} 行/秒)'
+        ))
@@ -0,0 +1,85 @@
+"""Gost 进程监管服务命令"""
+
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+logger = logging.getLogger(__name__)
+
+
+def restore_running_proxies():
+    """监管服务就绪后，按数据库中的运行状态恢复 Gost 进程"""
+    from django.db import close_old_connections
+
+    from apps.connections.models import Connection
+
+    from ...models import ProxyConfig
+    from ...services import GostClusterService, get_gost_service
+
+    close_old_connections()
+    gost_service = get_gost_service()
+    restored = 0
+
+    if isinstance(gost_service, GostClusterService):
+        # Worker 配置文件包含全部监听，直接按配置启动
+        for worker in range(gost_service.workers):
+            if not gost_service._load_config(worker)['services']:
+                continue
+            pid = gost_service._spawn_worker(worker)
+            restored += ProxyConfig.objects.filter(gost_worker=worker, is_running=True).update(gost_pid=pid)
+        gost_service.firewall.sync_ports(
+            ProxyConfig.objects.filter(is_running=True).values_list('listen_port', flat=True)
+        )
+        return restored
+
+    proxies = list(ProxyConfig.objects.filter(is_running=True, backend='gost'))
+    online = {
+        c.account_id: c
+        for c in Connection.objects.filter(status='online', account_id__in=[p.account_id for p in proxies])
+    }
+    orphaned = []
+    # 内置 Socks5 引擎的端口由 socks5_server 维护，重建集合时保留
+    ports = list(ProxyConfig.objects.filter(is_running=True, backend='socks5').values_list('listen_port', flat=True))
+    for proxy in proxies:
+        connection = online.get(proxy.account_id)
+        if not connection:
+            orphaned.append(proxy.id)
+            continue
+        try:
+            gost_service.start(
+                port=proxy.listen_port, bind_ip=connection.peer_ip, interface=connection.interface,
+                open_firewall=False
+            )
+            ports.append(proxy.listen_port)
+            restored += 1
+        except Exception as e:
+            logger.error(f'恢复代理失败: 端口={proxy.listen_port}, 错误: {e}')
+            orphaned.append(proxy.id)
+
+    # 一次事务重建防火墙端口集合
+    gost_service.firewall.sync_ports(ports)
+
+    if orphaned:
+        ProxyConfig.objects.filter(id__in=orphaned).update(is_running=False, gost_pid=None, gost_worker=None)
+    logger.info(f'已恢复 {restored} 个代理，重置 {len(orphaned)} 个')
+    return restored
+
+
+class Command(BaseCommand):
+    help = '运行 Gost 进程监管服务：持有全部 Gost 子进程，异常退出时自动重启并回写状态'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-restore', action='store_true', help='启动时不恢复数据库中运行中的代理')
+
+    def handle(self, *args, **options):
+        from ...services.supervisor import ProcessSupervisor
+
+        socket_path = settings.GOST_SUPERVISOR_SOCKET
+        if not socket_path:
+            raise CommandError('未配置 GOST_SUPERVISOR_SOCKET')
+
+        supervisor = ProcessSupervisor(socket_path)
+        on_ready = None if options['no_restore'] else restore_running_proxies
+        self.stdout.write(f'进程监管服务启动: {socket_path}')
+        supervisor.run(on_ready=on_ready)
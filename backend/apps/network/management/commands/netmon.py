@@ -0,0 +1,121 @@
+"""PPP 接口监视服务命令"""
+
+import logging
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.logs.models import SystemLog
+
+logger = logging.getLogger(__name__)
+
+
+def close_removed(removed: set, before) -> int:
+    """接口消失后立即将其上的在线连接标记为离线，并同步策略路由"""
+    from django.db import close_old_connections
+
+    from apps.connections.models import Connection
+
+    from ...services import RoutingReconciler
+
+    close_old_connections()
+    stale = Connection.close_missing(removed, before=before)
+    for connection in stale:
+        SystemLog.log_connection(
+            f'接口已消失，连接下线: {connection.account.username}',
+            account=connection.account,
+            interface=connection.interface,
+            level='warning'
+        )
+    if stale:
+        # 清空已下线账号的路由表、删除其规则
+        RoutingReconciler().reconcile()
+    return len(stale)
+
+
+def reconcile_routing() -> dict:
+    """按数据库状态同步内核策略路由，并清理 rt_tables 中已删除账号的表项（定时执行，需主机网络命名空间）"""
+    from django.db import close_old_connections
+
+    from ...models import RoutingTable
+    from ...services import RoutingReconciler, RtTables
+    from ...services.rt_tables import RtTablesError
+
+    close_old_connections()
+    result = RoutingReconciler().reconcile()
+    try:
+        result['rt_tables_pruned'] = RtTables().prune(
+            dict(RoutingTable.objects.values_list('table_id', 'table_name'))
+        )
+    except RtTablesError as e:
+        SystemLog.log_error('routing', f'清理 rt_tables 失败: {e}')
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        '运行 PPP 接口监视服务：订阅 netlink 链路通知维护接口清单缓存，接口消失时立即清理对应连接；'
+        '定时采样接口流量计数，计算收发速率并写入账号流量历史；定时同步策略路由'
+    )
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+        from django.utils import timezone
+
+        from ...services import InterfaceInventory, TrafficRecorder, TrafficSampler
+
+        stopping = False
+
+        def _stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        def _on_change(previous: dict, current: dict):
+            removed = set(previous) - set(current)
+            added = set(current) - set(previous)
+            if added or removed:
+                logger.info(f'PPP 接口变化: +{sorted(added)} -{sorted(removed)}')
+            if removed:
+                try:
+                    closed = close_removed(removed, before=timezone.now())
+                except Exception as e:
+                    logger.error(f'清理已消失接口的连接失败: {e}')
+                    return
+                if closed:
+                    logger.info(f'已下线 {closed} 个连接')
+
+        sampler = TrafficSampler()
+        recorder = TrafficRecorder()
+        reconcile_interval = settings.ROUTING_RECONCILE_INTERVAL
+        next_reconcile = time.monotonic()
+
+        def _on_scan(interfaces: dict):
+            nonlocal next_reconcile
+            sampler.add(interfaces)
+            sampler.publish()
+            try:
+                recorder.add(interfaces)
+            except Exception as e:
+                logger.error(f'写入流量历史失败: {e}')
+
+            # 路由同步搭载在采样节拍上，启动时先同步一次
+            if reconcile_interval > 0 and time.monotonic() >= next_reconcile:
+                next_reconcile = time.monotonic() + reconcile_interval
+                try:
+                    reconcile_routing()
+                except Exception as e:
+                    logger.error(f'同步策略路由失败: {e}')
+
+        inventory = InterfaceInventory()
+        # 采样节拍同时用于续期缓存，不能超过有效期的 1/3
+        interval = min(settings.TRAFFIC_SAMPLE_INTERVAL, inventory.ttl / 3)
+        self.stdout.write(
+            f'接口监视服务启动: 缓存有效期 {inventory.ttl} 秒, 流量采样间隔 {interval} 秒, '
+            f'路由同步间隔 {reconcile_interval} 秒'
+        )
+        inventory.watch(on_change=_on_change, on_scan=_on_scan, stop=lambda: stopping, interval=interval)
+        self.stdout.write('接口监视服务已停止')
@@ -0,0 +1,130 @@
+"""内置 Socks5 引擎服务命令"""
+
+import logging
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+logger = logging.getLogger(__name__)
+
+
+def restore_listeners(socks5_service) -> int:
+    """按数据库中运行中的 socks5 后端代理重建监听状态文件"""
+    from apps.connections.models import Connection
+
+    from ...models import ProxyConfig
+
+    proxies = list(ProxyConfig.objects.filter(is_running=True, backend='socks5'))
+    online = {
+        c.account_id: c
+        for c in Connection.objects.filter(status='online', account_id__in=[p.account_id for p in proxies])
+    }
+
+    state = {}
+    orphaned = []
+    for proxy in proxies:
+        connection = online.get(proxy.account_id)
+        if connection:
+            state[proxy.listen_port] = connection.interface
+        else:
+            orphaned.append(proxy.id)
+
+    with socks5_service._locked():
+        socks5_service._save_state(state)
+    socks5_service.firewall.open_ports(list(state))
+
+    if orphaned:
+        ProxyConfig.objects.filter(id__in=orphaned).update(is_running=False, gost_pid=None, gost_worker=None)
+    logger.info(f'已恢复 {len(state)} 个 Socks5 监听，重置 {len(orphaned)} 个')
+    return len(state)
+
+
+class Command(BaseCommand):
+    help = '运行内置 Socks5 引擎：每核一个事件循环 Worker，以 SO_REUSEPORT 共享全部监听端口'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.SOCKS5_WORKERS, help='Worker 进程数')
+        parser.add_argument('--no-restore', action='store_true', help='启动时不按数据库恢复监听')
+
+    def handle(self, *args, **options):
+        from django.db import connections
+
+        from ...services import Socks5Service
+
+        socks5_service = Socks5Service()
+        run_dir = socks5_service.run_dir
+        workers = max(1, options['workers'])
+
+        for stale in run_dir.glob('worker-*.sock'):
+            stale.unlink(missing_ok=True)
+        if not options['no_restore']:
+            restore_listeners(socks5_service)
+        (run_dir / 'engine.pid').write_text(str(os.getpid()))
+
+        # 子进程不使用数据库连接
+        connections.close_all()
+
+        self.children = {}
+        self.stopping = False
+
+        def _stop(signum, frame):
+            self.stopping = True
+            for pid in self.children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        for worker in range(workers):
+            self._spawn(worker, socks5_service)
+        self.stdout.write(f'Socks5 引擎启动: {workers} 个 Worker, {run_dir}')
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            worker = self.children.pop(pid, None)
+            if worker is None:
+                continue
+            (run_dir / f'worker-{worker}.sock').unlink(missing_ok=True)
+            if self.stopping:
+                continue
+
+            logger.warning(f'Socks5 Worker {worker} 异常退出 (status={status})，1 秒后重启')
+            time.sleep(1)
+            self._spawn(worker, socks5_service)
+
+        (run_dir / 'engine.pid').unlink(missing_ok=True)
+
+    def _spawn(self, worker: int, socks5_service):
+        from ...socks5 import Socks5Engine
+
+        pid = os.fork()
+        if pid:
+            self.children[pid] = worker
+            return
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        engine = Socks5Engine(
+            control_socket=str(socks5_service.run_dir / f'worker-{worker}.sock'),
+            state_file=str(socks5_service.state_file),
+            max_connections=settings.SOCKS5_MAX_CONNECTIONS,
+            handshake_timeout=settings.SOCKS5_HANDSHAKE_TIMEOUT,
+            connect_timeout=settings.SOCKS5_CONNECT_TIMEOUT,
+            relay_mode=settings.SOCKS5_RELAY_MODE,
+        )
+        try:
+            engine.run()
+        except BaseException:
+            logger.exception(f'Socks5 Worker {worker} 运行失败')
+            os._exit(1)
+        os._exit(0)
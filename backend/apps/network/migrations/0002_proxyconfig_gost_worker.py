@@ -0,0 +1,37 @@
+# Generated manually
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServerConfig',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(blank=True, default='', max_length=255, verbose_name='域名')),
+                ('public_ip', models.GenericIPAddressField(blank=True, null=True, verbose_name='公网 IP')),
+                ('private_ip', models.GenericIPAddressField(blank=True, null=True, verbose_name='内网 IP')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '服务器配置',
+                'verbose_name_plural': '服务器配置',
+                'db_table': 'server_config',
+            },
+        ),
+        migrations.AddField(
+            model_name='proxyconfig',
+            name='exit_ip',
+            field=models.GenericIPAddressField(blank=True, null=True, verbose_name='出口IP'),
+        ),
+        migrations.AddField(
+            model_name='proxyconfig',
+            name='gost_worker',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Gost Worker编号'),
+        ),
+    ]
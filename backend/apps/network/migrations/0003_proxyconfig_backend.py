@@ -0,0 +1,17 @@
+# Generated manually
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0002_proxyconfig_gost_worker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proxyconfig',
+            name='backend',
+            field=models.CharField(choices=[('gost', 'Gost'), ('socks5', '内置 Socks5 引擎')], default='gost', max_length=16, verbose_name='代理后端'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated manually
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('connections', '0001_initial'),
+        ('network', '0003_proxyconfig_backend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proxyconfig',
+            name='exit_ip_checked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='出口IP检测时间'),
+        ),
+        migrations.AddField(
+            model_name='proxyconfig',
+            name='exit_ip_connection',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='connections.connection', verbose_name='出口IP检测时的连接'),
+        ),
+        migrations.CreateModel(
+            name='ExitIPHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip', models.GenericIPAddressField(verbose_name='出口IP')),
+                ('first_seen', models.DateTimeField(verbose_name='首次出现')),
+                ('last_seen', models.DateTimeField(verbose_name='最后出现')),
+                ('proxy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exit_ip_history', to='network.proxyconfig', verbose_name='代理')),
+            ],
+            options={
+                'verbose_name': '出口IP历史',
+                'verbose_name_plural': '出口IP历史',
+                'db_table': 'exit_ip_history',
+                'ordering': ['-last_seen'],
+                'indexes': [models.Index(fields=['ip', 'last_seen'], name='exit_ip_hist_ip_seen_idx'), models.Index(fields=['proxy', 'first_seen'], name='exit_ip_hist_proxy_first_idx')],
+            },
+        ),
+    ]
@@ -1,7 +1,6 @@
 """网络配置模型"""
 
-from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 
 
 class ServerConfig(models.Model):
@@ -51,6 +50,11 @@ class ProxyConfig(models.Model):
         verbose_name = '代理配置'
         verbose_name_plural = '代理配置'
 
+    BACKEND_CHOICES = [
+        ('gost', 'Gost'),
+        ('socks5', '内置 Socks5 引擎'),
+    ]
+
     account = models.OneToOneField(
         'accounts.L2TPAccount',
         on_delete=models.CASCADE,
@@ -58,9 +62,20 @@ class ProxyConfig(models.Model):
         verbose_name='关联账号'
     )
     listen_port = models.IntegerField('监听端口', unique=True)
+    backend = models.CharField('代理后端', max_length=16, choices=BACKEND_CHOICES, default='gost')
     is_running = models.BooleanField('运行状态', default=False)
     gost_pid = models.IntegerField('Gost进程ID', null=True, blank=True)
+    gost_worker = models.IntegerField('Gost Worker编号', null=True, blank=True)
     exit_ip = models.GenericIPAddressField('出口IP', blank=True, null=True)
+    exit_ip_checked_at = models.DateTimeField('出口IP检测时间', null=True, blank=True)
+    exit_ip_connection = models.ForeignKey(
+        'connections.Connection',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='出口IP检测时的连接'
+    )
     auto_start = models.BooleanField('自动启动', default=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
     updated_at = models.DateTimeField('更新时间', auto_now=True)
@@ -71,17 +86,15 @@ class ProxyConfig(models.Model):
 
     @classmethod
     def get_next_available_port(cls):
-        """获取下一个可用的端口"""
-        start_port = settings.PROXY_PORT_START
-        end_port = settings.PROXY_PORT_END
-
-        used_ports = set(cls.objects.values_list('listen_port', flat=True))
+        """获取下一个可用的端口
 
-        for port in range(start_port, end_port + 1):
-            if port not in used_ports:
-                return port
+        调用方应在 transaction.atomic() 中完成分配与创建，分配锁持有到事务提交。
+        """
+        from .allocators import PortAllocator
 
-        return None
+        with transaction.atomic():
+            ports = PortAllocator().allocate(1)
+        return ports[0] if ports else None
 
     @classmethod
     def get_running_proxies(cls):
@@ -89,6 +102,54 @@ class ProxyConfig(models.Model):
         return cls.objects.filter(is_running=True).select_related('account')
 
 
+class ExitIPHistory(models.Model):
+    """出口 IP 变更历史（只追加：IP 未变化时仅更新 last_seen）"""
+
+    class Meta:
+        db_table = 'exit_ip_history'
+        ordering = ['-last_seen']
+        verbose_name = '出口IP历史'
+        verbose_name_plural = '出口IP历史'
+        indexes = [
+            # 查询当前共用同一出口 IP 的代理
+            models.Index(fields=['ip', 'last_seen'], name='exit_ip_hist_ip_seen_idx'),
+            # 查询某代理/账号的出口 IP 轮换
+            models.Index(fields=['proxy', 'first_seen'], name='exit_ip_hist_proxy_first_idx'),
+        ]
+
+    proxy = models.ForeignKey(
+        ProxyConfig,
+        on_delete=models.CASCADE,
+        related_name='exit_ip_history',
+        verbose_name='代理'
+    )
+    ip = models.GenericIPAddressField('出口IP')
+    first_seen = models.DateTimeField('首次出现')
+    last_seen = models.DateTimeField('最后出现')
+
+    def __str__(self):
+        return f'{self.proxy_id}: {self.ip}'
+
+    @classmethod
+    def shared_ips(cls, since):
+        """since 之后仍被观测到、且被多个代理共用的出口 IP
+
+        Returns:
+            [{'ip': ..., 'proxies': [代理ID, ...]}]
+        """
+        from django.contrib.postgres.aggregates import ArrayAgg
+        from django.db.models import Count
+
+        return list(
+            cls.objects.filter(last_seen__gte=since)
+            .values('ip')
+            .annotate(count=Count('proxy', distinct=True), proxies=ArrayAgg('proxy', distinct=True))
+            .filter(count__gt=1)
+            .order_by('-count')
+            .values('ip', 'proxies')
+        )
+
+
 class RoutingTable(models.Model):
     """路由表配置模型"""
 
@@ -116,8 +177,12 @@ class RoutingTable(models.Model):
 
     @classmethod
     def get_next_table_id(cls):
-        """获取下一个可用的路由表 ID"""
-        last = cls.objects.order_by('-table_id').first()
-        if last:
-            return last.table_id + 1
-        return 100
+        """获取下一个可用的路由表 ID（复用已释放的 ID）
+
+        调用方应在 transaction.atomic() 中完成分配与创建，分配锁持有到事务提交。
+        """
+        from .allocators import RoutingTableAllocator
+
+        with transaction.atomic():
+            table_ids = RoutingTableAllocator().allocate(1)
+        return table_ids[0] if table_ids else None
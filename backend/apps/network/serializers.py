@@ -2,7 +2,7 @@
 
 from rest_framework import serializers
 
-from .models import ProxyConfig, RoutingTable, ServerConfig
+from .models import ExitIPHistory, ProxyConfig, RoutingTable, ServerConfig
 
 
 class ProxyConfigSerializer(serializers.ModelSerializer):
@@ -15,22 +15,27 @@ class ProxyConfigSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProxyConfig
         fields = [
-            'id', 'account', 'username', 'assigned_ip', 'listen_port',
-            'is_running', 'gost_pid', 'exit_ip', 'auto_start', 'is_online',
+            'id', 'account', 'username', 'assigned_ip', 'listen_port', 'backend',
+            'is_running', 'gost_pid', 'gost_worker', 'exit_ip', 'auto_start', 'is_online',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'gost_pid', 'exit_ip', 'is_running', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'gost_pid', 'gost_worker', 'exit_ip', 'is_running', 'created_at', 'updated_at']
 
     def get_is_online(self, obj):
         return obj.account.is_online
 
+    def validate_backend(self, value):
+        if self.instance and self.instance.is_running and value != self.instance.backend:
+            raise serializers.ValidationError('请先停止代理再切换后端')
+        return value
+
 
 class ProxyConfigCreateSerializer(serializers.ModelSerializer):
     """代理配置创建序列化器"""
 
     class Meta:
         model = ProxyConfig
-        fields = ['account', 'listen_port', 'auto_start']
+        fields = ['account', 'listen_port', 'backend', 'auto_start']
 
     def validate_listen_port(self, value):
         from django.conf import settings
@@ -42,6 +47,14 @@ class ProxyConfigCreateSerializer(serializers.ModelSerializer):
         return value
 
 
+class ExitIPHistorySerializer(serializers.ModelSerializer):
+    """出口 IP 历史序列化器"""
+
+    class Meta:
+        model = ExitIPHistory
+        fields = ['id', 'proxy', 'ip', 'first_seen', 'last_seen']
+
+
 class RoutingTableSerializer(serializers.ModelSerializer):
     """路由表序列化器"""
 
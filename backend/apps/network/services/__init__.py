@@ -1,6 +1,21 @@
+from .bulk import BulkProxyService
+from .exit_ip import ExitIPProber
+from .firewall import FirewallService
 from .gost import GostService
+from .gost_cluster import GostClusterService
+from .interfaces import InterfaceInventory
 from .ip_detect import IPDetectService
 from .l2tp import L2TPService
+from .probe import ProxyProbe
+from .proxy import get_gost_service, get_proxy_service
+from .reconciler import RoutingReconciler
 from .routing import RoutingService
+from .rt_tables import RtTables
+from .socks5 import Socks5Service
+from .traffic import TrafficRecorder, TrafficSampler
 
-__all__ = ['GostService', 'IPDetectService', 'L2TPService', 'RoutingService']
+__all__ = [
+    'BulkProxyService', 'ExitIPProber', 'FirewallService', 'GostClusterService', 'GostService', 'IPDetectService',
+    'InterfaceInventory', 'L2TPService', 'ProxyProbe', 'RoutingReconciler', 'RoutingService', 'RtTables',
+    'Socks5Service', 'TrafficRecorder', 'TrafficSampler', 'get_gost_service', 'get_proxy_service',
+]
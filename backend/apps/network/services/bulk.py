@@ -0,0 +1,215 @@
+"""代理批量操作"""
+
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection as db_connection
+from django.utils import timezone
+
+from apps.logs.models import SystemLog
+
+from .firewall import FirewallService
+from .proxy import get_proxy_service
+from .routing import RoutingService
+
+logger = logging.getLogger(__name__)
+
+
+class BulkProxyService:
+    """代理批量启停流水线
+
+    启动：
+    1. 预取：代理/账号、在线连接、路由表共 3 次查询
+    2. 路由：全部目标一次写入 rt_tables，ip route/rule 由一个 ip -batch 进程提交
+    3. 启动：有界线程池并发启动监听，状态一次 bulk_update 写回，防火墙端口一次开放
+
+    停止：按后端批量发送停止信号并在共同截止时间内等待退出，路由规则一次批量清理，
+    状态一次 bulk_update 写回，防火墙端口一次关闭。
+
+    每次执行生成 job_id，逐代理结果保存在缓存中 BULK_JOB_TTL 秒。
+    """
+
+    CACHE_PREFIX = 'bulk_job:'
+
+    def __init__(self, max_workers: int | None = None):
+        self.max_workers = max_workers or settings.BULK_START_WORKERS
+        self.routing = RoutingService()
+
+    @classmethod
+    def get_job(cls, job_id: str) -> dict | None:
+        """查询批量任务结果"""
+        return cache.get(cls.CACHE_PREFIX + job_id)
+
+    def _save_job(self, job_id: str, results: dict, **counts) -> dict:
+        job = {'job_id': job_id, **counts, 'results': list(results.values())}
+        cache.set(self.CACHE_PREFIX + job_id, job, settings.BULK_JOB_TTL)
+        return job
+
+    @staticmethod
+    def _launch(proxy, conn) -> tuple:
+        """启动单个代理监听（在线程池中执行）
+
+        Returns:
+            (pid, worker, 错误信息)
+        """
+        try:
+            proxy_service = get_proxy_service(proxy.backend)
+            pid = proxy_service.start(
+                port=proxy.listen_port,
+                bind_ip=conn.peer_ip,
+                interface=conn.interface,
+                open_firewall=False
+            )
+            return pid, proxy_service.get_worker(proxy.listen_port), None
+        except Exception as e:
+            return None, None, str(e)
+        finally:
+            # 服务内部会写 SystemLog，释放本线程的数据库连接
+            db_connection.close()
+
+    def start(self, proxies) -> dict:
+        """批量启动代理
+
+        Args:
+            proxies: ProxyConfig 查询集
+
+        Returns:
+            {'job_id', 'started', 'failed', 'skipped',
+             'results': [{'id', 'port', 'account', 'status', 'error'}]}
+        """
+        from ..models import ProxyConfig, RoutingTable
+
+        job_id = uuid.uuid4().hex
+
+        # 阶段 1：预取
+        proxies = list(proxies.select_related('account__current_connection'))
+        account_ids = [p.account_id for p in proxies]
+        connections = {p.account_id: p.account.current_connection for p in proxies if p.account.current_connection}
+        routing_tables = {rt.account_id: rt for rt in RoutingTable.objects.filter(account_id__in=account_ids)}
+
+        results = {
+            p.id: {'id': p.id, 'port': p.listen_port, 'account': p.account.username, 'status': 'skipped', 'error': ''}
+            for p in proxies
+        }
+        targets = []
+        for proxy in proxies:
+            if proxy.account_id not in connections:
+                results[proxy.id]['error'] = '账号不在线'
+            elif proxy.account_id not in routing_tables:
+                results[proxy.id].update(status='failed', error='账号未分配路由表')
+            else:
+                targets.append(proxy)
+
+        # 阶段 2：批量配置源路由
+        routed = self.routing.setup_source_routing_batch([
+            {
+                'interface': connections[p.account_id].interface,
+                'table_id': routing_tables[p.account_id].table_id,
+                'table_name': routing_tables[p.account_id].table_name,
+                'local_ip': connections[p.account_id].peer_ip,
+                'peer_ip': connections[p.account_id].local_ip,
+            }
+            for p in targets
+        ])
+        launchable = []
+        for proxy in targets:
+            if routed.get(routing_tables[proxy.account_id].table_id):
+                launchable.append(proxy)
+            else:
+                results[proxy.id].update(status='failed', error='源路由配置失败')
+
+        # 阶段 3：并发启动监听，一次写回
+        started = []
+        if launchable:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(launchable))) as executor:
+                outcomes = executor.map(lambda p: self._launch(p, connections[p.account_id]), launchable)
+                now = timezone.now()
+                for proxy, (pid, worker, error) in zip(launchable, outcomes):
+                    if error:
+                        results[proxy.id].update(status='failed', error=error)
+                        continue
+                    proxy.gost_pid = pid
+                    proxy.gost_worker = worker
+                    proxy.is_running = True
+                    proxy.updated_at = now
+                    started.append(proxy)
+                    results[proxy.id]['status'] = 'started'
+
+        if started:
+            ProxyConfig.objects.bulk_update(started, ['gost_pid', 'gost_worker', 'is_running', 'updated_at'])
+            FirewallService().open_ports([p.listen_port for p in started])
+
+        job = self._save_job(
+            job_id, results,
+            started=len(started),
+            failed=sum(r['status'] == 'failed' for r in results.values()),
+            skipped=sum(r['status'] == 'skipped' for r in results.values()),
+        )
+
+        logger.info(f'批量启动代理: job={job_id}, 成功 {job["started"]}, 失败 {job["failed"]}, 跳过 {job["skipped"]}')
+        SystemLog.log_proxy(
+            f'批量启动代理: 成功 {job["started"]}, 失败 {job["failed"]}',
+            details={'job_id': job_id, 'skipped': job['skipped']}
+        )
+        return job
+
+    def stop(self, proxies, timeout: float | None = None) -> dict:
+        """批量停止代理并清理源路由
+
+        Args:
+            proxies: ProxyConfig 查询集
+            timeout: 等待进程退出的共同截止秒数，默认 PROXY_STOP_TIMEOUT
+
+        Returns:
+            {'job_id', 'stopped', 'failed',
+             'results': [{'id', 'port', 'account', 'status', 'error'}]}
+        """
+        from ..models import ProxyConfig, RoutingTable
+
+        job_id = uuid.uuid4().hex
+
+        proxies = list(proxies.select_related('account'))
+        routing_tables = RoutingTable.objects.filter(account_id__in=[p.account_id for p in proxies])
+
+        # 同一后端的端口一次停止
+        by_backend = {}
+        for proxy in proxies:
+            by_backend.setdefault(proxy.backend, []).append(proxy.listen_port)
+        stopped_ports = {}
+        for backend, ports in by_backend.items():
+            stopped_ports.update(get_proxy_service(backend).stop_many(ports, timeout=timeout))
+
+        self.routing.cleanup_source_routing_batch([(rt.table_id, rt.table_name) for rt in routing_tables])
+
+        # 与单个停止一致：停止失败（如进程已不存在）也视为已停止并重置状态
+        now = timezone.now()
+        results = {}
+        for proxy in proxies:
+            ok = stopped_ports.get(proxy.listen_port, False)
+            results[proxy.id] = {
+                'id': proxy.id,
+                'port': proxy.listen_port,
+                'account': proxy.account.username,
+                'status': 'stopped' if ok else 'failed',
+                'error': '' if ok else '停止失败或进程已不存在',
+            }
+            proxy.gost_pid = None
+            proxy.gost_worker = None
+            proxy.is_running = False
+            proxy.exit_ip = None
+            proxy.updated_at = now
+
+        if proxies:
+            ProxyConfig.objects.bulk_update(
+                proxies, ['gost_pid', 'gost_worker', 'is_running', 'exit_ip', 'updated_at']
+            )
+            FirewallService().close_ports([p.listen_port for p in proxies])
+
+        stopped = sum(r['status'] == 'stopped' for r in results.values())
+        job = self._save_job(job_id, results, stopped=stopped, failed=len(results) - stopped)
+
+        logger.info(f'批量停止代理: job={job_id}, 成功 {stopped}, 失败 {len(results) - stopped}')
+        return job
@@ -0,0 +1,220 @@
+"""出口 IP 并发检测"""
+
+import asyncio
+import ipaddress
+import logging
+import ssl
+import struct
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExitIPError(Exception):
+    """出口 IP 检测异常"""
+    pass
+
+
+class ExitIPProber:
+    """经本机 Socks5 代理并发检测出口 IP
+
+    在单个事件循环内以内置的最小 Socks5 客户端（无认证 CONNECT，域名由代理解析）
+    访问 IP 回显服务：每个代理同时请求全部回显地址，取最先返回的有效 IP；
+    同时检测的代理数由 EXIT_IP_CONCURRENCY 限制。
+    """
+
+    MAX_RESPONSE = 64 * 1024
+
+    def __init__(self, urls: list | None = None, concurrency: int | None = None,
+                 timeout: float | None = None, proxy_host: str = '127.0.0.1'):
+        self.urls = urls or settings.EXIT_IP_ECHO_URLS
+        self.concurrency = concurrency or settings.EXIT_IP_CONCURRENCY
+        self.timeout = timeout or settings.EXIT_IP_TIMEOUT
+        self.proxy_host = proxy_host
+        self.ssl_context = ssl.create_default_context()
+
+    async def _socks5_connect(self, proxy_port: int, host: str, port: int):
+        """建立经 Socks5 代理到 host:port 的连接"""
+        reader, writer = await asyncio.open_connection(self.proxy_host, proxy_port)
+        try:
+            writer.write(b'\x05\x01\x00')
+            if await reader.readexactly(2) != b'\x05\x00':
+                raise ExitIPError('Socks5 方法协商失败')
+
+            name = host.encode('idna')
+            writer.write(b'\x05\x01\x00\x03' + bytes([len(name)]) + name + struct.pack('!H', port))
+            version, reply, _, atyp = await reader.readexactly(4)
+            if reply != 0:
+                raise ExitIPError(f'Socks5 CONNECT 失败: {reply}')
+            if atyp == 0x01:
+                await reader.readexactly(4 + 2)
+            elif atyp == 0x04:
+                await reader.readexactly(16 + 2)
+            else:
+                await reader.readexactly((await reader.readexactly(1))[0] + 2)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def _fetch(self, proxy_port: int, url: str) -> str:
+        """经代理请求回显地址，返回校验后的 IP"""
+        parts = urlsplit(url)
+        https = parts.scheme == 'https'
+        port = parts.port or (443 if https else 80)
+        reader, writer = await self._socks5_connect(proxy_port, parts.hostname, port)
+        try:
+            if https:
+                await writer.start_tls(self.ssl_context, server_hostname=parts.hostname)
+
+            # HTTP/1.0 避免分块传输编码
+            writer.write(
+                f'GET {parts.path or "/"} HTTP/1.0\r\nHost: {parts.hostname}\r\n'
+                f'User-Agent: curl/7.68.0\r\nAccept: */*\r\n\r\n'.encode()
+            )
+            response = await reader.read(self.MAX_RESPONSE)
+            while not reader.at_eof() and len(response) < self.MAX_RESPONSE:
+                response += await reader.read(self.MAX_RESPONSE - len(response))
+        finally:
+            writer.close()
+
+        head, _, body = response.partition(b'\r\n\r\n')
+        status_line = head.split(b'\r\n', 1)[0].split()
+        if len(status_line) < 2 or status_line[1] != b'200':
+            raise ExitIPError(f'{url} 响应异常: {head[:64]!r}')
+        return str(ipaddress.ip_address(body.decode().strip()))
+
+    async def _probe_one(self, semaphore: asyncio.Semaphore, proxy_port: int) -> str | None:
+        """同时请求全部回显地址，返回最先得到的有效 IP"""
+        async with semaphore:
+            result = None
+            tasks = {asyncio.ensure_future(self._fetch(proxy_port, url)) for url in self.urls}
+            try:
+                async with asyncio.timeout(self.timeout):
+                    while tasks and result is None:
+                        done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            # 逐个取出异常，未成功的请求不再产生告警
+                            if not task.exception() and result is None:
+                                result = task.result()
+            except TimeoutError:
+                pass
+            finally:
+                for task in tasks:
+                    task.cancel()
+                if tasks:
+                    await asyncio.gather(*tasks, return_exceptions=True)
+
+            if result is None:
+                logger.debug(f'端口 {proxy_port} 出口 IP 检测失败')
+            return result
+
+    async def probe_async(self, ports: list) -> dict:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._probe_one(semaphore, port) for port in ports))
+        return dict(zip(ports, results))
+
+    def probe(self, ports: list) -> dict:
+        """检测多个代理端口的出口 IP
+
+        Returns:
+            {port: ip 或 None}
+        """
+        if not ports:
+            return {}
+        return asyncio.run(self.probe_async(list(ports)))
+
+    def refresh(self, proxies, force: bool = False) -> dict:
+        """检测代理出口 IP 并批量写回
+
+        PPP 会话 (Connection) 未变化且距上次检测未超过 EXIT_IP_CACHE_TTL 时直接使用缓存结果，
+        缓存的 IP 已被清空（如代理停止）时取自最近一条历史记录。检测到的 IP 与最近历史相同时
+        只更新 last_seen，否则追加历史记录。
+
+        Args:
+            proxies: ProxyConfig 列表
+            force: 忽略缓存，全部重新检测
+
+        Returns:
+            {'updated': 检测成功数, 'cached': 命中缓存数, 'failed': 失败数}
+        """
+        from django.db import transaction
+        from django.utils import timezone
+
+        from apps.connections.models import Connection
+
+        from ..models import ExitIPHistory, ProxyConfig
+
+        proxies = list(proxies)
+        if not proxies:
+            return {'updated': 0, 'cached': 0, 'failed': 0}
+
+        now = timezone.now()
+        ttl = timedelta(seconds=settings.EXIT_IP_CACHE_TTL)
+        sessions = dict(
+            Connection.objects.filter(status='online', account_id__in=[p.account_id for p in proxies])
+            .values_list('account_id', 'id')
+        )
+        latest = {
+            h.proxy_id: h
+            for h in ExitIPHistory.objects.filter(proxy__in=proxies).order_by('proxy_id', '-last_seen')
+            .distinct('proxy_id')
+        }
+
+        restored = []
+        stale = []
+        for proxy in proxies:
+            session = sessions.get(proxy.account_id)
+            history = latest.get(proxy.id)
+            fresh = (
+                not force
+                and session is not None
+                and proxy.exit_ip_connection_id == session
+                and proxy.exit_ip_checked_at is not None
+                and now - proxy.exit_ip_checked_at < ttl
+                and (proxy.exit_ip or history)
+            )
+            if not fresh:
+                stale.append(proxy)
+            elif not proxy.exit_ip:
+                proxy.exit_ip = history.ip
+                restored.append(proxy)
+
+        results = self.probe([p.listen_port for p in stale])
+
+        detected = []
+        touched = []
+        created = []
+        for proxy in stale:
+            exit_ip = results.get(proxy.listen_port)
+            if not exit_ip:
+                continue
+            proxy.exit_ip = exit_ip
+            proxy.exit_ip_checked_at = now
+            proxy.exit_ip_connection_id = sessions.get(proxy.account_id)
+            detected.append(proxy)
+
+            history = latest.get(proxy.id)
+            if history and history.ip == exit_ip:
+                touched.append(history.id)
+            else:
+                created.append(ExitIPHistory(proxy=proxy, ip=exit_ip, first_seen=now, last_seen=now))
+
+        with transaction.atomic():
+            if restored:
+                ProxyConfig.objects.bulk_update(restored, ['exit_ip'])
+            if detected:
+                ProxyConfig.objects.bulk_update(detected, ['exit_ip', 'exit_ip_checked_at', 'exit_ip_connection'])
+            if touched:
+                ExitIPHistory.objects.filter(id__in=touched).update(last_seen=now)
+            if created:
+                ExitIPHistory.objects.bulk_create(created)
+
+        return {
+            'updated': len(detected),
+            'cached': len(proxies) - len(stale),
+            'failed': len(stale) - len(detected),
+        }
@@ -0,0 +1,237 @@
+"""代理端口防火墙管理"""
+
+import json
+import logging
+import re
+import subprocess
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 旧 iptables 后端按端口添加的规则 (iptables -S 输出格式)
+LEGACY_RULE = re.compile(r'-A INPUT -p tcp -m tcp --dport (\d+) -j ACCEPT')
+
+
+class FirewallError(Exception):
+    """防火墙配置异常"""
+    pass
+
+
+class FirewallService:
+    """代理端口防火墙管理
+
+    后端 (FIREWALL_BACKEND)：
+    - iptables: 每个端口一条 INPUT 规则（旧行为，规则链随端口数线性增长）
+    - ipset: 全部端口放入一个 bitmap:port 集合，由一条 INPUT 规则匹配，
+      集合变更通过一次 ipset restore 提交
+    - nft: 全部端口放入 nftables 集合，由主机过滤链 (FIREWALL_NFT_CHAIN) 开头的一条规则匹配，
+      每次变更通过一次 nft -f 原子事务提交；适用于防火墙由 nftables 管理的主机
+
+    accept 只结束所在的链，其他链的 drop 仍会生效，因此匹配规则须插入主机实际过滤流量的链。
+    """
+
+    SET_NAME = 'socks_proxy_ports'
+    # 早期版本使用的独立 nftables 表，其中的 accept 不能放行被主机过滤链丢弃的报文
+    NFT_LEGACY_TABLE = 'inet socks_proxy'
+
+    def __init__(self, backend: str | None = None, nft_chain: str | None = None):
+        self.backend = backend or settings.FIREWALL_BACKEND
+        self.nft_chain = nft_chain or settings.FIREWALL_NFT_CHAIN
+
+    def _run(self, cmd: list, stdin: str | None = None, check: bool = True) -> subprocess.CompletedProcess:
+        """执行命令"""
+        try:
+            return subprocess.run(cmd, input=stdin, capture_output=True, text=True, check=check)
+        except subprocess.CalledProcessError as e:
+            logger.error(f'命令执行失败: {" ".join(cmd)}, 错误: {e.stderr}')
+            raise FirewallError(f'命令执行失败: {e.stderr}')
+
+    # ---------- iptables (每端口一条规则) ----------
+
+    def _iptables_open(self, ports: list):
+        for port in ports:
+            rule = ['INPUT', '-p', 'tcp', '--dport', str(port), '-j', 'ACCEPT']
+            if self._run(['iptables', '-C', *rule], check=False).returncode != 0:
+                self._run(['iptables', '-A', *rule])
+
+    def _iptables_close(self, ports: list):
+        for port in ports:
+            # 不检查返回值，规则可能不存在
+            self._run(['iptables', '-D', 'INPUT', '-p', 'tcp', '--dport', str(port), '-j', 'ACCEPT'], check=False)
+
+    def _remove_legacy_rules(self):
+        """删除 iptables 后端按端口添加的规则 (切换到 ipset / nft 后端后不再维护)
+
+        仅处理代理端口范围 (PROXY_PORT_START - PROXY_PORT_END) 内的规则。
+        """
+        try:
+            result = self._run(['iptables', '-S', 'INPUT'], check=False)
+        except FileNotFoundError:
+            return
+        lines = []
+        for line in result.stdout.splitlines():
+            match = LEGACY_RULE.fullmatch(line.strip())
+            if match and settings.PROXY_PORT_START <= int(match[1]) <= settings.PROXY_PORT_END:
+                lines.append('-D' + line.strip()[2:])
+        if not lines:
+            return
+
+        result = self._run(
+            ['iptables-restore', '--noflush'], stdin='\n'.join(['*filter', *lines, 'COMMIT']) + '\n', check=False
+        )
+        if result.returncode != 0:
+            logger.warning(f'删除旧的按端口防火墙规则失败: {result.stderr.strip()}')
+        else:
+            logger.info(f'已删除 {len(lines)} 条旧的按端口防火墙规则')
+
+    # ---------- ipset ----------
+
+    def _ipset_create_line(self, name: str) -> str:
+        return f'create {name} bitmap:port range 0-65535'
+
+    def _ensure_ipset_rule(self):
+        """确保 INPUT 链中存在匹配端口集合的规则
+
+        每次都以 iptables -C 检查，规则可能已被外部清除 (如 iptables -F)。
+        """
+        rule = ['INPUT', '-p', 'tcp', '-m', 'set', '--match-set', self.SET_NAME, 'dst', '-j', 'ACCEPT']
+        if self._run(['iptables', '-C', *rule], check=False).returncode == 0:
+            return
+
+        self._run(['ipset', 'restore', '-exist'], stdin=self._ipset_create_line(self.SET_NAME) + '\n')
+        self._run(
+            ['iptables-restore', '--noflush'],
+            stdin=f'*filter\n-I {" ".join(rule)}\nCOMMIT\n'
+        )
+
+    def _ipset_apply(self, lines: list):
+        self._ensure_ipset_rule()
+        script = '\n'.join([self._ipset_create_line(self.SET_NAME), *lines]) + '\n'
+        self._run(['ipset', 'restore', '-exist'], stdin=script)
+
+    def _ipset_open(self, ports: list):
+        self._ipset_apply([f'add {self.SET_NAME} {port}' for port in ports])
+
+    def _ipset_close(self, ports: list):
+        self._ipset_apply([f'del {self.SET_NAME} {port}' for port in ports])
+
+    def _ipset_sync(self, ports: list):
+        # 填充临时集合后 swap，外部看到的集合内容一次性切换
+        tmp = f'{self.SET_NAME}_tmp'
+        self._ipset_apply([
+            self._ipset_create_line(tmp),
+            f'flush {tmp}',
+            *[f'add {tmp} {port}' for port in ports],
+            f'swap {tmp} {self.SET_NAME}',
+            f'destroy {tmp}',
+        ])
+
+    # ---------- nftables ----------
+
+    def _nft_rule_exists(self) -> bool:
+        """过滤链中是否已有匹配端口集合的规则 (以注释标识)"""
+        result = self._run(['nft', '-j', 'list', 'chain', *self.nft_chain.split()], check=False)
+        if result.returncode != 0:
+            message = f'nftables 链 "{self.nft_chain}" 不存在，请通过 FIREWALL_NFT_CHAIN 指定主机的输入过滤链'
+            logger.error(message)
+            raise FirewallError(message)
+        return any(
+            item['rule'].get('comment') == self.SET_NAME
+            for item in json.loads(result.stdout).get('nftables', []) if 'rule' in item
+        )
+
+    def _nft_base(self) -> list:
+        family, table, chain = self.nft_chain.split()
+        lines = [
+            f'add table {self.NFT_LEGACY_TABLE}',
+            f'delete table {self.NFT_LEGACY_TABLE}',
+            f'add set {family} {table} {self.SET_NAME} {{ type inet_service; }}',
+        ]
+        if not self._nft_rule_exists():
+            lines.append(
+                f'insert rule {family} {table} {chain} tcp dport @{self.SET_NAME} accept comment "{self.SET_NAME}"'
+            )
+        return lines
+
+    def _nft_elements(self, op: str, ports: list) -> list:
+        if not ports:
+            return []
+        family, table, _ = self.nft_chain.split()
+        elements = ', '.join(str(port) for port in ports)
+        return [f'{op} element {family} {table} {self.SET_NAME} {{ {elements} }}']
+
+    def _nft_apply(self, lines: list):
+        self._run(['nft', '-f', '-'], stdin='\n'.join([*self._nft_base(), *lines]) + '\n')
+
+    def _nft_open(self, ports: list):
+        self._nft_apply(self._nft_elements('add', ports))
+
+    def _nft_close(self, ports: list):
+        # 先 add 再 delete，避免删除不存在的元素导致整个事务失败
+        self._nft_apply(self._nft_elements('add', ports) + self._nft_elements('delete', ports))
+
+    def _nft_sync(self, ports: list):
+        family, table, _ = self.nft_chain.split()
+        self._nft_apply([f'flush set {family} {table} {self.SET_NAME}', *self._nft_elements('add', ports)])
+
+    # ---------- 公共接口 ----------
+
+    def _dispatch(self, action: str, ports, message: str) -> bool:
+        ports = sorted(set(int(p) for p in ports))
+        handler = getattr(self, f'_{self.backend}_{action}', None)
+        if handler is None:
+            raise FirewallError(f'不支持的防火墙后端: {self.backend}')
+
+        try:
+            handler(ports)
+            logger.info(f'{message}: {len(ports)} 个端口 ({self.backend})')
+            return True
+        except FirewallError:
+            return False
+        except FileNotFoundError as e:
+            logger.warning(f'{e.filename} 命令不可用，跳过防火墙配置')
+            return True
+
+    def open_ports(self, ports) -> bool:
+        """开放端口
+
+        Args:
+            ports: 端口列表
+
+        Returns:
+            是否成功
+        """
+        if not ports:
+            return True
+        return self._dispatch('open', ports, '防火墙端口已开放')
+
+    def close_ports(self, ports) -> bool:
+        """关闭端口
+
+        Args:
+            ports: 端口列表
+
+        Returns:
+            是否成功
+        """
+        if not ports:
+            return True
+        return self._dispatch('close', ports, '防火墙端口已关闭')
+
+    def sync_ports(self, ports) -> bool:
+        """以给定端口集合整体替换已开放端口（用于启动时恢复）
+
+        iptables 后端无法枚举本服务添加的规则，仅开放给定端口；
+        其他后端同时删除 iptables 后端遗留的按端口规则。
+
+        Args:
+            ports: 应开放的全部端口
+
+        Returns:
+            是否成功
+        """
+        if self.backend == 'iptables':
+            return self.open_ports(ports)
+        self._remove_legacy_rules()
+        return self._dispatch('sync', ports, '防火墙端口已同步')
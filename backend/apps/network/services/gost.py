@@ -4,12 +4,16 @@ import logging
 import os
 import signal
 import subprocess
+import time
 from pathlib import Path
 
 from django.conf import settings
 
 from apps.logs.models import SystemLog
 
+from .firewall import FirewallService
+from .supervisor import SupervisorClient, SupervisorError
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,6 +29,9 @@ class GostService:
         self.bin_path = settings.GOST_BIN_PATH
         self.log_dir = Path(settings.GOST_LOG_DIR)
         self.pid_dir = Path(settings.GOST_PID_DIR)
+        # 配置了监管服务时，Gost 子进程由 ProcessSupervisor 持有，不再使用 PID 文件
+        self.supervisor = SupervisorClient() if settings.GOST_SUPERVISOR_SOCKET else None
+        self.firewall = FirewallService()
         self._ensure_dirs()
 
     def _ensure_dirs(self):
@@ -33,55 +40,21 @@ class GostService:
         self.pid_dir.mkdir(parents=True, exist_ok=True)
 
     def _open_firewall_port(self, port: int) -> bool:
-        """开放防火墙端口
-
-        Args:
-            port: 要开放的端口
-
-        Returns:
-            是否成功
-        """
-        try:
-            # 检查规则是否已存在
-            check_cmd = ['iptables', '-C', 'INPUT', '-p', 'tcp', '--dport', str(port), '-j', 'ACCEPT']
-            result = subprocess.run(check_cmd, capture_output=True)
-
-            if result.returncode == 0:
-                logger.debug(f'防火墙端口 {port} 已开放')
-                return True
-
-            # 添加规则
-            add_cmd = ['iptables', '-A', 'INPUT', '-p', 'tcp', '--dport', str(port), '-j', 'ACCEPT']
-            subprocess.run(add_cmd, check=True, capture_output=True)
-            logger.info(f'防火墙端口已开放: {port}')
-            return True
-
-        except subprocess.CalledProcessError as e:
-            logger.error(f'开放防火墙端口失败: {port}, 错误: {e}')
-            return False
-        except FileNotFoundError:
-            logger.warning('iptables 命令不可用，跳过防火墙配置')
-            return True
+        """开放防火墙端口"""
+        return self.firewall.open_ports([port])
 
     def _close_firewall_port(self, port: int) -> bool:
-        """关闭防火墙端口
+        """关闭防火墙端口"""
+        return self.firewall.close_ports([port])
 
-        Args:
-            port: 要关闭的端口
+    @property
+    def supervised(self) -> bool:
+        """是否由常驻监管服务持有 Gost 子进程"""
+        return self.supervisor is not None
 
-        Returns:
-            是否成功
-        """
-        try:
-            # 删除规则
-            del_cmd = ['iptables', '-D', 'INPUT', '-p', 'tcp', '--dport', str(port), '-j', 'ACCEPT']
-            subprocess.run(del_cmd, capture_output=True)  # 不检查返回值，规则可能不存在
-            logger.info(f'防火墙端口已关闭: {port}')
-            return True
-
-        except FileNotFoundError:
-            logger.warning('iptables 命令不可用，跳过防火墙配置')
-            return True
+    def get_worker(self, port: int) -> int | None:
+        """获取端口所属的 Worker 编号（每端口一个进程模式下无 Worker）"""
+        return None
 
     def _get_pid_file(self, port: int) -> Path:
         """获取 PID 文件路径"""
@@ -101,10 +74,6 @@ class GostService:
                 return None
         return None
 
-    def _write_pid(self, port: int, pid: int):
-        """写入 PID"""
-        self._get_pid_file(port).write_text(str(pid))
-
     def _remove_pid(self, port: int):
         """删除 PID 文件"""
         pid_file = self._get_pid_file(port)
@@ -119,20 +88,89 @@ class GostService:
         except (OSError, ProcessLookupError):
             return False
 
+    def _launch(self, name: str, cmd: list, log_file: Path, pid_file: Path, match: dict,
+                append: bool = False) -> int:
+        """启动 Gost 进程
+
+        受监管时交由监管服务启动（退出后自动重启），否则直接派生并写入 PID 文件。
+
+        Args:
+            name: 进程名 (如 port-10800)
+            cmd: 命令行
+            log_file: 日志文件
+            pid_file: PID 文件（仅非监管模式使用）
+            match: 进程对应的 ProxyConfig 过滤条件，供监管服务写回状态
+            append: 是否以追加方式写日志
+
+        Returns:
+            进程 PID
+        """
+        if self.supervised:
+            try:
+                return self.supervisor.spawn(name, cmd, str(log_file), match)
+            except SupervisorError as e:
+                raise GostError(str(e))
+
+        with open(log_file, 'a' if append else 'w') as f:
+            process = subprocess.Popen(
+                cmd,
+                stdout=f,
+                stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+        pid_file.write_text(str(process.pid))
+        return process.pid
+
+    def _terminate(self, name: str, pid: int | None) -> int | None:
+        """停止 Gost 进程，返回被停止的 PID
+
+        受监管时由监管服务查找进程、发送信号并取消退避中的重启，忽略传入的 pid。
+        """
+        if self.supervised:
+            try:
+                return self.supervisor.stop(name)
+            except SupervisorError as e:
+                raise GostError(str(e))
+
+        if pid:
+            os.kill(pid, signal.SIGTERM)
+        return pid
+
+    def _child_pid(self, name: str, pid_file: Path) -> int | None:
+        """获取运行中的进程 PID"""
+        if self.supervised:
+            try:
+                return self.supervisor.status(name)['pid']
+            except SupervisorError as e:
+                raise GostError(str(e))
+
+        pid = None
+        if pid_file.exists():
+            try:
+                pid = int(pid_file.read_text().strip())
+            except (ValueError, IOError):
+                return None
+        if pid and self._is_process_running(pid):
+            return pid
+        return None
+
+    @staticmethod
+    def _process_name(port: int) -> str:
+        """获取端口对应的进程名"""
+        return f'port-{port}'
+
     def is_running(self, port: int) -> bool:
         """检查指定端口的代理是否运行"""
-        pid = self._read_pid(port)
-        if pid and self._is_process_running(pid):
-            return True
-        return False
+        return self._child_pid(self._process_name(port), self._get_pid_file(port)) is not None
 
-    def start(self, port: int, bind_ip: str, interface: str = '') -> int:
+    def start(self, port: int, bind_ip: str, interface: str = '', open_firewall: bool = True) -> int:
         """启动 Socks5 代理 (Gost v3)
 
         Args:
             port: 监听端口
             bind_ip: 绑定出口 IP (保留参数，用于日志记录)
             interface: 绑定接口名 (必需，如 ppp0)，出站流量将通过此接口
+            open_firewall: 是否开放防火墙端口（批量操作时由调用方统一开放）
 
         Returns:
             进程 PID
@@ -156,50 +194,47 @@ class GostService:
         ]
 
         try:
-            with open(log_file, 'w') as f:
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=f,
-                    stderr=subprocess.STDOUT,
-                    start_new_session=True
-                )
-
-            self._write_pid(port, process.pid)
+            pid = self._launch(
+                self._process_name(port), cmd, log_file, self._get_pid_file(port),
+                match={'listen_port': port}
+            )
 
             # 开放防火墙端口
-            self._open_firewall_port(port)
+            if open_firewall:
+                self._open_firewall_port(port)
 
-            logger.info(f'Gost 代理已启动: 端口={port}, 接口={interface}, PID={process.pid}')
+            logger.info(f'Gost 代理已启动: 端口={port}, 接口={interface}, PID={pid}')
 
             SystemLog.log_proxy(
                 f'代理启动成功: 端口 {port}',
-                details={'port': port, 'interface': interface, 'bind_ip': bind_ip, 'pid': process.pid}
+                details={'port': port, 'interface': interface, 'bind_ip': bind_ip, 'pid': pid}
             )
 
-            return process.pid
+            return pid
 
         except Exception as e:
             logger.error(f'启动 Gost 失败: {e}')
             SystemLog.log_error('proxy', f'代理启动失败: {e}', details={'port': port})
             raise GostError(f'启动失败: {e}')
 
-    def stop(self, port: int) -> bool:
+    def stop(self, port: int, close_firewall: bool = True) -> bool:
         """停止 Socks5 代理
 
         Args:
             port: 监听端口
+            close_firewall: 是否关闭防火墙端口（批量操作时由调用方统一关闭）
 
         Returns:
             是否成功停止
         """
         pid = self._read_pid(port)
 
-        if not pid:
-            logger.warning(f'端口 {port} 的代理 PID 文件不存在')
-            return False
-
         try:
-            os.kill(pid, signal.SIGTERM)
+            pid = self._terminate(self._process_name(port), pid)
+            if not pid:
+                logger.warning(f'端口 {port} 的代理 PID 文件不存在')
+                return False
+
             logger.info(f'Gost 代理已停止: 端口={port}, PID={pid}')
 
             SystemLog.log_proxy(
@@ -216,31 +251,98 @@ class GostService:
         finally:
             self._remove_pid(port)
             # 关闭防火墙端口
-            self._close_firewall_port(port)
+            if close_firewall:
+                self._close_firewall_port(port)
 
         return True
 
+    def _process_exited(self, pid: int) -> bool:
+        """进程是否已退出（本进程派生的子进程顺带回收）"""
+        try:
+            reaped, _ = os.waitpid(pid, os.WNOHANG)
+            if reaped:
+                return True
+        except ChildProcessError:
+            pass
+        return not self._is_process_running(pid)
+
+    def stop_many(self, ports: list, timeout: float | None = None) -> dict:
+        """批量停止代理（不处理防火墙，由调用方统一关闭）
+
+        先向全部进程发送 SIGTERM，再在共同的截止时间内等待退出，超时未退出的进程发送 SIGKILL。
+        受监管时由监管服务发送信号并回收进程，不在此等待。
+
+        Args:
+            ports: 监听端口列表
+            timeout: 等待退出的最长秒数，默认 PROXY_STOP_TIMEOUT
+
+        Returns:
+            {port: 是否成功停止}
+        """
+        results = {}
+        pending = {}
+        for port in ports:
+            pid = self._read_pid(port)
+            try:
+                pid = self._terminate(self._process_name(port), pid)
+                results[port] = bool(pid)
+                if pid and not self.supervised:
+                    pending[pid] = port
+            except ProcessLookupError:
+                results[port] = True
+            except Exception as e:
+                logger.error(f'停止 Gost 失败: 端口={port}, 错误: {e}')
+                results[port] = False
+            finally:
+                self._remove_pid(port)
+
+        deadline = time.monotonic() + (settings.PROXY_STOP_TIMEOUT if timeout is None else timeout)
+        while pending:
+            pending = {pid: port for pid, port in pending.items() if not self._process_exited(pid)}
+            if not pending or time.monotonic() >= deadline:
+                break
+            time.sleep(0.05)
+
+        for pid, port in pending.items():
+            logger.warning(f'Gost 进程未在截止时间内退出，强制结束: 端口={port}, PID={pid}')
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        stopped = sum(results.values())
+        logger.info(f'批量停止 Gost 代理: 成功 {stopped}, 失败 {len(results) - stopped}, 强制结束 {len(pending)}')
+        SystemLog.log_proxy(
+            f'批量停止代理: 成功 {stopped}, 失败 {len(results) - stopped}',
+            details={'killed': sorted(pending.values())}
+        )
+        return results
+
     def restart(self, port: int, bind_ip: str, interface: str = '') -> int:
-        """重启代理"""
-        self.stop(port)
+        """重启代理（端口保持开放）"""
+        self.stop(port, close_firewall=False)
         return self.start(port, bind_ip, interface)
 
     def get_status(self, port: int) -> dict:
         """获取代理状态"""
-        pid = self._read_pid(port)
-        running = pid and self._is_process_running(pid)
+        pid = self._child_pid(self._process_name(port), self._get_pid_file(port))
 
         return {
             'port': port,
-            'running': running,
-            'pid': pid if running else None,
+            'running': pid is not None,
+            'pid': pid,
             'log_file': str(self._get_log_file(port))
         }
 
     def cleanup_stale(self):
-        """清理僵死的进程记录"""
+        """清理僵死的进程记录（受监管时无 PID 文件，无需清理）"""
         cleaned = 0
+        if self.supervised:
+            return cleaned
+
         for pid_file in self.pid_dir.glob('*.pid'):
+            if not pid_file.stem.isdigit():
+                continue
             try:
                 port = int(pid_file.stem)
                 pid = int(pid_file.read_text().strip())
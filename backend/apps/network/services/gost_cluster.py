@@ -0,0 +1,356 @@
+"""Gost 多监听 Worker 管理"""
+
+import fcntl
+import json
+import logging
+import os
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+from apps.logs.models import SystemLog
+
+from .gost import GostError, GostService
+
+logger = logging.getLogger(__name__)
+
+
+class GostClusterService(GostService):
+    """Gost 多监听 Worker 管理
+
+    由固定数量的 Gost 进程（默认每核一个）承载全部监听端口：
+    每个 Worker 从生成的配置文件启动，端口的增删改通过 Gost Web API 热更新，
+    无需重启进程。端口按 port % workers 固定分配到 Worker。
+    """
+
+    API_TIMEOUT = 3
+
+    def __init__(self):
+        super().__init__()
+        self.workers = max(1, settings.GOST_WORKERS)
+        self.api_port_start = settings.GOST_API_PORT_START
+
+    def get_worker(self, port: int) -> int | None:
+        """获取端口所属的 Worker 编号"""
+        return port % self.workers
+
+    def _get_worker_pid_file(self, worker: int) -> Path:
+        """获取 Worker PID 文件路径"""
+        return self.pid_dir / f'worker-{worker}.pid'
+
+    def _get_worker_config_file(self, worker: int) -> Path:
+        """获取 Worker 配置文件路径"""
+        return self.pid_dir / f'worker-{worker}.json'
+
+    def _get_log_file(self, port: int) -> Path:
+        """获取日志文件路径（同一 Worker 的端口共用日志）"""
+        return self.log_dir / f'worker-{self.get_worker(port)}.log'
+
+    def _get_api_addr(self, worker: int) -> str:
+        """获取 Worker API 地址"""
+        return f'127.0.0.1:{self.api_port_start + worker}'
+
+    @staticmethod
+    def _service_name(port: int) -> str:
+        """获取端口对应的 Gost 服务名"""
+        return f'socks5-{port}'
+
+    def _build_service(self, port: int, interface: str) -> dict:
+        """构建 Gost 服务配置，等价于 socks5://:port?interface=ppp0"""
+        return {
+            'name': self._service_name(port),
+            'addr': f':{port}',
+            'handler': {'type': 'socks5'},
+            'listener': {'type': 'tcp'},
+            'metadata': {'interface': interface},
+        }
+
+    @contextmanager
+    def _locked(self, worker: int):
+        """Worker 配置文件锁，防止多个 Web/Celery 进程并发改写"""
+        lock_file = self.pid_dir / f'worker-{worker}.lock'
+        with open(lock_file, 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load_config(self, worker: int) -> dict:
+        """读取 Worker 配置"""
+        config_file = self._get_worker_config_file(worker)
+        config = {}
+        if config_file.exists():
+            try:
+                config = json.loads(config_file.read_text())
+            except (ValueError, IOError):
+                logger.warning(f'Worker {worker} 配置文件损坏，将重新生成')
+                config = {}
+
+        config['api'] = {'addr': self._get_api_addr(worker), 'accesslog': False}
+        config.setdefault('services', [])
+        return config
+
+    def _save_config(self, worker: int, config: dict):
+        """原子写入 Worker 配置"""
+        config_file = self._get_worker_config_file(worker)
+        tmp_file = config_file.with_suffix('.json.tmp')
+        tmp_file.write_text(json.dumps(config, indent=2))
+        os.replace(tmp_file, config_file)
+
+    def _api_request(self, worker: int, method: str, path: str, payload: dict | None = None):
+        """调用 Worker 的 Gost Web API
+
+        Raises:
+            GostError: 请求失败时
+        """
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(
+            f'http://{self._get_api_addr(worker)}{path}',
+            data=data,
+            method=method,
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.API_TIMEOUT) as response:
+                return response.read()
+        except (urllib.error.URLError, OSError) as e:
+            raise GostError(f'Worker {worker} API 请求失败: {method} {path}, 错误: {e}')
+
+    @staticmethod
+    def _worker_name(worker: int) -> str:
+        """获取 Worker 进程名"""
+        return f'worker-{worker}'
+
+    def _worker_pid(self, worker: int) -> int | None:
+        """获取运行中的 Worker PID"""
+        return self._child_pid(self._worker_name(worker), self._get_worker_pid_file(worker))
+
+    def is_worker_running(self, worker: int) -> bool:
+        """检查 Worker 是否运行"""
+        return self._worker_pid(worker) is not None
+
+    def _spawn_worker(self, worker: int) -> int:
+        """以当前配置文件启动 Worker 进程"""
+        cmd = [self.bin_path, '-C', str(self._get_worker_config_file(worker))]
+        pid = self._launch(
+            self._worker_name(worker), cmd, self.log_dir / f'worker-{worker}.log',
+            self._get_worker_pid_file(worker), match={'gost_worker': worker}, append=True
+        )
+
+        logger.info(f'Gost Worker 已启动: worker={worker}, PID={pid}')
+        SystemLog.log_proxy(
+            f'Gost Worker 启动: {worker}',
+            details={'worker': worker, 'pid': pid, 'api': self._get_api_addr(worker)}
+        )
+        return pid
+
+    def _service_registered(self, port: int) -> bool:
+        """检查端口是否已写入 Worker 配置"""
+        name = self._service_name(port)
+        config = self._load_config(self.get_worker(port))
+        return any(s.get('name') == name for s in config['services'])
+
+    def is_running(self, port: int) -> bool:
+        """检查指定端口的代理是否运行"""
+        return self.is_worker_running(self.get_worker(port)) and self._service_registered(port)
+
+    def _upsert(self, port: int, interface: str, replace: bool) -> int:
+        """新增或重新绑定端口监听，返回 Worker PID"""
+        worker = self.get_worker(port)
+        service = self._build_service(port, interface)
+
+        with self._locked(worker):
+            config = self._load_config(worker)
+            services = [s for s in config['services'] if s.get('name') != service['name']]
+            exists = len(services) != len(config['services'])
+            if exists and not replace and self.is_worker_running(worker):
+                raise GostError(f'端口 {port} 的代理已在运行')
+            services.append(service)
+            config['services'] = services
+            self._save_config(worker, config)
+
+            pid = self._worker_pid(worker)
+            if not pid:
+                # 新 Worker 直接从配置文件加载全部监听
+                return self._spawn_worker(worker)
+
+            if exists:
+                self._api_request(worker, 'PUT', f'/config/services/{service["name"]}', service)
+            else:
+                self._api_request(worker, 'POST', '/config/services', service)
+            return pid
+
+    def start(self, port: int, bind_ip: str, interface: str = '', open_firewall: bool = True) -> int:
+        """在所属 Worker 上新增 Socks5 监听
+
+        Args:
+            port: 监听端口
+            bind_ip: 绑定出口 IP (保留参数，用于日志记录)
+            interface: 绑定接口名 (必需，如 ppp0)
+            open_firewall: 是否开放防火墙端口（批量操作时由调用方统一开放）
+
+        Returns:
+            Worker 进程 PID
+
+        Raises:
+            GostError: 启动失败时
+        """
+        if not interface:
+            raise GostError('必须指定绑定接口 (interface)')
+
+        try:
+            pid = self._upsert(port, interface, replace=False)
+        except GostError as e:
+            logger.error(f'启动 Gost 监听失败: {e}')
+            SystemLog.log_error('proxy', f'代理启动失败: {e}', details={'port': port})
+            raise
+
+        if open_firewall:
+            self._open_firewall_port(port)
+
+        worker = self.get_worker(port)
+        logger.info(f'Gost 监听已添加: 端口={port}, 接口={interface}, worker={worker}, PID={pid}')
+        SystemLog.log_proxy(
+            f'代理启动成功: 端口 {port}',
+            details={'port': port, 'interface': interface, 'bind_ip': bind_ip, 'pid': pid, 'worker': worker}
+        )
+        return pid
+
+    def stop(self, port: int, close_firewall: bool = True) -> bool:
+        """从所属 Worker 移除 Socks5 监听
+
+        Args:
+            port: 监听端口
+            close_firewall: 是否关闭防火墙端口（批量操作时由调用方统一关闭）
+
+        Returns:
+            是否成功停止
+        """
+        worker = self.get_worker(port)
+        name = self._service_name(port)
+
+        try:
+            with self._locked(worker):
+                config = self._load_config(worker)
+                services = [s for s in config['services'] if s.get('name') != name]
+                if len(services) == len(config['services']):
+                    logger.warning(f'端口 {port} 的代理未在 Worker {worker} 中注册')
+                    return False
+                config['services'] = services
+                self._save_config(worker, config)
+
+                if self.is_worker_running(worker):
+                    self._api_request(worker, 'DELETE', f'/config/services/{name}')
+
+            logger.info(f'Gost 监听已移除: 端口={port}, worker={worker}')
+            SystemLog.log_proxy(f'代理停止成功: 端口 {port}', details={'port': port, 'worker': worker})
+
+        except GostError as e:
+            logger.error(f'停止 Gost 监听失败: {e}')
+            SystemLog.log_error('proxy', f'代理停止失败: {e}', details={'port': port})
+            return False
+        finally:
+            if close_firewall:
+                self._close_firewall_port(port)
+
+        return True
+
+    def stop_many(self, ports: list, timeout: float | None = None) -> dict:
+        """批量移除监听：每个 Worker 只加锁并写一次配置（不处理防火墙）
+
+        Returns:
+            {port: 是否成功停止}
+        """
+        by_worker = {}
+        for port in ports:
+            by_worker.setdefault(self.get_worker(port), []).append(port)
+
+        results = {}
+        for worker, worker_ports in by_worker.items():
+            names = {self._service_name(port): port for port in worker_ports}
+            try:
+                with self._locked(worker):
+                    config = self._load_config(worker)
+                    registered = {s.get('name') for s in config['services']} & names.keys()
+                    config['services'] = [s for s in config['services'] if s.get('name') not in names]
+                    self._save_config(worker, config)
+
+                    running = self.is_worker_running(worker)
+                    for name, port in names.items():
+                        results[port] = name in registered
+                        if running and name in registered:
+                            self._api_request(worker, 'DELETE', f'/config/services/{name}')
+            except GostError as e:
+                logger.error(f'批量移除 Gost 监听失败: worker={worker}, 错误: {e}')
+                for port in worker_ports:
+                    results.setdefault(port, False)
+
+        stopped = sum(results.values())
+        logger.info(f'批量移除 Gost 监听: 成功 {stopped}, 失败 {len(results) - stopped}')
+        SystemLog.log_proxy(f'批量停止代理: 成功 {stopped}, 失败 {len(results) - stopped}')
+        return results
+
+    def restart(self, port: int, bind_ip: str, interface: str = '') -> int:
+        """重新绑定监听（通过 API 原地更新，不重启 Worker）"""
+        if not interface:
+            raise GostError('必须指定绑定接口 (interface)')
+
+        pid = self._upsert(port, interface, replace=True)
+        self._open_firewall_port(port)
+        SystemLog.log_proxy(
+            f'代理重新绑定: 端口 {port}',
+            details={'port': port, 'interface': interface, 'bind_ip': bind_ip, 'pid': pid}
+        )
+        return pid
+
+    def get_status(self, port: int) -> dict:
+        """获取代理状态"""
+        worker = self.get_worker(port)
+        running = self.is_running(port)
+
+        return {
+            'port': port,
+            'running': running,
+            'pid': self._worker_pid(worker) if running else None,
+            'worker': worker,
+            'log_file': str(self._get_log_file(port))
+        }
+
+    def stop_worker(self, worker: int) -> bool:
+        """停止 Worker 进程（其上的全部监听随之停止）"""
+        try:
+            pid = self._terminate(self._worker_name(worker), self._worker_pid(worker))
+        except ProcessLookupError:
+            pid = None
+        finally:
+            self._get_worker_pid_file(worker).unlink(missing_ok=True)
+
+        if not pid:
+            logger.warning(f'Worker {worker} 未在运行')
+            return False
+
+        logger.info(f'Gost Worker 已停止: worker={worker}, PID={pid}')
+        return True
+
+    def cleanup_stale(self):
+        """清理僵死的 Worker PID 文件"""
+        cleaned = 0
+        if self.supervised:
+            return cleaned
+
+        for pid_file in self.pid_dir.glob('worker-*.pid'):
+            try:
+                pid = int(pid_file.read_text().strip())
+                if not self._is_process_running(pid):
+                    pid_file.unlink()
+                    cleaned += 1
+                    logger.info(f'清理僵死 Worker PID 文件: {pid_file.name}')
+            except (ValueError, IOError):
+                pid_file.unlink()
+                cleaned += 1
+
+        return cleaned
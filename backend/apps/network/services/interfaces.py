@@ -0,0 +1,219 @@
+"""PPP 接口清单"""
+
+import errno
+import fcntl
+import logging
+import os
+import select
+import socket
+import struct
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .netlink import (
+    ARPHRD_PPP,
+    RTMGRP_IPV4_IFADDR,
+    RTMGRP_LINK,
+    NetlinkError,
+    NetlinkRoute,
+    netlink_available,
+)
+
+logger = logging.getLogger(__name__)
+
+SYS_CLASS_NET = '/sys/class/net'
+IFF_UP = 0x1
+IFF_RUNNING = 0x40
+SIOCGIFADDR = 0x8915
+SIOCGIFDSTADDR = 0x8917
+
+
+def _is_up(flags: int) -> bool:
+    # PPP 接口的 operstate 通常为 unknown，以 IFF_UP + IFF_RUNNING 判断可用
+    return bool(flags & IFF_UP and flags & IFF_RUNNING)
+
+
+class InterfaceInventory:
+    """PPP 接口清单
+
+    {接口名: {'index', 'up', 'operstate', 'address', 'peer', 'rx_bytes', 'tx_bytes'}}，
+    address 为本端 (服务器) 地址，peer 为对端地址，rx_bytes/tx_bytes 为接口累计收发字节数。
+
+    netmon 进程订阅 rtnetlink 链路/地址通知 (不可用时定时扫描 /sys/class/net)，
+    变化时重新导出并写入缓存 (配置 CACHE_URL 时为 Redis，多进程共享)；读取方直接取缓存，
+    缓存过期或没有 netmon 运行时当场扫描一次。
+    """
+
+    CACHE_KEY = 'ppp_interfaces'
+    # 事件合并窗口：PPP 建立/断开时链路与地址通知成组到达
+    SETTLE = 0.05
+
+    def __init__(self, ttl: int | None = None):
+        self.ttl = ttl or settings.INTERFACE_CACHE_TTL
+        self.netlink = NetlinkRoute() if netlink_available() else None
+
+    def _scan_netlink(self) -> dict:
+        links = {link['index']: link for link in self.netlink.dump_links() if link['type'] == ARPHRD_PPP}
+        interfaces = {
+            link['name']: {
+                'index': index,
+                'up': _is_up(link['flags']),
+                'operstate': link['operstate'],
+                'address': None,
+                'peer': None,
+                'rx_bytes': link['rx_bytes'],
+                'tx_bytes': link['tx_bytes'],
+            }
+            for index, link in links.items()
+        }
+        if links:
+            for address in self.netlink.dump_addresses():
+                link = links.get(address['index'])
+                if link:
+                    interfaces[link['name']].update(address=address['address'], peer=address['peer'])
+        return interfaces
+
+    @staticmethod
+    def _ioctl_address(sock: socket.socket, name: str, request: int) -> str | None:
+        try:
+            result = fcntl.ioctl(sock.fileno(), request, struct.pack('256s', name.encode()[:15]))
+        except OSError:
+            return None
+        return socket.inet_ntoa(result[20:24])
+
+    def _scan_sysfs(self) -> dict:
+        def _read(name: str, attr: str) -> str:
+            with open(os.path.join(SYS_CLASS_NET, name, attr)) as f:
+                return f.read().strip()
+
+        interfaces = {}
+        try:
+            names = os.listdir(SYS_CLASS_NET)
+        except OSError:
+            return interfaces
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for name in names:
+                try:
+                    if int(_read(name, 'type')) != ARPHRD_PPP:
+                        continue
+                    operstate = _read(name, 'operstate')
+                    address = self._ioctl_address(sock, name, SIOCGIFADDR)
+                    peer = self._ioctl_address(sock, name, SIOCGIFDSTADDR)
+                    # sysfs 的 flags 不含 IFF_RUNNING，以 operstate 代替
+                    interfaces[name] = {
+                        'index': int(_read(name, 'ifindex')),
+                        'up': bool(int(_read(name, 'flags'), 16) & IFF_UP) and operstate in ('up', 'unknown'),
+                        'operstate': operstate,
+                        'address': address,
+                        'peer': peer if peer != address else None,
+                        'rx_bytes': int(_read(name, 'statistics/rx_bytes')),
+                        'tx_bytes': int(_read(name, 'statistics/tx_bytes')),
+                    }
+                except (OSError, ValueError):
+                    # 扫描过程中接口被删除
+                    continue
+        return interfaces
+
+    def scan(self) -> dict:
+        """导出当前 PPP 接口（不经缓存）"""
+        if self.netlink:
+            try:
+                return self._scan_netlink()
+            except (OSError, NetlinkError) as e:
+                logger.warning(f'netlink 导出接口失败，改为扫描 {SYS_CLASS_NET}: {e}')
+        return self._scan_sysfs()
+
+    def refresh(self) -> dict:
+        """重新导出并写入缓存"""
+        interfaces = self.scan()
+        cache.set(self.CACHE_KEY, interfaces, self.ttl)
+        return interfaces
+
+    def get(self) -> dict:
+        """当前 PPP 接口，优先取缓存"""
+        interfaces = cache.get(self.CACHE_KEY)
+        if interfaces is None:
+            interfaces = self.refresh()
+        return interfaces
+
+    def names(self) -> list:
+        return sorted(self.get())
+
+    def _drain(self, sock: socket.socket):
+        """读空已到达的通知，只用作变化信号"""
+        while True:
+            try:
+                sock.recv(1024 * 1024, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                # 通知过多溢出接收缓冲区，随后的全量导出会补上
+                if e.errno != errno.ENOBUFS:
+                    raise
+
+    @staticmethod
+    def _state(interfaces: dict) -> dict:
+        """去掉流量计数，只比较接口本身的变化"""
+        return {
+            name: {k: v for k, v in info.items() if k not in ('rx_bytes', 'tx_bytes')}
+            for name, info in interfaces.items()
+        }
+
+    def watch(self, on_change=None, on_scan=None, stop=lambda: False, interval: float | None = None):
+        """持续维护缓存（阻塞）
+
+        收到链路/地址通知后合并 SETTLE 秒内的后续通知再全量导出一次；
+        此外每 interval 秒 (默认 ttl/3) 定时导出一次以续期缓存。netlink 不可用时定时扫描 sysfs，
+        间隔不超过 INTERFACE_SCAN_INTERVAL 秒。
+
+        Args:
+            on_change: 接口增删或状态、地址变化时回调 on_change(旧清单, 新清单)
+            on_scan: 每次导出后回调 on_scan(清单)
+            stop: 返回 True 时退出
+            interval: 定时导出间隔 (秒)
+        """
+        sock = None
+        if self.netlink:
+            try:
+                sock = self.netlink.subscribe(RTMGRP_LINK | RTMGRP_IPV4_IFADDR)
+            except OSError as e:
+                logger.warning(f'订阅 netlink 通知失败，改为轮询 {SYS_CLASS_NET}: {e}')
+
+        interval = interval or self.ttl / 3
+        if not sock:
+            interval = min(interval, settings.INTERFACE_SCAN_INTERVAL)
+
+        current = self.refresh()
+        if on_scan:
+            on_scan(current)
+        deadline = time.monotonic() + interval
+        try:
+            while not stop():
+                timeout = max(deadline - time.monotonic(), 0)
+                if sock:
+                    ready, _, _ = select.select([sock], [], [], timeout)
+                    if ready:
+                        time.sleep(self.SETTLE)
+                        self._drain(sock)
+                else:
+                    time.sleep(timeout)
+
+                # 定时导出保持固定节拍，不因通知触发的导出而推迟
+                now = time.monotonic()
+                if now >= deadline:
+                    deadline += interval
+                    if deadline <= now:
+                        deadline = now + interval
+
+                interfaces = self.refresh()
+                if on_scan:
+                    on_scan(interfaces)
+                if on_change and self._state(interfaces) != self._state(current):
+                    on_change(current, interfaces)
+                current = interfaces
+        finally:
+            if sock:
+                sock.close()
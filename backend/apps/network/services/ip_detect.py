@@ -1,7 +1,6 @@
 """IP 地址检测服务"""
 
 import socket
-import subprocess
 import urllib.request
 import urllib.error
 
@@ -75,23 +74,6 @@ class IPDetectService:
     @classmethod
     def get_exit_ip_via_proxy(cls, proxy_port: int, timeout: int = 10) -> str | None:
         """通过 socks5 代理检测出口 IP"""
-        for service_url in cls.PUBLIC_IP_SERVICES:
-            try:
-                result = subprocess.run(
-                    [
-                        'curl', '-s', '--max-time', str(timeout),
-                        '--socks5', f'127.0.0.1:{proxy_port}',
-                        service_url
-                    ],
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout + 2
-                )
-                if result.returncode == 0:
-                    ip = result.stdout.strip()
-                    # 验证是否为有效 IP
-                    socket.inet_aton(ip)
-                    return ip
-            except (subprocess.TimeoutExpired, socket.error, ValueError):
-                continue
-        return None
+        from .exit_ip import ExitIPProber
+
+        return ExitIPProber(timeout=timeout).probe([proxy_port])[proxy_port]
@@ -0,0 +1,393 @@
+"""rtnetlink 客户端
+
+通过 AF_NETLINK (NETLINK_ROUTE) 套接字直接增删策略路由规则与路由、导出接口和地址，
+不再派生 ip 命令解析文本输出。多条变更可放入一次 sendmsg 的多段消息中提交，
+按序列号逐条取回内核确认。仅支持 IPv4。
+"""
+
+import ipaddress
+import os
+import socket
+import struct
+
+# netlink 消息头 nlmsghdr: len, type, flags, seq, pid
+NLMSG_HDR = struct.Struct('=IHHII')
+# 属性头 rtattr: len, type
+RTA_HDR = struct.Struct('=HH')
+# rtmsg: family, dst_len, src_len, tos, table, protocol, scope, type, flags
+RTMSG = struct.Struct('=BBBBBBBBI')
+# fib_rule_hdr: family, dst_len, src_len, tos, table, res1, res2, action, flags
+FIB_RULE_HDR = struct.Struct('=BBBBBBBBI')
+# ifinfomsg: family, pad, type, index, flags, change
+IFINFOMSG = struct.Struct('=BxHiII')
+# ifaddrmsg: family, prefixlen, flags, scope, index
+IFADDRMSG = struct.Struct('=BBBBI')
+# nlmsgerr: error + 原始消息头
+NLMSGERR = struct.Struct('=i')
+# rtnl_link_stats64 / rtnl_link_stats 开头: rx_packets, tx_packets, rx_bytes, tx_bytes
+LINK_STATS64 = struct.Struct('=QQQQ')
+LINK_STATS = struct.Struct('=IIII')
+
+NETLINK_ROUTE = 0
+SOL_NETLINK = 270
+NETLINK_CAP_ACK = 10
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+RTM_GETLINK = 18
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+RTM_NEWRULE = 32
+RTM_DELRULE = 33
+RTM_GETRULE = 34
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+
+# 多播组位掩码：链路变化、IPv4 地址变化
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_TABLE = 15
+
+FRA_SRC = 2
+FRA_PRIORITY = 6
+FRA_FWMARK = 10
+FRA_TABLE = 15
+FRA_FWMASK = 16
+FR_ACT_TO_TBL = 1
+
+IFLA_IFNAME = 3
+IFLA_STATS = 7
+IFLA_OPERSTATE = 16
+IFLA_STATS64 = 23
+IF_OPER_UP = 6
+IF_OPER_STATES = ('unknown', 'notpresent', 'down', 'lowerlayerdown', 'testing', 'dormant', 'up')
+ARPHRD_PPP = 512
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+RT_TABLE_UNSPEC = 0
+RTPROT_BOOT = 3
+RT_SCOPE_UNIVERSE = 0
+RTN_UNICAST = 1
+
+# 单次 sendmsg 携带的最大消息数，避免确认消息写满接收缓冲区
+BATCH_SIZE = 256
+RECV_SIZE = 1024 * 1024
+
+
+class NetlinkError(Exception):
+    """netlink 请求异常"""
+    pass
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def _attr(attr_type: int, payload: bytes) -> bytes:
+    length = RTA_HDR.size + len(payload)
+    return RTA_HDR.pack(length, attr_type) + payload + b'\0' * (_align(length) - length)
+
+
+def _u32(value: int) -> bytes:
+    return struct.pack('=I', value)
+
+
+def _ipv4(address: str) -> bytes:
+    return ipaddress.IPv4Address(address).packed
+
+
+def _parse_attrs(data: bytes, offset: int) -> dict:
+    attrs = {}
+    while offset + RTA_HDR.size <= len(data):
+        length, attr_type = RTA_HDR.unpack_from(data, offset)
+        if length < RTA_HDR.size:
+            break
+        # 去掉嵌套/字节序标志位
+        attrs[attr_type & 0x3fff] = data[offset + RTA_HDR.size:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def _parse_u32(value: bytes | None) -> int | None:
+    return struct.unpack('=I', value[:4])[0] if value else None
+
+
+class RouteMessage:
+    """rtnetlink 变更消息构造"""
+
+    @staticmethod
+    def _table_fields(table: int) -> tuple:
+        """表 ID 超出 8 位时放入 RTA_TABLE 属性"""
+        return (table if table < 256 else RT_TABLE_UNSPEC), _attr(RTA_TABLE, _u32(table))
+
+    @classmethod
+    def route(cls, msg_type: int, table: int, gateway: str | None = None,
+              interface: str | None = None) -> tuple:
+        """默认路由 (0.0.0.0/0) 增删消息
+
+        Returns:
+            (消息类型, 附加标志, 消息体)
+        """
+        header_table, table_attr = cls._table_fields(table)
+        body = RTMSG.pack(
+            socket.AF_INET, 0, 0, 0, header_table,
+            RTPROT_BOOT if msg_type == RTM_NEWROUTE else 0,
+            RT_SCOPE_UNIVERSE, RTN_UNICAST, 0
+        ) + table_attr
+        if gateway:
+            body += _attr(RTA_GATEWAY, _ipv4(gateway))
+        if interface:
+            body += _attr(RTA_OIF, _u32(socket.if_nametoindex(interface)))
+        flags = NLM_F_CREATE | NLM_F_REPLACE if msg_type == RTM_NEWROUTE else 0
+        return msg_type, flags, body
+
+    @classmethod
+    def rule(cls, msg_type: int, table: int, src: str | None = None, src_len: int = 32,
+             priority: int | None = None, fwmark: int | None = None) -> tuple:
+        """策略规则增删消息 (按源地址或 fwmark 匹配)
+
+        Returns:
+            (消息类型, 附加标志, 消息体)
+        """
+        header_table, table_attr = cls._table_fields(table)
+        body = FIB_RULE_HDR.pack(
+            socket.AF_INET, 0, src_len if src else 0, 0, header_table, 0, 0, FR_ACT_TO_TBL, 0
+        ) + table_attr
+        if src:
+            body += _attr(FRA_SRC, _ipv4(src))
+        if fwmark is not None:
+            body += _attr(FRA_FWMARK, _u32(fwmark)) + _attr(FRA_FWMASK, _u32(0xffffffff))
+        if priority is not None:
+            body += _attr(FRA_PRIORITY, _u32(priority))
+        flags = NLM_F_CREATE | NLM_F_EXCL if msg_type == RTM_NEWRULE else 0
+        return msg_type, flags, body
+
+
+class NetlinkRoute:
+    """最小 rtnetlink 客户端
+
+    每次调用使用独立套接字；execute 以多段消息批量提交变更并返回逐条结果，
+    dump_* 一次请求导出全部链路、地址、规则或路由。
+    """
+
+    def __init__(self):
+        self._seq = 0
+
+    def _socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_CLOEXEC, NETLINK_ROUTE)
+        try:
+            # 错误确认中不回显原始消息体
+            sock.setsockopt(SOL_NETLINK, NETLINK_CAP_ACK, 1)
+        except OSError:
+            pass
+        sock.bind((0, 0))
+        return sock
+
+    def _next_seq(self) -> int:
+        self._seq = (self._seq + 1) & 0xffffffff
+        return self._seq
+
+    def _pack(self, msg_type: int, flags: int, body: bytes) -> tuple:
+        seq = self._next_seq()
+        length = NLMSG_HDR.size + len(body)
+        return seq, NLMSG_HDR.pack(length, msg_type, flags, seq, 0) + body + b'\0' * (_align(length) - length)
+
+    @staticmethod
+    def _messages(data: bytes):
+        """拆分一次 recv 得到的多条 netlink 消息 -> (type, flags, seq, payload)"""
+        offset = 0
+        while offset + NLMSG_HDR.size <= len(data):
+            length, msg_type, flags, seq, _ = NLMSG_HDR.unpack_from(data, offset)
+            if length < NLMSG_HDR.size:
+                break
+            yield msg_type, flags, seq, data[offset + NLMSG_HDR.size:offset + length]
+            offset += _align(length)
+
+    def execute(self, requests: list) -> list:
+        """批量提交变更，每 BATCH_SIZE 条合并为一次 sendmsg
+
+        Args:
+            requests: [(消息类型, 附加标志, 消息体), ...]，见 RouteMessage
+
+        Returns:
+            与 requests 对应的 errno 列表，0 表示成功
+        """
+        results = [0] * len(requests)
+        with self._socket() as sock:
+            for start in range(0, len(requests), BATCH_SIZE):
+                pending = {}
+                chunk = []
+                for index in range(start, min(start + BATCH_SIZE, len(requests))):
+                    msg_type, flags, body = requests[index]
+                    seq, message = self._pack(msg_type, NLM_F_REQUEST | NLM_F_ACK | flags, body)
+                    pending[seq] = index
+                    chunk.append(message)
+                sock.sendall(b''.join(chunk))
+
+                while pending:
+                    for msg_type, _, seq, payload in self._messages(sock.recv(RECV_SIZE)):
+                        if msg_type != NLMSG_ERROR or seq not in pending:
+                            continue
+                        results[pending.pop(seq)] = -NLMSGERR.unpack_from(payload)[0]
+        return results
+
+    def _dump(self, msg_type: int, body: bytes) -> list:
+        """导出请求，返回全部应答消息体"""
+        replies = []
+        with self._socket() as sock:
+            seq, message = self._pack(msg_type, NLM_F_REQUEST | NLM_F_DUMP, body)
+            sock.sendall(message)
+            while True:
+                for reply_type, _, reply_seq, payload in self._messages(sock.recv(RECV_SIZE)):
+                    if reply_seq != seq:
+                        continue
+                    if reply_type == NLMSG_DONE:
+                        return replies
+                    if reply_type == NLMSG_ERROR:
+                        code = -NLMSGERR.unpack_from(payload)[0]
+                        if code:
+                            raise NetlinkError(f'netlink 导出失败: {os.strerror(code)}')
+                        continue
+                    replies.append((reply_type, payload))
+
+    def dump_links(self) -> list:
+        """导出全部网络接口
+
+        Returns:
+            [{'index', 'name', 'type', 'flags', 'up', 'operstate', 'rx_bytes', 'tx_bytes'}]
+        """
+        links = []
+        for _, payload in self._dump(RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            _, link_type, index, flags, _ = IFINFOMSG.unpack_from(payload)
+            attrs = _parse_attrs(payload, IFINFOMSG.size)
+            operstate = attrs.get(IFLA_OPERSTATE)
+            if len(attrs.get(IFLA_STATS64, b'')) >= LINK_STATS64.size:
+                _, _, rx_bytes, tx_bytes = LINK_STATS64.unpack_from(attrs[IFLA_STATS64])
+            elif len(attrs.get(IFLA_STATS, b'')) >= LINK_STATS.size:
+                _, _, rx_bytes, tx_bytes = LINK_STATS.unpack_from(attrs[IFLA_STATS])
+            else:
+                rx_bytes = tx_bytes = 0
+            links.append({
+                'index': index,
+                'name': attrs.get(IFLA_IFNAME, b'').rstrip(b'\0').decode(),
+                'type': link_type,
+                'flags': flags,
+                'up': bool(operstate) and operstate[0] == IF_OPER_UP,
+                'operstate': IF_OPER_STATES[operstate[0]] if operstate and operstate[0] < len(IF_OPER_STATES) else 'unknown',
+                'rx_bytes': rx_bytes,
+                'tx_bytes': tx_bytes,
+            })
+        return links
+
+    def dump_addresses(self) -> list:
+        """导出全部 IPv4 地址
+
+        Returns:
+            [{'index', 'address', 'prefixlen', 'peer'}]，点对点接口 address 为本端、peer 为对端
+        """
+        addresses = []
+        for _, payload in self._dump(RTM_GETADDR, IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0)):
+            _, prefixlen, _, _, index = IFADDRMSG.unpack_from(payload)
+            attrs = _parse_attrs(payload, IFADDRMSG.size)
+            local = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+            peer = attrs.get(IFA_ADDRESS)
+            addresses.append({
+                'index': index,
+                'address': str(ipaddress.IPv4Address(local)) if local else None,
+                'prefixlen': prefixlen,
+                'peer': str(ipaddress.IPv4Address(peer)) if peer and peer != local else None,
+            })
+        return addresses
+
+    def dump_rules(self) -> list:
+        """导出全部 IPv4 策略规则
+
+        Returns:
+            [{'priority', 'src', 'src_len', 'fwmark', 'table'}]
+        """
+        rules = []
+        for _, payload in self._dump(RTM_GETRULE, FIB_RULE_HDR.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0)):
+            _, _, src_len, _, table, _, _, _, _ = FIB_RULE_HDR.unpack_from(payload)
+            attrs = _parse_attrs(payload, FIB_RULE_HDR.size)
+            src = attrs.get(FRA_SRC)
+            rules.append({
+                'priority': _parse_u32(attrs.get(FRA_PRIORITY)) or 0,
+                'src': str(ipaddress.IPv4Address(src)) if src else None,
+                'src_len': src_len,
+                'fwmark': _parse_u32(attrs.get(FRA_FWMARK)),
+                'table': _parse_u32(attrs.get(FRA_TABLE)) or table,
+            })
+        return rules
+
+    def dump_routes(self) -> list:
+        """导出全部 IPv4 路由
+
+        Returns:
+            [{'table', 'dst', 'dst_len', 'gateway', 'oif', 'message'}]，
+            message 为原始消息体，可原样作为删除请求提交
+        """
+        routes = []
+        for _, payload in self._dump(RTM_GETROUTE, RTMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0)):
+            _, dst_len, _, _, table, _, _, _, _ = RTMSG.unpack_from(payload)
+            attrs = _parse_attrs(payload, RTMSG.size)
+            dst = attrs.get(RTA_DST)
+            gateway = attrs.get(RTA_GATEWAY)
+            routes.append({
+                'table': _parse_u32(attrs.get(RTA_TABLE)) or table,
+                'dst': str(ipaddress.IPv4Address(dst)) if dst else None,
+                'dst_len': dst_len,
+                'gateway': str(ipaddress.IPv4Address(gateway)) if gateway else None,
+                'oif': _parse_u32(attrs.get(RTA_OIF)),
+                'message': payload,
+            })
+        return routes
+
+    def subscribe(self, groups: int) -> socket.socket:
+        """订阅 rtnetlink 多播组 (RTMGRP_*)，返回已绑定的套接字，由调用方读取与关闭"""
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_CLOEXEC, NETLINK_ROUTE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_SIZE)
+        sock.bind((0, groups))
+        return sock
+
+    def flush_tables(self, tables: set) -> list:
+        """删除指定路由表中的全部路由（导出后以一批删除消息提交）
+
+        Returns:
+            与被删除路由对应的 errno 列表
+        """
+        requests = [
+            (RTM_DELROUTE, 0, route['message'])
+            for route in self.dump_routes() if route['table'] in tables
+        ]
+        return self.execute(requests)
+
+
+def netlink_available() -> bool:
+    """当前平台是否支持 rtnetlink"""
+    if not hasattr(socket, 'AF_NETLINK'):
+        return False
+    try:
+        socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE).close()
+        return True
+    except OSError:
+        return False
+
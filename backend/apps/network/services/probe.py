@@ -0,0 +1,59 @@
+"""代理就绪检测"""
+
+import logging
+import socket
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProxyProbe:
+    """Socks5 监听就绪检测
+
+    向 127.0.0.1:port 发送 Socks5 方法协商 (05 01 00)，收到 05 00 即视为可用，
+    不依赖外网，也不经过 PPP 隧道。
+    """
+
+    GREETING = b'\x05\x01\x00'
+    EXPECTED = b'\x05\x00'
+
+    @classmethod
+    def check(cls, port: int, timeout: float = 0.5, host: str = '127.0.0.1') -> bool:
+        """执行一次 Socks5 握手检测"""
+        try:
+            with socket.create_connection((host, port), timeout=timeout) as sock:
+                sock.sendall(cls.GREETING)
+                reply = b''
+                while len(reply) < 2:
+                    chunk = sock.recv(2 - len(reply))
+                    if not chunk:
+                        return False
+                    reply += chunk
+                return reply == cls.EXPECTED
+        except OSError:
+            return False
+
+    @classmethod
+    def wait_ready(cls, port: int, timeout: float | None = None, interval: float = 0.05) -> bool:
+        """轮询直到监听可用或超时
+
+        Args:
+            port: 监听端口
+            timeout: 最长等待秒数，默认 PROXY_READY_TIMEOUT
+            interval: 初始轮询间隔，逐次翻倍，最长 0.5 秒
+
+        Returns:
+            是否在截止时间前就绪
+        """
+        deadline = time.monotonic() + (settings.PROXY_READY_TIMEOUT if timeout is None else timeout)
+        while True:
+            remaining = deadline - time.monotonic()
+            if cls.check(port, timeout=max(0.05, min(0.5, remaining))):
+                return True
+            if remaining <= 0:
+                logger.warning(f'代理端口 {port} 在截止时间内未就绪')
+                return False
+            time.sleep(min(interval, max(0, remaining)))
+            interval = min(interval * 2, 0.5)
@@ -0,0 +1,29 @@
+"""代理服务选择"""
+
+from django.conf import settings
+
+from .gost import GostService
+from .gost_cluster import GostClusterService
+from .socks5 import Socks5Service
+
+
+def get_gost_service() -> GostService:
+    """按 GOST_MODE 返回 Gost 服务实例
+
+    process: 每个端口一个 Gost 进程（默认）
+    cluster: 固定数量的 Worker 进程承载全部端口
+    """
+    if settings.GOST_MODE == 'cluster':
+        return GostClusterService()
+    return GostService()
+
+
+def get_proxy_service(backend: str = 'gost') -> GostService | Socks5Service:
+    """按 ProxyConfig.backend 返回代理服务实例
+
+    gost: Gost 进程（按 GOST_MODE）
+    socks5: 内置 Socks5 引擎
+    """
+    if backend == 'socks5':
+        return Socks5Service()
+    return get_gost_service()
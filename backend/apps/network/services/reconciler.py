@@ -0,0 +1,184 @@
+"""策略路由声明式同步"""
+
+import logging
+
+from apps.logs.models import SystemLog
+
+from .routing import RoutingService
+from .rt_tables import RtTables, RtTablesError
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingReconciler:
+    """按数据库状态同步内核策略路由
+
+    期望状态由 RoutingTable、在线 Connection 与代理运行状态得出：每个在线且代理运行中的账号
+    (与启动/停止代理时配置、清理路由一致) 对应一条经客户端 IP 出去的默认路由，以及一条
+    from <服务器 PPP IP>/32 的规则 (source 模式) 或一条 fwmark 规则加一个出口接口映射元素 (fwmark 模式)。
+    实际状态一次导出全部规则、路由与映射，只比较本服务管理的部分（源路由优先级、
+    数据库或 rt_tables 中由本服务登记的路由表；ID 范围内的其他表如 wg-quick 不触碰），得出最小差异后一次提交：
+    缺失的规则/路由补齐，多余或重复的规则删除，已下线账号的路由表清空；
+    切换 ROUTING_MODE 后另一模式遗留的规则与映射也一并清理。
+    """
+
+    def __init__(self, routing: RoutingService | None = None):
+        self.routing = routing or RoutingService()
+
+    def desired_state(self) -> tuple:
+        """期望状态
+
+        Returns:
+            (rules, routes, marks, names)：rules 为 {(匹配条件, table_id)}，匹配条件为 src 或 fwmark 值；
+            routes 为 {table_id: (gateway, interface)}；marks 为 {接口名: table_id}；
+            names 为 {表名或字符串形式的表 ID: table_id}
+        """
+        from apps.connections.models import Connection
+
+        from ..models import RoutingTable
+
+        tables = {}
+        names = {}
+        for table_id, table_name, account_id in RoutingTable.objects.values_list('table_id', 'table_name', 'account_id'):
+            tables[account_id] = table_id
+            names[table_name] = names[str(table_id)] = table_id
+
+        sessions = {}
+        online = (
+            Connection.objects.filter(status='online', account_id__in=tables, account__proxyconfig__is_running=True)
+            .order_by('-connected_at')
+            .values_list('account_id', 'interface', 'peer_ip', 'local_ip')
+        )
+        for account_id, interface, server_ip, client_ip in online:
+            # 同一账号取最近一次上线
+            sessions.setdefault(account_id, (interface, server_ip, client_ip))
+
+        rules = set()
+        routes = {}
+        marks = {}
+        for account_id, (interface, server_ip, client_ip) in sessions.items():
+            if not interface or not server_ip or server_ip == '0.0.0.0':
+                continue
+            table_id = tables[account_id]
+            if self.routing.mode == 'fwmark':
+                rules.add((table_id, table_id))
+                # 各会话的服务器端地址相同，以 PPP 接口区分
+                marks[interface] = table_id
+            else:
+                rules.add((f'{server_ip}/32', table_id))
+            routes[table_id] = (client_ip, interface)
+        return rules, routes, marks, names
+
+    def _registered_names(self) -> dict:
+        """rt_tables 中由本服务登记 (NAME_PREFIX 前缀) 的表 {表名或字符串形式的表 ID: table_id}
+
+        账号已删除但表项尚未清理时，其遗留的规则与路由仍按本服务的表处理。
+        """
+        try:
+            entries = self.routing.rt_tables.entries()
+        except RtTablesError as e:
+            logger.warning(f'读取 rt_tables 失败: {e}')
+            return {}
+        names = {}
+        for table_id, name in entries.items():
+            if name.startswith(RtTables.NAME_PREFIX):
+                names[name] = names[str(table_id)] = table_id
+        return names
+
+    def plan(self) -> list:
+        """计算期望状态与内核实际状态的差异
+
+        Returns:
+            路由变更列表，格式同 RoutingService.apply_changes；先删除后添加
+        """
+        rules, routes, marks, names = self.desired_state()
+        # 只处理本服务登记的表，ROUTING_TABLE_ID 范围内的其他表 (其他 VPN 等) 不删规则、不清空
+        names = {**self._registered_names(), **names}
+        priority = RoutingService.RULE_PRIORITY
+
+        rule_dels = []
+        present = set()
+        for rule in self.routing.list_rules():
+            if rule['priority'] != priority:
+                continue
+            table_id = names.get(rule['table'])
+            if table_id is None:
+                continue
+            key = (rule['src'] if rule['fwmark'] is None else rule['fwmark'], table_id)
+            if key in rules and key not in present:
+                present.add(key)
+            elif rule['fwmark'] is None:
+                # 已下线账号、源 IP 已变化或重复的规则
+                rule_dels.append(('rule_del', table_id, rule['src'], priority))
+            else:
+                rule_dels.append(('mark_rule_del', table_id, rule['fwmark'], priority))
+        rule_adds = [
+            ('mark_rule_add', table_id, match, priority) if isinstance(match, int)
+            else ('rule_add', table_id, match, priority)
+            for match, table_id in sorted(rules - present, key=lambda r: r[1])
+        ]
+
+        defaults = {}
+        populated = set()
+        for route in self.routing.list_routes():
+            table_id = names.get(route['table'])
+            if table_id is None:
+                continue
+            populated.add(table_id)
+            if route['dst'] == 'default':
+                defaults[table_id] = (route['gateway'], route['dev'])
+        route_ops = [
+            ('route_replace', table_id, gateway, interface)
+            for table_id, (gateway, interface) in sorted(routes.items())
+            if defaults.get(table_id) != (gateway, interface)
+        ]
+        route_ops.extend(('route_flush', table_id) for table_id in sorted(populated - set(routes)))
+
+        # 映射元素：source 模式下期望为空，清理切换模式前的遗留
+        current = self.routing.list_marks()
+        mark_dels = [('mark_unset', mark, name) for name, mark in current.items() if marks.get(name) != mark]
+        mark_adds = [('mark_set', table_id, name) for name, table_id in marks.items() if current.get(name) != table_id]
+
+        return mark_dels + rule_dels + route_ops + rule_adds + mark_adds
+
+    def reconcile(self, dry_run: bool = False) -> dict:
+        """同步一次
+
+        Args:
+            dry_run: 只计算差异不提交
+
+        Returns:
+            {'rules_added', 'rules_removed', 'routes_replaced', 'tables_flushed',
+             'marks_set', 'marks_removed', 'failed', 'changes'}
+        """
+        ops = self.plan()
+        failed = set() if dry_run else self.routing.apply_changes(ops)
+
+        counts = dict.fromkeys(
+            ('rule_add', 'rule_del', 'route_replace', 'route_flush', 'mark_set', 'mark_unset'), 0
+        )
+        for op in ops:
+            counts[op[0].replace('mark_rule', 'rule')] += 1
+        result = {
+            'rules_added': counts['rule_add'],
+            'rules_removed': counts['rule_del'],
+            'routes_replaced': counts['route_replace'],
+            'tables_flushed': counts['route_flush'],
+            'marks_set': counts['mark_set'],
+            'marks_removed': counts['mark_unset'],
+            'failed': len(failed),
+            'changes': [' '.join(str(part) for part in op) for op in ops] if dry_run else [],
+        }
+
+        if ops and not dry_run:
+            summary = (
+                f'规则 +{result["rules_added"]}/-{result["rules_removed"]}, '
+                f'映射 +{result["marks_set"]}/-{result["marks_removed"]}, '
+                f'路由 {result["routes_replaced"]}, 清空表 {result["tables_flushed"]}, 失败 {len(failed)}'
+            )
+            logger.info(f'策略路由同步: {summary}')
+            SystemLog.log_routing(
+                f'策略路由同步: {summary}',
+                details={'failed': [' '.join(str(part) for part in ops[i]) for i in sorted(failed)]}
+            )
+        return result
@@ -1,11 +1,27 @@
 """策略路由管理服务"""
 
+import json
 import logging
+import re
 import subprocess
-from pathlib import Path
+
+from django.conf import settings
 
 from apps.logs.models import SystemLog
 
+from .netlink import (
+    ARPHRD_PPP,
+    RTM_DELROUTE,
+    RTM_DELRULE,
+    RTM_NEWROUTE,
+    RTM_NEWRULE,
+    NetlinkError,
+    NetlinkRoute,
+    RouteMessage,
+    netlink_available,
+)
+from .rt_tables import RtTables, RtTablesError
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,18 +31,33 @@ class RoutingError(Exception):
 
 
 class RoutingService:
-    """策略路由管理服务"""
+    """策略路由管理服务
 
-    RT_TABLES_PATH = '/etc/iproute2/rt_tables'
+    ROUTING_BACKEND=netlink (默认) 时经 rtnetlink 套接字直接提交变更，
+    iproute2 或平台不支持 netlink 时回退为调用 ip 命令。
 
-    def __init__(self):
-        self._ensure_rt_tables()
+    ROUTING_MODE 选择出口路由表的匹配方式：
+    - source: 每个账号一条 from <PPP IP> 规则
+    - fwmark: nftables 映射 (出口接口 -> mark) 在新连接上打标记并保存到 connmark，
+      后续报文从 connmark 恢复；规则按 mark 选择路由表 (mark 即路由表 ID)。
+      代理的出站套接字绑定到账号的 PPP 接口，各会话的服务器端地址相同 (xl2tpd local ip)，
+      因此以接口名而非源地址区分账号。接口匹配由一次哈希查找完成，映射元素随账号上下线增量增删。
+      内核规则不能由 mark 推导路由表，仍是每个账号一条 fwmark 规则、逐条匹配，
+      相对 source 模式只降低单条规则的匹配开销 (常数级优化)，不改变随账号数线性增长
+    """
 
-    def _ensure_rt_tables(self):
-        """确保 rt_tables 文件存在"""
-        rt_tables = Path(self.RT_TABLES_PATH)
-        if not rt_tables.exists():
-            logger.warning(f'{self.RT_TABLES_PATH} 不存在')
+    RT_TABLES_PATH = '/etc/iproute2/rt_tables'
+    # 源路由规则优先级
+    RULE_PRIORITY = 100
+    NFT_TABLE = 'socks_proxy_route'
+    NFT_MAP = 'oif_marks'
+    # 按源地址打标记的旧映射，同一服务器地址下多个会话会互相覆盖
+    NFT_LEGACY_MAP = 'src_marks'
+
+    def __init__(self, mode: str | None = None):
+        self.mode = mode or settings.ROUTING_MODE
+        self.netlink = NetlinkRoute() if settings.ROUTING_BACKEND == 'netlink' and netlink_available() else None
+        self.rt_tables = RtTables(self.RT_TABLES_PATH)
 
     def _run_cmd(self, cmd: list, check: bool = True) -> subprocess.CompletedProcess:
         """执行命令"""
@@ -43,43 +74,346 @@ class RoutingService:
             raise RoutingError(f'命令执行失败: {e.stderr}')
 
     def _table_exists(self, table_id: int) -> bool:
-        """检查路由表是否存在"""
+        """检查路由表是否已在 rt_tables 中登记"""
         try:
-            with open(self.RT_TABLES_PATH) as f:
-                for line in f:
-                    if line.strip().startswith(str(table_id)):
-                        return True
-        except IOError:
-            pass
-        return False
+            return self.rt_tables.exists(table_id)
+        except RtTablesError:
+            return False
 
     def create_routing_table(self, table_id: int, table_name: str) -> bool:
-        """创建路由表
+        """在 rt_tables 中登记路由表名称（仅供按名称引用的旧 fwmark 路由使用，
+        源路由直接使用数字表 ID，无需登记）
 
         Args:
-            table_id: 路由表 ID (100-252)
+            table_id: 路由表 ID
             table_name: 路由表名称
 
         Returns:
             是否创建成功
         """
-        if self._table_exists(table_id):
-            logger.info(f'路由表 {table_name} (ID: {table_id}) 已存在')
-            return True
-
         try:
-            with open(self.RT_TABLES_PATH, 'a') as f:
-                f.write(f'{table_id} {table_name}\n')
+            # ID 被复用时旧名称改为新名称
+            if not self.rt_tables.update(add={table_id: table_name})[0]:
+                logger.info(f'路由表 {table_name} (ID: {table_id}) 已存在')
+                return True
 
             logger.info(f'创建路由表: {table_name} (ID: {table_id})')
             SystemLog.log_routing(f'创建路由表: {table_name}', details={'table_id': table_id})
             return True
 
-        except IOError as e:
+        except RtTablesError as e:
             logger.error(f'创建路由表失败: {e}')
             SystemLog.log_error('routing', f'创建路由表失败: {e}')
             raise RoutingError(f'创建路由表失败: {e}')
 
+    def _run_batch(self, commands: list) -> set:
+        """以一个 ip -batch 进程执行多条命令（-force 出错继续）
+
+        Returns:
+            执行失败的命令下标集合
+        """
+        if not commands:
+            return set()
+        result = subprocess.run(
+            ['ip', '-force', '-batch', '-'],
+            input='\n'.join(commands) + '\n',
+            capture_output=True,
+            text=True
+        )
+        # ip 对每条失败的命令输出 "Command failed -:<行号>"
+        return {int(n) - 1 for n in re.findall(r'Command failed -:(\d+)', result.stderr)}
+
+    @staticmethod
+    def _ip_command(op: tuple) -> str:
+        """将路由变更转换为 ip -batch 命令行"""
+        action, table = op[0], op[1]
+        if action == 'route_replace':
+            return f'route replace default via {op[2]} dev {op[3]} table {table}'
+        if action == 'route_del':
+            return f'route del default table {table}'
+        if action == 'route_flush':
+            return f'route flush table {table}'
+        verb = 'add' if action in ('rule_add', 'mark_rule_add') else 'del'
+        if action in ('mark_rule_add', 'mark_rule_del'):
+            return f'rule {verb} priority {op[3]} fwmark {op[2]} table {table}'
+        src = op[2]
+        priority = f' priority {op[3]}' if len(op) > 3 and op[3] is not None else ''
+        return f'rule {verb}{priority} from {src} table {table}'
+
+    def _netlink_apply(self, ops: list) -> set:
+        """经 rtnetlink 一次批量提交路由变更"""
+        failed = set()
+        requests = []
+        owners = []
+        flush = {}
+        for index, op in enumerate(ops):
+            action, table = op[0], int(op[1])
+            try:
+                if action == 'route_replace':
+                    requests.append(RouteMessage.route(RTM_NEWROUTE, table, gateway=op[2], interface=op[3]))
+                elif action == 'route_del':
+                    requests.append(RouteMessage.route(RTM_DELROUTE, table))
+                elif action == 'route_flush':
+                    flush[table] = index
+                    continue
+                elif action in ('mark_rule_add', 'mark_rule_del'):
+                    requests.append(RouteMessage.rule(
+                        RTM_NEWRULE if action == 'mark_rule_add' else RTM_DELRULE, table,
+                        fwmark=int(op[2]), priority=op[3]
+                    ))
+                else:
+                    src, _, src_len = op[2].partition('/')
+                    requests.append(RouteMessage.rule(
+                        RTM_NEWRULE if action == 'rule_add' else RTM_DELRULE, table,
+                        src=None if src == 'all' else src, src_len=int(src_len or 32),
+                        priority=op[3] if len(op) > 3 else None
+                    ))
+            except (OSError, ValueError):
+                # 接口不存在或地址无效
+                failed.add(index)
+                continue
+            owners.append(index)
+
+        if flush:
+            for route in self.netlink.dump_routes():
+                if route['table'] in flush:
+                    requests.append((RTM_DELROUTE, 0, route['message']))
+                    owners.append(flush[route['table']])
+
+        for owner, code in zip(owners, self.netlink.execute(requests)):
+            if code:
+                failed.add(owner)
+        return failed
+
+    def _nft_base(self) -> list:
+        table = f'inet {self.NFT_TABLE}'
+        return [
+            f'add table {table}',
+            f'add chain {table} output {{ type route hook output priority mangle; policy accept; }}',
+            f'flush chain {table} output',
+            # 先创建再删除，旧映射不存在时也不报错
+            f'add map {table} {self.NFT_LEGACY_MAP} {{ type ipv4_addr : mark; }}',
+            f'delete map {table} {self.NFT_LEGACY_MAP}',
+            f'add map {table} {self.NFT_MAP} {{ type ifname : mark; }}',
+            # 已标记的连接直接恢复 mark；新连接按出口接口查映射并保存到 connmark
+            f'add rule {table} output ct mark != 0 meta mark set ct mark',
+            f'add rule {table} output meta mark 0 meta mark set meta oifname map @{self.NFT_MAP} ct mark set meta mark',
+        ]
+
+    def list_marks(self) -> dict:
+        """列出 fwmark 映射 {接口名: mark}，nftables 不可用或映射不存在时为空"""
+        try:
+            result = subprocess.run(
+                ['nft', '-j', 'list', 'map', 'inet', self.NFT_TABLE, self.NFT_MAP],
+                capture_output=True, text=True
+            )
+            items = json.loads(result.stdout or '{}').get('nftables', [])
+        except (OSError, ValueError):
+            return {}
+
+        marks = {}
+        for item in items:
+            for key, value in item.get('map', {}).get('elem', []):
+                if isinstance(key, dict):
+                    key = key.get('elem', {}).get('val')
+                marks[str(key)] = int(value)
+        return marks
+
+    def _nft_apply(self, ops: list) -> set:
+        """以一个 nft 事务提交映射变更
+
+        与当前映射比较后只提交差异：接口已映射到其他 mark 时先删除再添加，
+        解除映射只删除仍指向该路由表的元素 (接口名可能已被其他账号使用)；接口为 None 时
+        删除指向该路由表的全部元素。
+
+        Args:
+            ops: [(下标, ('mark_set' | 'mark_unset', table_id, interface)), ...]
+        """
+        current = self.list_marks()
+        lines = []
+        for _, (action, table, interface) in ops:
+            table = int(table)
+            if action == 'mark_set' and current.get(interface) != table:
+                if interface in current:
+                    lines.append(f'delete element inet {self.NFT_TABLE} {self.NFT_MAP} {{ "{interface}" }}')
+                lines.append(f'add element inet {self.NFT_TABLE} {self.NFT_MAP} {{ "{interface}" : {table} }}')
+                current[interface] = table
+            elif action == 'mark_unset':
+                for name in [interface] if interface is not None else list(current):
+                    if current.get(name) == table:
+                        lines.append(f'delete element inet {self.NFT_TABLE} {self.NFT_MAP} {{ "{name}" }}')
+                        current.pop(name)
+
+        try:
+            subprocess.run(
+                ['nft', '-f', '-'], input='\n'.join([*self._nft_base(), *lines]) + '\n',
+                capture_output=True, text=True, check=True
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.error(f'fwmark 映射更新失败: {getattr(e, "stderr", e)}')
+            return {index for index, _ in ops}
+        return set()
+
+    def _apply_routes(self, ops: list) -> set:
+        if not ops:
+            return set()
+        if self.netlink:
+            try:
+                return self._netlink_apply(ops)
+            except (OSError, NetlinkError) as e:
+                logger.error(f'netlink 路由变更失败: {e}')
+                return set(range(len(ops)))
+        return self._run_batch([self._ip_command(op) for op in ops])
+
+    def apply_changes(self, ops: list) -> set:
+        """提交一批路由变更
+
+        解除映射 (mark_unset) 先于路由变更提交，建立映射 (mark_set) 在路由与规则就绪后提交。
+
+        Args:
+            ops: [('route_replace', table_id, gateway, interface), ('route_del', table_id),
+                  ('route_flush', table_id), ('rule_add' | 'rule_del', table_id, src[/len], priority),
+                  ('mark_rule_add' | 'mark_rule_del', table_id, mark, priority),
+                  ('mark_set' | 'mark_unset', table_id, interface), ...]
+
+        Returns:
+            执行失败的变更下标集合
+        """
+        if not ops:
+            return set()
+
+        routes = [(index, op) for index, op in enumerate(ops) if op[0] not in ('mark_set', 'mark_unset')]
+        unset = [(index, op) for index, op in enumerate(ops) if op[0] == 'mark_unset']
+        marks = [(index, op) for index, op in enumerate(ops) if op[0] == 'mark_set']
+
+        failed = self._nft_apply(unset) if unset else set()
+        failed.update(routes[i][0] for i in self._apply_routes([op for _, op in routes]))
+        if marks:
+            failed.update(self._nft_apply(marks))
+        return failed
+
+    def list_rules(self) -> list:
+        """列出全部 IPv4 策略规则 [{'priority', 'src', 'fwmark', 'table'}]，src 形如 10.0.0.1/32 或 all"""
+        if self.netlink:
+            return [
+                {
+                    'priority': rule['priority'],
+                    'src': f"{rule['src']}/{rule['src_len']}" if rule['src'] else 'all',
+                    'fwmark': rule['fwmark'],
+                    'table': str(rule['table']),
+                }
+                for rule in self.netlink.dump_rules()
+            ]
+
+        result = self._run_cmd(['ip', '-j', 'rule', 'show'], check=False)
+        try:
+            rules = json.loads(result.stdout or '[]')
+        except ValueError:
+            return []
+        return [
+            {
+                'priority': rule['priority'],
+                # 主机地址 (/32) 不输出 srclen
+                'src': f"{rule['src']}/{rule.get('srclen', 32)}" if rule.get('src', 'all') != 'all' else 'all',
+                'fwmark': int(rule['fwmark'].split('/')[0], 16) if 'fwmark' in rule else None,
+                'table': str(rule.get('table')),
+            }
+            for rule in rules
+        ]
+
+    def list_routes(self) -> list:
+        """列出全部 IPv4 路由 [{'table', 'dst', 'gateway', 'dev'}]，dst 形如 10.0.0.0/24 或 default"""
+        if self.netlink:
+            names = {link['index']: link['name'] for link in self.netlink.dump_links()}
+            return [
+                {
+                    'table': str(route['table']),
+                    'dst': f"{route['dst']}/{route['dst_len']}" if route['dst_len'] else 'default',
+                    'gateway': route['gateway'],
+                    'dev': names.get(route['oif']),
+                }
+                for route in self.netlink.dump_routes()
+            ]
+
+        result = self._run_cmd(['ip', '-j', 'route', 'show', 'table', 'all'], check=False)
+        try:
+            routes = json.loads(result.stdout or '[]')
+        except ValueError:
+            return []
+        return [
+            {
+                'table': str(route.get('table', 'main')),
+                'dst': route.get('dst', 'default'),
+                'gateway': route.get('gateway'),
+                'dev': route.get('dev'),
+            }
+            for route in routes
+        ]
+
+    def _setup_ops(self, table_id: int, local_ip: str, peer_ip: str, interface: str) -> tuple:
+        """单个账号的路由配置变更
+
+        Returns:
+            (变更列表, 需要检查结果的变更下标)
+        """
+        route = ('route_replace', table_id, peer_ip, interface)
+        if self.mode == 'fwmark':
+            return [
+                route,
+                ('mark_rule_del', table_id, table_id, self.RULE_PRIORITY),
+                ('mark_rule_add', table_id, table_id, self.RULE_PRIORITY),
+                ('mark_set', table_id, interface),
+            ], (2, 3)
+        # 旧规则可能不存在，删除失败忽略
+        return [
+            route,
+            ('rule_del', table_id, local_ip),
+            ('rule_add', table_id, local_ip, self.RULE_PRIORITY),
+        ], (2,)
+
+    def _cleanup_ops(self, table_id: int, local_ip: str) -> list:
+        """单个账号的路由清理变更，不存在时忽略"""
+        if self.mode == 'fwmark':
+            return [
+                ('mark_unset', table_id, None),
+                ('mark_rule_del', table_id, table_id, self.RULE_PRIORITY),
+                ('route_del', table_id),
+            ]
+        return [('rule_del', table_id, local_ip), ('route_del', table_id)]
+
+    def setup_source_routing_batch(self, routes: list) -> dict:
+        """批量配置基于源 IP 的策略路由
+
+        与 setup_source_routing 相同的规则，全部变更一次提交
+        （netlink 为多段消息，iproute2 为一个 ip -batch 进程）。
+
+        Args:
+            routes: [{'interface', 'table_id', 'table_name', 'local_ip', 'peer_ip'}, ...]
+
+        Returns:
+            {table_id: 是否配置成功}
+        """
+        if not routes:
+            return {}
+
+        ops = []
+        checked = {}
+        for r in routes:
+            table_ops, check = self._setup_ops(r['table_id'], r['local_ip'], r['peer_ip'], r['interface'])
+            checked.update((len(ops) + i, r['table_id']) for i in check)
+            ops.extend(table_ops)
+
+        failed = {checked[i] for i in self.apply_changes(ops) if i in checked}
+        results = {r['table_id']: r['table_id'] not in failed for r in routes}
+
+        ok = sum(results.values())
+        logger.info(f'批量源路由配置完成: 成功 {ok}, 失败 {len(results) - ok}')
+        SystemLog.log_routing(
+            f'批量源路由配置完成: 成功 {ok}, 失败 {len(results) - ok}',
+            details={'failed_tables': sorted(failed)}
+        )
+        return results
+
     def setup_routing(self, interface: str, table_id: int, table_name: str, proxy_port: int) -> bool:
         """配置策略路由 (基于 fwmark，已废弃，推荐使用 setup_source_routing)
 
@@ -127,7 +461,8 @@ class RoutingService:
                              local_ip: str, peer_ip: str) -> bool:
         """配置基于源 IP 的策略路由
 
-        让来自 local_ip 的流量通过 peer_ip (L2TP 客户端) 转发出去
+        让来自 local_ip 的流量通过 peer_ip (L2TP 客户端) 转发出去；
+        路由表以数字 ID 引用，不依赖 rt_tables 中的名称
 
         Args:
             interface: PPP 接口名 (ppp0, ppp1, ...)
@@ -140,21 +475,11 @@ class RoutingService:
             是否配置成功
         """
         try:
-            # 1. 创建路由表
-            self.create_routing_table(table_id, table_name)
-
-            # 2. 添加默认路由：通过 peer_ip 出去
-            self._run_cmd([
-                'ip', 'route', 'replace', 'default',
-                'via', peer_ip, 'dev', interface, 'table', table_name
-            ], check=False)
-
-            # 3. 添加路由策略：来自 local_ip 的流量使用此路由表
-            # 先删除可能存在的旧规则
-            self._run_cmd(['ip', 'rule', 'del', 'from', local_ip, 'table', table_name], check=False)
-            self._run_cmd([
-                'ip', 'rule', 'add', 'from', local_ip, 'table', table_name, 'priority', '100'
-            ], check=True)
+            # 1. 添加默认路由：通过 peer_ip 出去
+            # 2. 添加路由策略：来自 local_ip 的流量使用此路由表（先删除可能存在的旧规则）
+            ops, check = self._setup_ops(table_id, local_ip, peer_ip, interface)
+            if self.apply_changes(ops) & set(check):
+                raise RoutingError(f'添加路由策略失败: from {local_ip} table {table_id}')
 
             logger.info(f'源路由配置完成: {local_ip} -> {peer_ip} via {interface}')
             SystemLog.log_routing(
@@ -180,11 +505,8 @@ class RoutingService:
             是否清理成功
         """
         try:
-            # 1. 删除路由策略
-            self._run_cmd(['ip', 'rule', 'del', 'from', local_ip, 'table', table_name], check=False)
-
-            # 2. 删除路由
-            self._run_cmd(['ip', 'route', 'del', 'default', 'table', table_name], check=False)
+            # 删除路由策略与默认路由，不存在时忽略
+            self.apply_changes(self._cleanup_ops(table_id, local_ip))
 
             logger.info(f'源路由清理完成: {local_ip}, table={table_name}')
             SystemLog.log_routing(f'源路由清理完成: table={table_name}')
@@ -194,6 +516,44 @@ class RoutingService:
             logger.error(f'清理源路由失败: {e}')
             return False
 
+    def cleanup_source_routing_batch(self, tables: list) -> int:
+        """批量清理源路由：删除指向这些路由表的全部 ip rule 并清空路由表（fwmark 模式同时解除映射）
+
+        不依赖当前连接的 PPP IP，账号已下线时遗留的规则也会一并删除；
+        全部删除一次提交。
+
+        Args:
+            tables: [(table_id, table_name), ...]
+
+        Returns:
+            删除的规则数
+        """
+        if not tables:
+            return 0
+
+        targets = set()
+        for table_id, table_name in tables:
+            targets.update((str(table_id), table_name))
+
+        ops = [
+            ('mark_rule_del', rule['table'], rule['fwmark'], rule['priority']) if rule['fwmark'] is not None
+            else ('rule_del', rule['table'], rule['src'], rule['priority'])
+            for rule in self.list_rules() if rule['table'] in targets
+        ]
+        removed = len(ops)
+        ops.extend(('route_flush', table_id) for table_id, _ in tables)
+        if self.mode == 'fwmark':
+            table_ids = {int(table_id) for table_id, _ in tables}
+            ops.extend(('mark_unset', table_id, None) for table_id in table_ids)
+
+        failed = self.apply_changes(ops)
+        logger.info(f'批量源路由清理完成: 路由表 {len(tables)} 个, 规则 {removed} 条, 失败 {len(failed)}')
+        SystemLog.log_routing(
+            f'批量源路由清理完成: 路由表 {len(tables)} 个, 规则 {removed} 条',
+            details={'table_ids': [table_id for table_id, _ in tables], 'failed': len(failed)}
+        )
+        return removed
+
     def cleanup_routing(self, interface: str, table_id: int, table_name: str, proxy_port: int) -> bool:
         """清理策略路由
 
@@ -233,6 +593,20 @@ class RoutingService:
 
     def get_interface_info(self, interface: str) -> dict | None:
         """获取接口信息"""
+        if self.netlink:
+            try:
+                link = next((l for l in self.netlink.dump_links() if l['name'] == interface), None)
+                if link is None:
+                    return None
+                addresses = [a for a in self.netlink.dump_addresses() if a['index'] == link['index']]
+                return {
+                    'interface': interface,
+                    'up': link['up'],
+                    'ip': addresses[-1]['address'] if addresses else None,
+                }
+            except (OSError, NetlinkError):
+                return None
+
         try:
             result = self._run_cmd(['ip', 'addr', 'show', interface], check=False)
             if result.returncode != 0:
@@ -253,6 +627,12 @@ class RoutingService:
 
     def list_ppp_interfaces(self) -> list:
         """列出所有 PPP 接口"""
+        if self.netlink:
+            try:
+                return [link['name'] for link in self.netlink.dump_links() if link['type'] == ARPHRD_PPP]
+            except (OSError, NetlinkError):
+                return []
+
         result = self._run_cmd(['ip', 'link', 'show', 'type', 'ppp'], check=False)
         interfaces = []
 
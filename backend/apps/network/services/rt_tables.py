@@ -0,0 +1,185 @@
+"""rt_tables 路由表名称登记"""
+
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RtTablesError(Exception):
+    """rt_tables 文件操作异常"""
+    pass
+
+
+class RtTables:
+    """/etc/iproute2/rt_tables 管理
+
+    解析结果按文件状态 (mtime, size, inode) 缓存在进程内，文件未变化时查询不再读取文件；
+    修改时在所在目录的 flock 下重新读取并合并整批增删，写入同目录临时文件后 rename 原子替换，
+    其他进程或 ip 命令不会读到半截文件。注释与非本服务的表项原样保留。
+    """
+
+    PATH = '/etc/iproute2/rt_tables'
+    # 本服务登记的表名前缀 (账号路由表 rt_user_<账号 ID>)
+    NAME_PREFIX = 'rt_user_'
+
+    # {path: (文件状态, {table_id: name})}
+    _index = {}
+    _index_lock = threading.Lock()
+
+    def __init__(self, path: str | None = None):
+        self.path = path or self.PATH
+
+    def _stat_key(self) -> tuple | None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    @staticmethod
+    def _parse_line(line: str) -> tuple | None:
+        """解析一行，返回 (table_id, name)；注释、空行与无效行返回 None"""
+        fields = line.split('#', 1)[0].split()
+        if len(fields) < 2:
+            return None
+        try:
+            return int(fields[0], 0), fields[1]
+        except ValueError:
+            return None
+
+    def _read_lines(self) -> list:
+        try:
+            with open(self.path) as f:
+                return f.read().splitlines()
+        except FileNotFoundError:
+            return []
+        except OSError as e:
+            raise RtTablesError(f'读取 {self.path} 失败: {e}')
+
+    def entries(self) -> dict:
+        """全部表项 {table_id: name}"""
+        key = self._stat_key()
+        with self._index_lock:
+            cached = self._index.get(self.path)
+            if cached and cached[0] == key:
+                return cached[1]
+
+        entries = {}
+        if key is not None:
+            for line in self._read_lines():
+                parsed = self._parse_line(line)
+                if parsed:
+                    entries[parsed[0]] = parsed[1]
+
+        with self._index_lock:
+            self._index[self.path] = (key, entries)
+        return entries
+
+    def get(self, table_id: int) -> str | None:
+        return self.entries().get(int(table_id))
+
+    def exists(self, table_id: int) -> bool:
+        return int(table_id) in self.entries()
+
+    def update(self, add: dict | None = None, remove=()) -> tuple:
+        """批量增删表项，一次原子改写
+
+        同一 ID 已登记其他名称时改为新名称；新名称已被其他 ID 使用时删除旧表项 (名称须唯一)。
+
+        Args:
+            add: {table_id: name}
+            remove: 要删除的 table_id
+
+        Returns:
+            (新增或改名数, 删除数)
+        """
+        add = {int(k): v for k, v in (add or {}).items()}
+        remove = {int(k) for k in remove} - set(add)
+        if not add and not remove:
+            return 0, 0
+
+        # 已全部满足时不加锁、不改写
+        entries = self.entries()
+        if all(entries.get(k) == v for k, v in add.items()) and not remove & set(entries):
+            return 0, 0
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError as e:
+            raise RtTablesError(f'打开 {directory} 失败: {e}')
+
+        try:
+            fcntl.flock(dir_fd, fcntl.LOCK_EX)
+            names = {v: k for k, v in add.items()}
+            pending = dict(add)
+            lines = []
+            added = removed = 0
+            for line in self._read_lines():
+                parsed = self._parse_line(line)
+                if parsed:
+                    table_id, name = parsed
+                    if table_id in remove or (names.get(name, table_id) != table_id):
+                        removed += 1
+                        continue
+                    if table_id in pending:
+                        if pending.pop(table_id) != name:
+                            line = f'{table_id}\t{add[table_id]}'
+                            added += 1
+                lines.append(line)
+            for table_id, name in pending.items():
+                lines.append(f'{table_id}\t{name}')
+                added += 1
+
+            if added or removed:
+                self._write(directory, lines)
+        finally:
+            os.close(dir_fd)
+
+        logger.info(f'rt_tables 更新: 新增/改名 {added}, 删除 {removed}')
+        return added, removed
+
+    def _write(self, directory: str, lines: list):
+        """写入临时文件后 rename 替换"""
+        try:
+            mode = os.stat(self.path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.rt_tables.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise RtTablesError(f'写入 {self.path} 失败: {e}')
+
+    def prune(self, known: dict) -> int:
+        """删除已删除账号遗留的表项
+
+        只处理本服务登记的表项 (NAME_PREFIX 前缀)，ID 与名称不再对应数据库中的路由表时删除。
+
+        Args:
+            known: 数据库中的路由表 {table_id: table_name}
+
+        Returns:
+            删除的表项数
+        """
+        stale = [
+            table_id for table_id, name in self.entries().items()
+            if name.startswith(self.NAME_PREFIX) and known.get(table_id) != name
+        ]
+        if not stale:
+            return 0
+        return self.update(remove=stale)[1]
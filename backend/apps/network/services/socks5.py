@@ -0,0 +1,251 @@
+"""内置 Socks5 引擎管理"""
+
+import fcntl
+import json
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+from apps.logs.models import SystemLog
+
+from .firewall import FirewallService
+from .supervisor import SupervisorClient, SupervisorError
+
+logger = logging.getLogger(__name__)
+
+
+class Socks5Error(Exception):
+    """Socks5 引擎异常"""
+    pass
+
+
+class Socks5Service:
+    """内置 Socks5 引擎管理
+
+    接口与 GostService 一致。监听端口记录在 SOCKS5_RUN_DIR/listeners.json 中，
+    变更后广播到全部引擎 Worker 的控制 Socket；Worker 重启时从该文件恢复。
+    引擎进程由 manage.py socks5_server 持有，因此视为受监管。
+    """
+
+    supervised = True
+
+    def __init__(self):
+        self.run_dir = Path(settings.SOCKS5_RUN_DIR)
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self.firewall = FirewallService()
+
+    @property
+    def state_file(self) -> Path:
+        return self.run_dir / 'listeners.json'
+
+    def get_worker(self, port: int) -> int | None:
+        """全部 Worker 共享所有端口，无固定 Worker"""
+        return None
+
+    @contextmanager
+    def _locked(self):
+        """状态文件锁，防止多个 Web/Celery 进程并发改写"""
+        with open(self.run_dir / 'listeners.lock', 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load_state(self) -> dict:
+        """读取监听状态 {port: interface}"""
+        try:
+            return {int(k): v for k, v in json.loads(self.state_file.read_text()).items()}
+        except (ValueError, IOError):
+            return {}
+
+    def _save_state(self, state: dict):
+        """原子写入监听状态"""
+        tmp_file = self.state_file.with_suffix('.json.tmp')
+        tmp_file.write_text(json.dumps({str(k): v for k, v in sorted(state.items())}))
+        os.replace(tmp_file, self.state_file)
+
+    def _engine_pid(self) -> int | None:
+        """读取引擎主进程 PID"""
+        try:
+            pid = int((self.run_dir / 'engine.pid').read_text().strip())
+            os.kill(pid, 0)
+            return pid
+        except (ValueError, IOError, OSError):
+            return None
+
+    def _worker_sockets(self) -> list:
+        return sorted(self.run_dir.glob('worker-*.sock'))
+
+    def _broadcast(self, op: str, **payload) -> list:
+        """向全部 Worker 发送控制请求
+
+        Raises:
+            Socks5Error: 没有可用 Worker 或任一 Worker 返回错误时
+        """
+        sockets = self._worker_sockets()
+        if not sockets:
+            raise Socks5Error('Socks5 引擎未运行 (manage.py socks5_server)')
+
+        responses = []
+        for path in sockets:
+            try:
+                responses.append(SupervisorClient(str(path)).request(op, **payload))
+            except SupervisorError as e:
+                raise Socks5Error(f'{path.name}: {e}')
+        return responses
+
+    def _apply(self, port: int, interface: str | None, replace: bool = False):
+        """更新状态文件并广播到 Worker；interface 为 None 表示移除"""
+        with self._locked():
+            state = self._load_state()
+            if interface is None:
+                state.pop(port, None)
+            else:
+                state[port] = interface
+            self._save_state(state)
+
+            if interface is None:
+                self._broadcast('remove', port=port)
+            else:
+                self._broadcast('add', port=port, interface=interface, replace=replace)
+
+    def is_running(self, port: int) -> bool:
+        """检查指定端口的代理是否运行"""
+        return self.get_status(port)['running']
+
+    def start(self, port: int, bind_ip: str, interface: str = '', open_firewall: bool = True) -> int | None:
+        """添加 Socks5 监听
+
+        Args:
+            port: 监听端口
+            bind_ip: 绑定出口 IP (保留参数，用于日志记录)
+            interface: 绑定接口名 (必需，如 ppp0)
+            open_firewall: 是否开放防火墙端口（批量操作时由调用方统一开放）
+
+        Returns:
+            引擎主进程 PID
+
+        Raises:
+            Socks5Error: 启动失败时
+        """
+        if not interface:
+            raise Socks5Error('必须指定绑定接口 (interface)')
+        if self._load_state().get(port) and self.is_running(port):
+            raise Socks5Error(f'端口 {port} 的代理已在运行')
+
+        try:
+            self._apply(port, interface)
+        except Socks5Error as e:
+            logger.error(f'添加 Socks5 监听失败: {e}')
+            SystemLog.log_error('proxy', f'代理启动失败: {e}', details={'port': port})
+            raise
+
+        if open_firewall:
+            self.firewall.open_ports([port])
+
+        pid = self._engine_pid()
+        logger.info(f'Socks5 监听已添加: 端口={port}, 接口={interface}')
+        SystemLog.log_proxy(
+            f'代理启动成功: 端口 {port}',
+            details={'port': port, 'interface': interface, 'bind_ip': bind_ip, 'pid': pid, 'backend': 'socks5'}
+        )
+        return pid
+
+    def stop(self, port: int, close_firewall: bool = True) -> bool:
+        """移除 Socks5 监听
+
+        Args:
+            port: 监听端口
+            close_firewall: 是否关闭防火墙端口（批量操作时由调用方统一关闭）
+
+        Returns:
+            是否成功停止
+        """
+        try:
+            self._apply(port, None)
+            logger.info(f'Socks5 监听已移除: 端口={port}')
+            SystemLog.log_proxy(f'代理停止成功: 端口 {port}', details={'port': port, 'backend': 'socks5'})
+        except Socks5Error as e:
+            logger.error(f'移除 Socks5 监听失败: {e}')
+            SystemLog.log_error('proxy', f'代理停止失败: {e}', details={'port': port})
+            return False
+        finally:
+            if close_firewall:
+                self.firewall.close_ports([port])
+
+        return True
+
+    def stop_many(self, ports: list, timeout: float | None = None) -> dict:
+        """批量移除监听：状态文件只加锁写入一次（不处理防火墙）
+
+        Returns:
+            {port: 是否成功停止}
+        """
+        results = {}
+        with self._locked():
+            state = self._load_state()
+            for port in ports:
+                state.pop(port, None)
+            self._save_state(state)
+
+            for port in ports:
+                try:
+                    self._broadcast('remove', port=port)
+                    results[port] = True
+                except Socks5Error as e:
+                    logger.error(f'移除 Socks5 监听失败: 端口={port}, 错误: {e}')
+                    results[port] = False
+
+        stopped = sum(results.values())
+        logger.info(f'批量移除 Socks5 监听: 成功 {stopped}, 失败 {len(results) - stopped}')
+        SystemLog.log_proxy(
+            f'批量停止代理: 成功 {stopped}, 失败 {len(results) - stopped}',
+            details={'backend': 'socks5'}
+        )
+        return results
+
+    def restart(self, port: int, bind_ip: str, interface: str = '') -> int | None:
+        """重新绑定出站接口（监听不中断）"""
+        if not interface:
+            raise Socks5Error('必须指定绑定接口 (interface)')
+
+        self._apply(port, interface, replace=True)
+        self.firewall.open_ports([port])
+        SystemLog.log_proxy(
+            f'代理重新绑定: 端口 {port}',
+            details={'port': port, 'interface': interface, 'bind_ip': bind_ip, 'backend': 'socks5'}
+        )
+        return self._engine_pid()
+
+    def get_status(self, port: int) -> dict:
+        """获取代理状态（汇总全部 Worker 的连接与流量统计）"""
+        status = {
+            'port': port,
+            'running': False,
+            'pid': None,
+            'worker': None,
+            'active': 0,
+            'total': 0,
+            'rejected': 0,
+            'bytes_up': 0,
+            'bytes_down': 0,
+        }
+        try:
+            responses = self._broadcast('stats', port=port)
+        except Socks5Error:
+            return status
+
+        status['running'] = all('interface' in r for r in responses)
+        status['pid'] = self._engine_pid() if status['running'] else None
+        for r in responses:
+            for key in ('active', 'total', 'rejected', 'bytes_up', 'bytes_down'):
+                status[key] += r.get(key, 0)
+        return status
+
+    def cleanup_stale(self):
+        """引擎由 socks5_server 持有，无需清理"""
+        return 0
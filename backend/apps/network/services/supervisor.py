@@ -0,0 +1,396 @@
+"""Gost 进程监管服务"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SupervisorError(Exception):
+    """进程监管异常"""
+    pass
+
+
+class SupervisorClient:
+    """进程监管服务客户端
+
+    通过 Unix Socket 向常驻的 ProcessSupervisor 发送一行 JSON 请求并读取一行 JSON 响应。
+    """
+
+    TIMEOUT = 5
+
+    def __init__(self, socket_path: str | None = None):
+        self.socket_path = socket_path or settings.GOST_SUPERVISOR_SOCKET
+
+    def request(self, op: str, **payload) -> dict:
+        """发送请求
+
+        Raises:
+            SupervisorError: 连接失败或返回错误时
+        """
+        payload['op'] = op
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.TIMEOUT)
+                sock.connect(self.socket_path)
+                sock.sendall(json.dumps(payload).encode() + b'\n')
+                with sock.makefile('rb') as f:
+                    line = f.readline()
+        except OSError as e:
+            raise SupervisorError(f'无法连接进程监管服务 {self.socket_path}: {e}')
+
+        try:
+            response = json.loads(line)
+        except ValueError:
+            raise SupervisorError(f'进程监管服务响应无效: {line!r}')
+
+        if not response.get('ok'):
+            raise SupervisorError(response.get('error', '未知错误'))
+        return response
+
+    def spawn(self, name: str, argv: list, log_file: str, match: dict, replace: bool = False) -> int:
+        """启动受监管的子进程
+
+        Args:
+            name: 子进程名 (如 port-10800, worker-0)
+            argv: 命令行
+            log_file: 标准输出/错误写入的日志文件
+            match: 子进程对应的 ProxyConfig 过滤条件，状态变化时按此条件一次性更新
+            replace: 已存在同名子进程时是否先停止再启动
+
+        Returns:
+            子进程 PID
+        """
+        response = self.request('spawn', name=name, argv=argv, log_file=log_file,
+                                match=match, replace=replace)
+        return response['pid']
+
+    def stop(self, name: str) -> int | None:
+        """停止子进程（不再自动重启），返回原 PID"""
+        return self.request('stop', name=name).get('pid')
+
+    def status(self, name: str) -> dict:
+        """获取子进程状态 {'running': bool, 'pid': int | None, 'restarts': int}"""
+        return self.request('status', name=name)
+
+    def list(self) -> dict:
+        """列出全部子进程状态"""
+        return self.request('list')['children']
+
+
+class _Child:
+    """受监管的子进程"""
+
+    def __init__(self, name: str, argv: list, log_file: str, match: dict):
+        self.name = name
+        self.argv = argv
+        self.log_file = log_file
+        self.match = match
+        self.pid = None
+        self.pidfd = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restarts = 0
+        self.stopping = False
+        self.restart_handle = None
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'running': self.pid is not None,
+            'pid': self.pid,
+            'restarts': self.restarts,
+        }
+
+
+class ProcessSupervisor:
+    """常驻进程监管服务
+
+    持有全部 Gost 子进程：通过 pidfd（不支持时退回 SIGCHLD）即时获知子进程退出，
+    按有界指数退避重启异常退出的子进程，并把状态变化以一次 UPDATE 写回 ProxyConfig。
+    Web/Celery 进程通过 SupervisorClient 经 Unix Socket 请求启动/停止子进程。
+    """
+
+    # 运行超过该时长视为稳定，重置退避计数
+    STABLE_SECONDS = 30
+
+    def __init__(self, socket_path: str | None = None):
+        self.socket_path = socket_path or settings.GOST_SUPERVISOR_SOCKET
+        self.backoff_base = settings.GOST_RESTART_BACKOFF_BASE
+        self.backoff_max = settings.GOST_RESTART_BACKOFF_MAX
+        self.children: dict[str, _Child] = {}
+        self.by_pid: dict[int, _Child] = {}
+        self.use_pidfd = hasattr(os, 'pidfd_open')
+        self.loop = None
+        self._stopped = None
+
+    # ---------- 子进程管理 ----------
+
+    def _launch(self, child: _Child):
+        """启动子进程并登记退出通知"""
+        Path(child.log_file).parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(child.log_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            pid = os.posix_spawn(
+                child.argv[0],
+                child.argv,
+                os.environ,
+                file_actions=[
+                    (os.POSIX_SPAWN_DUP2, fd, 1),
+                    (os.POSIX_SPAWN_DUP2, fd, 2),
+                ],
+                setsid=True
+            )
+        finally:
+            os.close(fd)
+
+        child.pid = pid
+        child.started_at = time.monotonic()
+        self.by_pid[pid] = child
+
+        if self.use_pidfd:
+            try:
+                child.pidfd = os.pidfd_open(pid)
+                self.loop.add_reader(child.pidfd, self._on_pidfd, child, pid)
+            except OSError:
+                # 内核不支持 pidfd，退回 SIGCHLD
+                self.use_pidfd = False
+                child.pidfd = None
+                self._install_sigchld()
+
+        logger.info(f'子进程已启动: {child.name}, PID={pid}')
+
+    def _on_pidfd(self, child: _Child, pid: int):
+        """pidfd 可读：子进程已退出"""
+        self.loop.remove_reader(child.pidfd)
+        os.close(child.pidfd)
+        child.pidfd = None
+        if self.by_pid.get(pid) is not child:
+            return
+        try:
+            _, status = os.waitpid(pid, 0)
+            returncode = os.waitstatus_to_exitcode(status)
+        except ChildProcessError:
+            returncode = None
+        self._on_exit(child, returncode)
+
+    def _install_sigchld(self):
+        """注册 SIGCHLD 处理（pidfd 不可用时）"""
+        self.loop.add_signal_handler(signal.SIGCHLD, self._reap)
+
+    def _reap(self):
+        """回收全部已退出的子进程"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            child = self.by_pid.get(pid)
+            if child:
+                self._on_exit(child, os.waitstatus_to_exitcode(status))
+
+    def _on_exit(self, child: _Child, returncode: int | None):
+        """处理子进程退出"""
+        self.by_pid.pop(child.pid, None)
+        pid, child.pid = child.pid, None
+
+        if child.stopping:
+            if self.children.get(child.name) is child:
+                self.children.pop(child.name)
+            logger.info(f'子进程已停止: {child.name}, PID={pid}')
+            return
+
+        uptime = time.monotonic() - child.started_at
+        if uptime >= self.STABLE_SECONDS:
+            child.failures = 0
+        delay = min(self.backoff_base * (2 ** child.failures), self.backoff_max)
+        child.failures += 1
+
+        logger.warning(f'子进程异常退出: {child.name}, PID={pid}, 返回码={returncode}, {delay:.1f}s 后重启')
+        self._push_state(child, running=False, details={
+            'pid': pid, 'returncode': returncode, 'restart_in': delay,
+        })
+        child.restart_handle = self.loop.call_later(delay, self._respawn, child)
+
+    def _respawn(self, child: _Child):
+        """按退避计划重启子进程"""
+        child.restart_handle = None
+        if child.stopping or self.children.get(child.name) is not child:
+            return
+        try:
+            self._launch(child)
+        except OSError as e:
+            logger.error(f'重启子进程失败: {child.name}, 错误: {e}')
+            child.started_at = time.monotonic()
+            self._on_exit(child, None)
+            return
+
+        child.restarts += 1
+        self._push_state(child, running=True)
+
+    def _push_state(self, child: _Child, running: bool, details: dict | None = None):
+        """把子进程状态一次性写回 ProxyConfig（在线程中执行以免阻塞事件循环）"""
+        if not child.match:
+            return
+        self.loop.run_in_executor(None, self._write_state, child.name, dict(child.match),
+                                  running, child.pid, details)
+
+    @staticmethod
+    def _write_state(name: str, match: dict, running: bool, pid: int | None, details: dict | None):
+        from django.db import close_old_connections
+
+        from apps.logs.models import SystemLog
+
+        from ..models import ProxyConfig
+
+        close_old_connections()
+        try:
+            updated = ProxyConfig.objects.filter(**match).update(is_running=running, gost_pid=pid)
+            if running:
+                SystemLog.log_proxy(f'子进程已重启: {name}', details={'pid': pid, 'proxies': updated})
+            else:
+                SystemLog.log_proxy(f'子进程异常退出: {name}', level='warning',
+                                    details={**(details or {}), 'proxies': updated})
+        except Exception as e:
+            logger.error(f'写回子进程状态失败: {name}, 错误: {e}')
+
+    def spawn(self, name: str, argv: list, log_file: str, match: dict | None = None,
+              replace: bool = False) -> int:
+        """启动受监管的子进程"""
+        child = self.children.get(name)
+        if child and not child.stopping:
+            if replace:
+                self.stop(name)
+            elif child.pid is not None:
+                raise SupervisorError(f'子进程 {name} 已在运行')
+            else:
+                # 处于退避等待中，按新参数立即启动
+                if child.restart_handle:
+                    child.restart_handle.cancel()
+                self.children.pop(name, None)
+
+        child = _Child(name, argv, log_file, match or {})
+        self.children[name] = child
+        try:
+            self._launch(child)
+        except OSError as e:
+            self.children.pop(name, None)
+            raise SupervisorError(f'启动子进程失败: {e}')
+        return child.pid
+
+    def stop(self, name: str) -> int | None:
+        """停止子进程，不再自动重启"""
+        child = self.children.get(name)
+        if not child:
+            return None
+
+        child.stopping = True
+        if child.restart_handle:
+            child.restart_handle.cancel()
+            child.restart_handle = None
+
+        pid = child.pid
+        if pid is None:
+            self.children.pop(name, None)
+            return None
+
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        return pid
+
+    # ---------- 控制接口 ----------
+
+    def _dispatch(self, request: dict) -> dict:
+        op = request.get('op')
+        name = request.get('name', '')
+
+        if op == 'spawn':
+            pid = self.spawn(name, request['argv'], request['log_file'],
+                             request.get('match'), request.get('replace', False))
+            return {'pid': pid}
+        if op == 'stop':
+            return {'pid': self.stop(name)}
+        if op == 'status':
+            child = self.children.get(name)
+            if not child or child.stopping:
+                return {'name': name, 'running': False, 'pid': None, 'restarts': 0}
+            return child.to_dict()
+        if op == 'list':
+            return {'children': {n: c.to_dict() for n, c in self.children.items() if not c.stopping}}
+        raise SupervisorError(f'未知操作: {op}')
+
+    async def _handle_client(self, reader, writer):
+        try:
+            line = await reader.readline()
+            try:
+                response = {'ok': True, **self._dispatch(json.loads(line))}
+            except (SupervisorError, KeyError, ValueError) as e:
+                response = {'ok': False, 'error': str(e)}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+        finally:
+            writer.close()
+
+    # ---------- 生命周期 ----------
+
+    async def serve(self, on_ready=None):
+        """运行监管服务直到收到 SIGTERM/SIGINT"""
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+
+        if not self.use_pidfd:
+            self._install_sigchld()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            self.loop.add_signal_handler(sig, self._stopped.set)
+
+        socket_path = Path(self.socket_path)
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        socket_path.unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(self._handle_client, path=str(socket_path))
+        os.chmod(socket_path, 0o660)
+        logger.info(f'进程监管服务已启动: {socket_path}, 退出通知={"pidfd" if self.use_pidfd else "SIGCHLD"}')
+
+        if on_ready:
+            future = self.loop.run_in_executor(None, on_ready)
+            future.add_done_callback(self._log_ready_result)
+
+        async with server:
+            await self._stopped.wait()
+
+        await self._shutdown()
+        socket_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _log_ready_result(future):
+        if not future.cancelled() and future.exception():
+            logger.error(f'监管服务就绪回调失败: {future.exception()}')
+
+    async def _shutdown(self, timeout: float = 5):
+        """停止全部子进程"""
+        for name in list(self.children):
+            self.stop(name)
+
+        deadline = time.monotonic() + timeout
+        while self.by_pid and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        for pid in list(self.by_pid):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def run(self, on_ready=None):
+        asyncio.run(self.serve(on_ready))
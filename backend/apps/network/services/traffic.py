@@ -0,0 +1,210 @@
+"""接口流量采样"""
+
+import time
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class _Ring:
+    """单个接口的定长采样环：单调时钟时间戳与累计收发字节数"""
+
+    __slots__ = ('index', 'times', 'rx', 'tx', 'head', 'count')
+
+    def __init__(self, size: int, index: int):
+        self.index = index
+        self.times = array('d', [0.0]) * size
+        self.rx = array('Q', [0]) * size
+        self.tx = array('Q', [0]) * size
+        # 下一个写入位置与已写入的样本数
+        self.head = 0
+        self.count = 0
+
+    def push(self, timestamp: float, rx_bytes: int, tx_bytes: int):
+        self.times[self.head] = timestamp
+        self.rx[self.head] = rx_bytes
+        self.tx[self.head] = tx_bytes
+        self.head = (self.head + 1) % len(self.times)
+        self.count = min(self.count + 1, len(self.times))
+
+    def latest(self) -> tuple:
+        pos = (self.head - 1) % len(self.times)
+        return self.rx[pos], self.tx[pos]
+
+    def rate(self, window: float) -> tuple:
+        """最近 window 秒内的平均速率 (接收, 发送)，单位字节/秒；样本不足时取最早样本"""
+        if self.count < 2:
+            return 0.0, 0.0
+        size = len(self.times)
+        newest = (self.head - 1) % size
+        pos = newest
+        for step in range(1, self.count):
+            pos = (newest - step) % size
+            if self.times[newest] - self.times[pos] >= window:
+                break
+        elapsed = self.times[newest] - self.times[pos]
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (self.rx[newest] - self.rx[pos]) / elapsed, (self.tx[newest] - self.tx[pos]) / elapsed
+
+
+class TrafficSampler:
+    """PPP 接口流量采样
+
+    netmon 每 TRAFFIC_SAMPLE_INTERVAL 秒导出一次接口计数 (一次 netlink 链路导出)，写入每个接口
+    TRAFFIC_RING_SIZE 个样本的采样环，按最近 TRAFFIC_RATE_WINDOW 秒计算收发速率后整体写入缓存；
+    API 只读缓存，不再逐个接口读取 sysfs。接口重建 (ifindex 变化) 或计数回退时丢弃旧样本重新计算。
+    """
+
+    CACHE_KEY = 'interface_traffic'
+
+    def __init__(self, size: int | None = None, window: float | None = None):
+        self.size = size or settings.TRAFFIC_RING_SIZE
+        self.window = window or settings.TRAFFIC_RATE_WINDOW
+        self._rings = {}
+
+    def add(self, interfaces: dict, timestamp: float | None = None):
+        """记录一次采样
+
+        Args:
+            interfaces: InterfaceInventory 清单，{接口名: {'index', 'rx_bytes', 'tx_bytes', ...}}
+            timestamp: 单调时钟时间戳，默认当前
+        """
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        for name in self._rings.keys() - interfaces.keys():
+            del self._rings[name]
+
+        for name, info in interfaces.items():
+            ring = self._rings.get(name)
+            if ring is not None and ring.count:
+                rx_bytes, tx_bytes = ring.latest()
+                if ring.index != info['index'] or info['rx_bytes'] < rx_bytes or info['tx_bytes'] < tx_bytes:
+                    ring = None
+            if ring is None:
+                ring = self._rings[name] = _Ring(self.size, info['index'])
+            ring.push(timestamp, info['rx_bytes'], info['tx_bytes'])
+
+    def snapshot(self) -> dict:
+        """{接口名: {'rx_bytes', 'tx_bytes', 'rx_rate', 'tx_rate'}}"""
+        result = {}
+        for name, ring in self._rings.items():
+            rx_bytes, tx_bytes = ring.latest()
+            rx_rate, tx_rate = ring.rate(self.window)
+            result[name] = {
+                'rx_bytes': rx_bytes,
+                'tx_bytes': tx_bytes,
+                'rx_rate': round(rx_rate, 1),
+                'tx_rate': round(tx_rate, 1),
+            }
+        return result
+
+    def publish(self) -> dict:
+        """写入缓存，有效期与接口清单相同"""
+        traffic = {'sampled_at': time.time(), 'interfaces': self.snapshot()}
+        cache.set(self.CACHE_KEY, traffic, settings.INTERFACE_CACHE_TTL)
+        return traffic
+
+    @classmethod
+    def current(cls) -> dict:
+        """最近一次采样 {'sampled_at', 'interfaces'}
+
+        没有 netmon 运行时由接口清单给出累计字节数，速率为 0，sampled_at 为 None。
+        """
+        traffic = cache.get(cls.CACHE_KEY)
+        if traffic is not None:
+            return traffic
+
+        from .interfaces import InterfaceInventory
+
+        return {
+            'sampled_at': None,
+            'interfaces': {
+                name: {'rx_bytes': info['rx_bytes'], 'tx_bytes': info['tx_bytes'], 'rx_rate': 0.0, 'tx_rate': 0.0}
+                for name, info in InterfaceInventory().get().items()
+            },
+        }
+
+
+class TrafficRecorder:
+    """将接口流量计数写入账号流量历史
+
+    每次采样累加各接口相对上次的增量，每 TRAFFIC_RAW_INTERVAL 秒按接口对应的账号合并后写入一个原始时间段，
+    同时累加到分钟/小时/天汇总 (TrafficRollup.record)。接口重建或计数回退时从 0 计起；
+    启动时的首次采样只作为基准，不计入。
+    """
+
+    def __init__(self, interval: int | None = None):
+        self.interval = interval or settings.TRAFFIC_RAW_INTERVAL
+        # {接口名: (ifindex, rx_bytes, tx_bytes)}
+        self._last = None
+        # {接口名: [发送, 接收]}，发送对应接口 tx (服务器发往客户端)
+        self._pending = {}
+        self._bucket = None
+
+    def _bucket_start(self, timestamp: float) -> int:
+        return int(timestamp) - int(timestamp) % self.interval
+
+    def add(self, interfaces: dict, timestamp: float | None = None):
+        """记录一次采样，跨过时间段边界时写入上一时间段
+
+        Args:
+            interfaces: InterfaceInventory 清单
+            timestamp: Unix 时间戳，默认当前
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        bucket = self._bucket_start(timestamp)
+        if self._bucket is not None and bucket != self._bucket:
+            self.flush()
+        self._bucket = bucket
+
+        last = self._last
+        self._last = {name: (info['index'], info['rx_bytes'], info['tx_bytes']) for name, info in interfaces.items()}
+        if last is None:
+            return
+
+        for name, (index, rx_bytes, tx_bytes) in self._last.items():
+            previous = last.get(name)
+            if previous and previous[0] == index and rx_bytes >= previous[1] and tx_bytes >= previous[2]:
+                rx_bytes -= previous[1]
+                tx_bytes -= previous[2]
+            if rx_bytes or tx_bytes:
+                pending = self._pending.setdefault(name, [0, 0])
+                pending[0] += tx_bytes
+                pending[1] += rx_bytes
+
+    def flush(self) -> int:
+        """写入累计的时间段
+
+        Returns:
+            写入的账号数
+        """
+        from datetime import datetime, timezone
+
+        from django.db import close_old_connections
+
+        from apps.connections.models import Connection, TrafficRollup
+
+        pending, self._pending = self._pending, {}
+        if not pending or self._bucket is None:
+            return 0
+
+        close_old_connections()
+        # 接口名会被后续会话复用，取各接口最近一次连接的账号（含刚下线的连接）
+        owners = dict(
+            Connection.objects.filter(interface__in=list(pending))
+            .order_by('interface', '-connected_at')
+            .distinct('interface')
+            .values_list('interface', 'account_id')
+        )
+        usage = {}
+        for name, (sent, received) in pending.items():
+            account_id = owners.get(name)
+            if account_id is None:
+                continue
+            total = usage.setdefault(account_id, [0, 0])
+            total[0] += sent
+            total[1] += received
+
+        TrafficRollup.record(datetime.fromtimestamp(self._bucket, tz=timezone.utc), usage)
+        return len(usage)
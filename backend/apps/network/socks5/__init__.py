@@ -0,0 +1,3 @@
+from .server import Listener, Socks5Engine, Socks5EngineError
+
+__all__ = ['Listener', 'Socks5Engine', 'Socks5EngineError']
@@ -0,0 +1,116 @@
+"""Socks5 数据转发
+
+copy: 复用同一块缓冲区，经用户态 recv_into/sendall 转发
+splice: 经管道对以 splice(2) 在内核内搬运数据，不复制到用户态（仅 Linux）
+"""
+
+import asyncio
+import fcntl
+import os
+import socket
+
+BUFFER_SIZE = 64 * 1024
+PIPE_SIZE = 1024 * 1024
+
+SPLICE_AVAILABLE = hasattr(os, 'splice')
+
+
+def resolve_mode(mode: str) -> str:
+    """解析转发模式：auto 在支持 splice 时使用 splice"""
+    if mode == 'auto':
+        return 'splice' if SPLICE_AVAILABLE else 'copy'
+    if mode == 'splice' and not SPLICE_AVAILABLE:
+        return 'copy'
+    return mode
+
+
+def _shutdown_write(sock: socket.socket):
+    try:
+        sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+
+
+async def copy_relay(loop, src: socket.socket, dst: socket.socket, counter: list, index: int):
+    """单方向转发：src 读出的数据写入 dst，直到对端关闭
+
+    复用同一块缓冲区，字节数累加到 counter[index]。
+    """
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    try:
+        while True:
+            n = await loop.sock_recv_into(src, buffer)
+            if not n:
+                break
+            await loop.sock_sendall(dst, view[:n])
+            counter[index] += n
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        _shutdown_write(dst)
+
+
+async def _wait_fd(loop, fd: int, writable: bool):
+    """等待 fd 可读/可写"""
+    future = loop.create_future()
+
+    def _ready():
+        if not future.done():
+            future.set_result(None)
+
+    if writable:
+        loop.add_writer(fd, _ready)
+    else:
+        loop.add_reader(fd, _ready)
+    try:
+        await future
+    finally:
+        if writable:
+            loop.remove_writer(fd)
+        else:
+            loop.remove_reader(fd)
+
+
+async def splice_relay(loop, src: socket.socket, dst: socket.socket, counter: list, index: int):
+    """单方向零拷贝转发：src → 管道 → dst，数据不进入用户态"""
+    flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+    src_fd, dst_fd = src.fileno(), dst.fileno()
+    read_end, write_end = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+    try:
+        fcntl.fcntl(write_end, fcntl.F_SETPIPE_SZ, PIPE_SIZE)
+    except OSError:
+        pass
+
+    try:
+        while True:
+            try:
+                n = os.splice(src_fd, write_end, PIPE_SIZE, flags=flags)
+            except BlockingIOError:
+                await _wait_fd(loop, src_fd, writable=False)
+                continue
+            if not n:
+                break
+
+            pending = n
+            while pending:
+                try:
+                    pending -= os.splice(read_end, dst_fd, pending, flags=flags)
+                except BlockingIOError:
+                    await _wait_fd(loop, dst_fd, writable=True)
+            counter[index] += n
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        os.close(read_end)
+        os.close(write_end)
+        _shutdown_write(dst)
+
+
+async def relay(loop, client: socket.socket, upstream: socket.socket, counter: list, mode: str = 'copy'):
+    """双向转发，counter = [上行字节, 下行字节]"""
+    pipe = splice_relay if mode == 'splice' else copy_relay
+    await asyncio.gather(
+        pipe(loop, client, upstream, counter, 0),
+        pipe(loop, upstream, client, counter, 1),
+    )
@@ -0,0 +1,355 @@
+"""内置 Socks5 引擎
+
+单个事件循环承载多个监听端口；多个 Worker 进程以 SO_REUSEPORT 共享同一组端口，
+由内核在进程间分发新连接。出站连接通过 SO_BINDTODEVICE 绑定到账号的 PPP 接口，
+与 Gost 的 interface 参数效果一致。
+"""
+
+import asyncio
+import errno
+import ipaddress
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+from pathlib import Path
+
+from .relay import relay, resolve_mode
+
+logger = logging.getLogger(__name__)
+
+SOCKS_VERSION = 5
+METHOD_NO_AUTH = 0x00
+METHOD_UNACCEPTABLE = 0xFF
+CMD_CONNECT = 0x01
+ATYP_IPV4 = 0x01
+ATYP_DOMAIN = 0x03
+ATYP_IPV6 = 0x04
+
+REP_SUCCEEDED = 0x00
+REP_GENERAL_FAILURE = 0x01
+REP_NETWORK_UNREACHABLE = 0x03
+REP_HOST_UNREACHABLE = 0x04
+REP_CONNECTION_REFUSED = 0x05
+REP_TTL_EXPIRED = 0x06
+REP_COMMAND_NOT_SUPPORTED = 0x07
+REP_ADDRESS_NOT_SUPPORTED = 0x08
+
+
+class Socks5EngineError(Exception):
+    """Socks5 引擎异常"""
+    pass
+
+
+class _HandshakeError(Exception):
+    """握手失败，携带回复码"""
+
+    def __init__(self, reply: int | None = None):
+        super().__init__(reply)
+        self.reply = reply
+
+
+class Listener:
+    """单个监听端口及其统计"""
+
+    def __init__(self, port: int, interface: str, sock: socket.socket):
+        self.port = port
+        self.interface = interface
+        self.sock = sock
+        self.accept_task = None
+        self.connections = set()
+        self.total = 0
+        self.rejected = 0
+        # [上行字节, 下行字节]，由转发协程直接累加
+        self.bytes = [0, 0]
+
+    def to_dict(self) -> dict:
+        return {
+            'port': self.port,
+            'interface': self.interface,
+            'active': len(self.connections),
+            'total': self.total,
+            'rejected': self.rejected,
+            'bytes_up': self.bytes[0],
+            'bytes_down': self.bytes[1],
+        }
+
+
+class Socks5Engine:
+    """Socks5 引擎（单个 Worker 进程）
+
+    控制接口为 Unix Socket，协议与进程监管服务相同（一行 JSON 请求/响应）：
+    add / remove / stats / list。
+    """
+
+    def __init__(self, control_socket: str, state_file: str | None = None, max_connections: int = 0,
+                 handshake_timeout: float = 10, connect_timeout: float = 10, relay_mode: str = 'auto'):
+        self.control_socket = control_socket
+        self.state_file = state_file
+        self.max_connections = max_connections
+        self.handshake_timeout = handshake_timeout
+        self.connect_timeout = connect_timeout
+        self.relay_mode = resolve_mode(relay_mode)
+        self.listeners = {}
+        self.loop = None
+
+    # ---------- 监听管理 ----------
+
+    @staticmethod
+    def _listen_socket(port: int) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+        try:
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(('::', port))
+            sock.listen(1024)
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def add_listener(self, port: int, interface: str, replace: bool = False) -> Listener:
+        """添加监听端口；replace 时更新已有监听的出站接口"""
+        listener = self.listeners.get(port)
+        if listener:
+            if not replace and listener.interface == interface:
+                return listener
+            # 重新绑定：新连接使用新接口，旧接口上的连接已不可用，直接断开
+            listener.interface = interface
+            self._close_connections(listener)
+            logger.info(f'Socks5 监听已重新绑定: 端口={port}, 接口={interface}')
+            return listener
+
+        try:
+            sock = self._listen_socket(port)
+        except OSError as e:
+            raise Socks5EngineError(f'监听端口 {port} 失败: {e}')
+
+        listener = Listener(port, interface, sock)
+        listener.accept_task = self.loop.create_task(self._accept(listener))
+        self.listeners[port] = listener
+        logger.info(f'Socks5 监听已添加: 端口={port}, 接口={interface}')
+        return listener
+
+    def remove_listener(self, port: int) -> bool:
+        """移除监听端口并断开其全部连接"""
+        listener = self.listeners.pop(port, None)
+        if not listener:
+            return False
+
+        listener.accept_task.cancel()
+        listener.sock.close()
+        self._close_connections(listener)
+        logger.info(f'Socks5 监听已移除: 端口={port}')
+        return True
+
+    @staticmethod
+    def _close_connections(listener: Listener):
+        for task in list(listener.connections):
+            task.cancel()
+
+    def load_state(self):
+        """从状态文件恢复监听 {port: interface}"""
+        if not self.state_file or not Path(self.state_file).exists():
+            return
+
+        try:
+            state = json.loads(Path(self.state_file).read_text())
+        except (ValueError, IOError) as e:
+            logger.warning(f'Socks5 状态文件无效: {e}')
+            return
+
+        for port, interface in state.items():
+            try:
+                self.add_listener(int(port), interface)
+            except Socks5EngineError as e:
+                logger.error(str(e))
+
+    # ---------- 连接处理 ----------
+
+    async def _accept(self, listener: Listener):
+        while True:
+            try:
+                client, _ = await self.loop.sock_accept(listener.sock)
+            except OSError as e:
+                logger.warning(f'端口 {listener.port} 接受连接失败: {e}')
+                await asyncio.sleep(0.1)
+                continue
+
+            if self.max_connections and len(listener.connections) >= self.max_connections:
+                listener.rejected += 1
+                client.close()
+                continue
+
+            listener.total += 1
+            client.setblocking(False)
+            task = self.loop.create_task(self._handle(listener, client))
+            listener.connections.add(task)
+            task.add_done_callback(listener.connections.discard)
+
+    async def _recv_exactly(self, sock: socket.socket, n: int) -> bytes:
+        data = b''
+        while len(data) < n:
+            chunk = await self.loop.sock_recv(sock, n - len(data))
+            if not chunk:
+                raise _HandshakeError()
+            data += chunk
+        return data
+
+    async def _negotiate(self, client: socket.socket) -> tuple:
+        """完成方法协商并读取 CONNECT 请求，返回 (host, port)"""
+        version, nmethods = await self._recv_exactly(client, 2)
+        if version != SOCKS_VERSION:
+            raise _HandshakeError()
+        methods = await self._recv_exactly(client, nmethods)
+        if METHOD_NO_AUTH not in methods:
+            await self.loop.sock_sendall(client, bytes([SOCKS_VERSION, METHOD_UNACCEPTABLE]))
+            raise _HandshakeError()
+        await self.loop.sock_sendall(client, bytes([SOCKS_VERSION, METHOD_NO_AUTH]))
+
+        version, cmd, _, atyp = await self._recv_exactly(client, 4)
+        if version != SOCKS_VERSION:
+            raise _HandshakeError()
+
+        if atyp == ATYP_IPV4:
+            host = str(ipaddress.IPv4Address(await self._recv_exactly(client, 4)))
+        elif atyp == ATYP_IPV6:
+            host = str(ipaddress.IPv6Address(await self._recv_exactly(client, 16)))
+        elif atyp == ATYP_DOMAIN:
+            length = (await self._recv_exactly(client, 1))[0]
+            host = (await self._recv_exactly(client, length)).decode('idna')
+        else:
+            raise _HandshakeError(REP_ADDRESS_NOT_SUPPORTED)
+        port = struct.unpack('!H', await self._recv_exactly(client, 2))[0]
+
+        if cmd != CMD_CONNECT:
+            raise _HandshakeError(REP_COMMAND_NOT_SUPPORTED)
+        return host, port
+
+    async def _connect(self, host: str, port: int, interface: str) -> socket.socket:
+        """经指定接口连接目标，依次尝试解析出的地址"""
+        try:
+            infos = await self.loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror:
+            raise _HandshakeError(REP_HOST_UNREACHABLE)
+
+        reply = REP_HOST_UNREACHABLE
+        for family, type_, proto, _, addr in infos:
+            sock = socket.socket(family, type_, proto)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, interface.encode())
+                sock.setblocking(False)
+                await self.loop.sock_connect(sock, addr)
+                return sock
+            except ConnectionRefusedError:
+                reply = REP_CONNECTION_REFUSED
+            except OSError as e:
+                reply = REP_NETWORK_UNREACHABLE if e.errno in (errno.ENETUNREACH, errno.ENODEV) else REP_HOST_UNREACHABLE
+            sock.close()
+        raise _HandshakeError(reply)
+
+    @staticmethod
+    def _reply(code: int, bound: tuple | None = None) -> bytes:
+        if bound is None:
+            return bytes([SOCKS_VERSION, code, 0, ATYP_IPV4, 0, 0, 0, 0, 0, 0])
+        address = ipaddress.ip_address(bound[0])
+        atyp = ATYP_IPV4 if address.version == 4 else ATYP_IPV6
+        return bytes([SOCKS_VERSION, code, 0, atyp]) + address.packed + struct.pack('!H', bound[1])
+
+    async def _handle(self, listener: Listener, client: socket.socket):
+        upstream = None
+        try:
+            try:
+                host, port = await asyncio.wait_for(self._negotiate(client), self.handshake_timeout)
+                upstream = await asyncio.wait_for(
+                    self._connect(host, port, listener.interface), self.connect_timeout
+                )
+            except asyncio.TimeoutError:
+                raise _HandshakeError(REP_TTL_EXPIRED)
+
+            await self.loop.sock_sendall(client, self._reply(REP_SUCCEEDED, upstream.getsockname()[:2]))
+            await relay(self.loop, client, upstream, listener.bytes, self.relay_mode)
+
+        except _HandshakeError as e:
+            if e.reply is not None:
+                try:
+                    await self.loop.sock_sendall(client, self._reply(e.reply))
+                except OSError:
+                    pass
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            client.close()
+            if upstream:
+                upstream.close()
+
+    # ---------- 控制接口 ----------
+
+    def _dispatch(self, request: dict) -> dict:
+        op = request.get('op')
+
+        if op == 'add':
+            listener = self.add_listener(int(request['port']), request['interface'], request.get('replace', False))
+            return listener.to_dict()
+        if op == 'remove':
+            return {'removed': self.remove_listener(int(request['port']))}
+        if op == 'stats':
+            listener = self.listeners.get(int(request['port']))
+            return listener.to_dict() if listener else {'port': int(request['port']), 'running': False}
+        if op == 'list':
+            return {'listeners': [listener.to_dict() for listener in self.listeners.values()]}
+        raise Socks5EngineError(f'未知操作: {op}')
+
+    async def _handle_client(self, reader, writer):
+        try:
+            line = await reader.readline()
+            try:
+                response = {'ok': True, **self._dispatch(json.loads(line))}
+            except (Socks5EngineError, KeyError, ValueError) as e:
+                response = {'ok': False, 'error': str(e)}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+        finally:
+            writer.close()
+
+    # ---------- 生命周期 ----------
+
+    async def serve(self):
+        """运行引擎直到收到 SIGTERM/SIGINT"""
+        self.loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            self.loop.add_signal_handler(sig, stopped.set)
+
+        socket_path = Path(self.control_socket)
+        socket_path.unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(self._handle_client, path=str(socket_path))
+        os.chmod(socket_path, 0o660)
+        self.load_state()
+        logger.info(
+            f'Socks5 Worker 已启动: {socket_path}, 监听 {len(self.listeners)} 个端口, 转发模式={self.relay_mode}'
+        )
+
+        async with server:
+            await stopped.wait()
+
+        for port in list(self.listeners):
+            self.remove_listener(port)
+        socket_path.unlink(missing_ok=True)
+
+    def run(self):
+        """运行引擎，可用时使用 uvloop"""
+        try:
+            import uvloop
+        except ImportError:
+            uvloop = None
+
+        if uvloop:
+            with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                runner.run(self.serve())
+        else:
+            asyncio.run(self.serve())
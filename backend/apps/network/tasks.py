@@ -9,16 +9,21 @@ from apps.logs.models import SystemLog
 def cleanup_stale_processes():
     """清理僵死的 Gost 进程"""
     from .models import ProxyConfig
-    from .services import GostService
+    from .services import get_gost_service
+
+    gost_service = get_gost_service()
+    if gost_service.supervised:
+        # 监管服务即时感知进程退出并回写状态，无 PID 文件需要清理
+        return {'cleaned': 0, 'supervised': True}
 
-    gost_service = GostService()
     cleaned = gost_service.cleanup_stale()
 
-    # 同步数据库状态
-    for proxy in ProxyConfig.objects.filter(is_running=True):
+    # 同步数据库状态（内置 Socks5 引擎的监听由 socks5_server 持有）
+    for proxy in ProxyConfig.objects.filter(is_running=True, backend='gost'):
         if not gost_service.is_running(proxy.listen_port):
             proxy.is_running = False
             proxy.gost_pid = None
+            proxy.gost_worker = None
             proxy.save()
 
     if cleaned > 0:
@@ -31,17 +36,21 @@ def cleanup_stale_processes():
 def sync_proxy_status():
     """同步所有代理状态"""
     from .models import ProxyConfig
-    from .services import GostService
+    from .services import get_gost_service
+
+    gost_service = get_gost_service()
+    if gost_service.supervised:
+        return {'synced': 0, 'supervised': True}
 
-    gost_service = GostService()
     synced = 0
 
-    for proxy in ProxyConfig.objects.all():
+    for proxy in ProxyConfig.objects.filter(backend='gost'):
         running = gost_service.is_running(proxy.listen_port)
         if running != proxy.is_running:
             proxy.is_running = running
             if not running:
                 proxy.gost_pid = None
+                proxy.gost_worker = None
             proxy.save()
             synced += 1
 
@@ -54,24 +63,26 @@ def auto_start_proxies():
     from apps.accounts.models import L2TPAccount
 
     from .models import ProxyConfig
-    from .services import GostService
+    from .services import get_proxy_service
 
-    gost_service = GostService()
     started = 0
 
-    for proxy in ProxyConfig.objects.filter(is_running=False, auto_start=True):
+    proxies = ProxyConfig.objects.filter(is_running=False, auto_start=True).select_related('account__current_connection')
+    for proxy in proxies:
         account = proxy.account
         if not account.is_online:
             continue
 
         try:
             connection = account.current_connection
-            pid = gost_service.start(
+            proxy_service = get_proxy_service(proxy.backend)
+            pid = proxy_service.start(
                 port=proxy.listen_port,
                 bind_ip=account.assigned_ip,
                 interface=connection.interface
             )
             proxy.gost_pid = pid
+            proxy.gost_worker = proxy_service.get_worker(proxy.listen_port)
             proxy.is_running = True
             proxy.save()
             started += 1
@@ -81,31 +92,47 @@ def auto_start_proxies():
     return {'started': started}
 
 
+@shared_task(ignore_result=True)
+def detect_exit_ips(proxy_ids: list):
+    """代理就绪后检测出口 IP"""
+    from .models import ProxyConfig
+    from .services import ExitIPProber, ProxyProbe
+
+    proxies = [
+        proxy for proxy in ProxyConfig.objects.filter(id__in=proxy_ids, is_running=True)
+        if ProxyProbe.wait_ready(proxy.listen_port)
+    ]
+    return ExitIPProber().refresh(proxies)
+
+
 @shared_task
 def check_connection_health():
     """检查连接健康状态"""
+    from django.utils import timezone
+
     from apps.connections.models import Connection
 
-    from .services import RoutingService
+    from .services import InterfaceInventory
 
-    routing_service = RoutingService()
-    ppp_interfaces = set(routing_service.list_ppp_interfaces())
+    started = timezone.now()
+    ppp_interfaces = set(InterfaceInventory().refresh())
+    online = set(Connection.objects.filter(status='online').values_list('interface', flat=True))
 
-    stale = 0
-    for connection in Connection.objects.filter(status='online'):
-        if connection.interface not in ppp_interfaces:
-            from django.utils import timezone
+    stale = Connection.close_missing(online - ppp_interfaces, before=started)
+    for connection in stale:
+        SystemLog.log_connection(
+            f'检测到僵死连接: {connection.account.username}',
+            account=connection.account,
+            interface=connection.interface,
+            level='warning'
+        )
 
-            connection.status = 'offline'
-            connection.disconnected_at = timezone.now()
-            connection.save()
-            stale += 1
+    return {'stale_connections': len(stale)}
 
-            SystemLog.log_connection(
-                f'检测到僵死连接: {connection.account.username}',
-                account=connection.account,
-                interface=connection.interface,
-                level='warning'
-            )
 
-    return {'stale_connections': stale}
+@shared_task
+def prune_traffic_history():
+    """删除超过保留期的流量采样点与汇总（定时执行）"""
+    from apps.connections.models import TrafficRollup
+
+    return TrafficRollup.prune()
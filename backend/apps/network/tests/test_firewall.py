@@ -0,0 +1,88 @@
+"""代理端口防火墙测试
+
+匹配规则须位于主机实际过滤流量的链中，被外部清除后能重建，切换后端时清理旧的按端口规则。
+"""
+
+import json
+import subprocess
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.network.services import FirewallService
+
+IPSET_RULE = ['INPUT', '-p', 'tcp', '-m', 'set', '--match-set', 'socks_proxy_ports', 'dst', '-j', 'ACCEPT']
+
+
+class FakeHost:
+    """模拟 iptables / ipset / nft 命令，记录执行的命令与输入"""
+
+    def __init__(self, rule_present=True, input_rules=(), nft_rules=()):
+        self.rule_present = rule_present
+        self.input_rules = list(input_rules)
+        self.nft_rules = list(nft_rules)
+        self.calls = []
+
+    def run(self, cmd, input=None, **kwargs):
+        self.calls.append((cmd, input))
+        code, stdout = 0, ''
+        if cmd[:2] == ['iptables', '-C']:
+            code = 0 if self.rule_present else 1
+        elif cmd[:2] == ['iptables', '-S']:
+            stdout = '\n'.join(['-P INPUT DROP', *self.input_rules]) + '\n'
+        elif cmd[:3] == ['nft', '-j', 'list']:
+            stdout = json.dumps({'nftables': [{'rule': rule} for rule in self.nft_rules]})
+        return subprocess.CompletedProcess(cmd, code, stdout, '')
+
+    def inputs(self, prefix: list) -> list:
+        return [stdin for cmd, stdin in self.calls if cmd[:len(prefix)] == prefix]
+
+
+class FirewallTests(SimpleTestCase):
+
+    def _run(self, host: FakeHost, backend: str, action: str, ports: list) -> bool:
+        with mock.patch('apps.network.services.firewall.subprocess.run', side_effect=host.run):
+            return getattr(FirewallService(backend, 'inet filter input'), action)(ports)
+
+    def test_ipset_rule_rechecked_on_every_change(self):
+        host = FakeHost()
+        self.assertTrue(self._run(host, 'ipset', 'open_ports', [10800]))
+        host.rule_present = False  # iptables -F
+        self.assertTrue(self._run(host, 'ipset', 'open_ports', [10801]))
+
+        checks = [cmd for cmd, _ in host.calls if cmd[:2] == ['iptables', '-C']]
+        self.assertEqual(checks, [['iptables', '-C', *IPSET_RULE]] * 2)
+        self.assertEqual(host.inputs(['iptables-restore']), [f'*filter\n-I {" ".join(IPSET_RULE)}\nCOMMIT\n'])
+
+    @override_settings(PROXY_PORT_START=10800, PROXY_PORT_END=11900)
+    def test_sync_removes_legacy_per_port_rules(self):
+        host = FakeHost(input_rules=[
+            '-A INPUT -p tcp -m tcp --dport 22 -j ACCEPT',
+            '-A INPUT -p tcp -m tcp --dport 10800 -j ACCEPT',
+            '-A INPUT -p tcp -m tcp --dport 11900 -j ACCEPT',
+            '-A INPUT -p tcp -m set --match-set socks_proxy_ports dst -j ACCEPT',
+        ])
+        self.assertTrue(self._run(host, 'ipset', 'sync_ports', [10800]))
+        self.assertEqual(host.inputs(['iptables-restore'])[0], (
+            '*filter\n'
+            '-D INPUT -p tcp -m tcp --dport 10800 -j ACCEPT\n'
+            '-D INPUT -p tcp -m tcp --dport 11900 -j ACCEPT\n'
+            'COMMIT\n'
+        ))
+
+    def test_nft_inserts_rule_into_host_filter_chain(self):
+        host = FakeHost()
+        self.assertTrue(self._run(host, 'nft', 'open_ports', [10800]))
+        script = host.inputs(['nft', '-f'])[0]
+        self.assertIn('add set inet filter socks_proxy_ports { type inet_service; }', script)
+        self.assertIn(
+            'insert rule inet filter input tcp dport @socks_proxy_ports accept comment "socks_proxy_ports"', script
+        )
+        self.assertIn('delete table inet socks_proxy', script)
+        self.assertIn('add element inet filter socks_proxy_ports { 10800 }', script)
+
+    def test_nft_rule_not_duplicated(self):
+        host = FakeHost(nft_rules=[{'family': 'inet', 'table': 'filter', 'chain': 'input',
+                                    'comment': 'socks_proxy_ports'}])
+        self.assertTrue(self._run(host, 'nft', 'close_ports', [10800]))
+        self.assertNotIn('insert rule', host.inputs(['nft', '-f'])[0])
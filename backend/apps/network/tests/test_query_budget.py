@@ -0,0 +1,30 @@
+"""API 查询数预算测试
+
+以小数据规模运行 bench_api (外部服务已模拟)，任一端点的查询数随账号数增长或返回 5xx 时失败。
+"""
+
+import json
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+
+class QueryBudgetTests(TestCase):
+
+    def test_query_counts_do_not_grow_with_data(self):
+        stderr = StringIO()
+        with tempfile.NamedTemporaryFile(suffix='.json') as report:
+            try:
+                call_command(
+                    'bench_api', scales='5,50', connections=2, logs=2, repeat=1,
+                    json=report.name, stdout=StringIO(), stderr=stderr
+                )
+            except CommandError as e:
+                self.fail(f'{e}\n{stderr.getvalue()}')
+            results = json.load(report)['results']
+
+        errors = sorted({f'{r["method"]} {r["endpoint"]}: {r["status"]}' for r in results if r['status'] >= 500})
+        self.assertEqual(errors, [])
+        self.assertIn('proxy-start-all', {r['endpoint'] for r in results})
@@ -0,0 +1,66 @@
+"""策略路由同步范围测试
+
+ROUTING_TABLE_ID 默认范围 (100 - 2147483647) 覆盖其他程序的路由表 (如 wg-quick 的 51820)，
+同步只处理数据库或 rt_tables 中由本服务登记的表。
+"""
+
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.accounts.models import L2TPAccount
+from apps.connections.models import Connection
+from apps.network.models import ProxyConfig, RoutingTable
+from apps.network.services import RoutingReconciler, RoutingService
+
+PRIORITY = RoutingService.RULE_PRIORITY
+FOREIGN = 51820
+
+
+def _rule(table, src, priority=PRIORITY):
+    return {'priority': priority, 'src': src, 'fwmark': None, 'table': str(table)}
+
+
+def _route(table, gateway, dev):
+    return {'table': str(table), 'dst': 'default', 'gateway': gateway, 'dev': dev}
+
+
+class ReconcileScopeTests(TestCase):
+
+    def setUp(self):
+        account = L2TPAccount.objects.create(username='u0', password='x', assigned_ip='10.0.0.10')
+        ProxyConfig.objects.create(account=account, listen_port=10800, is_running=True)
+        RoutingTable.objects.create(account=account, table_id=1000, table_name=f'rt_user_{account.id}')
+        Connection.connect(account, interface='ppp0', peer_ip='10.0.0.1', local_ip='10.0.0.10')
+
+        self.routing = mock.MagicMock()
+        self.routing.mode = 'source'
+        self.routing.list_marks.return_value = {}
+        # 已删除账号遗留、仍在 rt_tables 中登记的表
+        self.routing.rt_tables.entries.return_value = {1001: 'rt_user_999', 200: 'custom'}
+
+    def _plan(self, rules: list, routes: list) -> list:
+        self.routing.list_rules.return_value = rules
+        self.routing.list_routes.return_value = routes
+        return RoutingReconciler(self.routing).plan()
+
+    def test_foreign_table_in_range_is_left_alone(self):
+        ops = self._plan(
+            rules=[_rule(FOREIGN, '10.8.0.2/32'), _rule(200, '10.9.0.2/32'), _rule(1000, '10.0.0.1/32')],
+            routes=[_route(FOREIGN, '10.8.0.1', 'wg0'), _route(200, '10.9.0.1', 'tun0'),
+                    _route(1000, '10.0.0.10', 'ppp0')],
+        )
+        self.assertEqual(ops, [])
+
+    def test_registered_tables_are_reconciled(self):
+        ops = self._plan(
+            rules=[_rule(1001, '10.0.0.1/32'), _rule(FOREIGN, '10.8.0.2/32')],
+            routes=[_route(1001, '10.0.0.11', 'ppp1'), _route(FOREIGN, '10.8.0.1', 'wg0')],
+        )
+        self.assertEqual(sorted(ops, key=str), sorted([
+            ('rule_del', 1001, '10.0.0.1/32', PRIORITY),
+            ('route_replace', 1000, '10.0.0.10', 'ppp0'),
+            ('route_flush', 1001),
+            ('rule_add', 1000, '10.0.0.1/32', PRIORITY),
+        ], key=str))
+        self.assertFalse([op for op in ops if FOREIGN in op])
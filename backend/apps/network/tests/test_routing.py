@@ -0,0 +1,88 @@
+"""fwmark 模式映射测试
+
+xl2tpd 为全部会话分配相同的服务器端地址 (local ip)，映射须以 PPP 接口区分账号。
+"""
+
+import json
+import subprocess
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from apps.accounts.models import L2TPAccount
+from apps.connections.models import Connection
+from apps.network.models import ProxyConfig, RoutingTable
+from apps.network.services import RoutingReconciler, RoutingService
+
+SERVER_IP = '10.0.0.1'
+
+
+def _nft_run(current: dict):
+    """模拟 nft 命令：list 返回 current 映射，-f 记录提交的脚本"""
+    scripts = []
+
+    def run(cmd, input=None, **kwargs):
+        if cmd[:3] == ['nft', '-j', 'list']:
+            elem = [[name, mark] for name, mark in current.items()]
+            stdout = json.dumps({'nftables': [{'map': {'name': RoutingService.NFT_MAP, 'elem': elem}}]})
+            return subprocess.CompletedProcess(cmd, 0, stdout, '')
+        scripts.append(input)
+        return subprocess.CompletedProcess(cmd, 0, '', '')
+
+    return run, scripts
+
+
+class FwmarkMapTests(SimpleTestCase):
+
+    def setUp(self):
+        self.routing = RoutingService(mode='fwmark')
+
+    def _apply(self, ops: list, current: dict | None = None) -> str:
+        run, scripts = _nft_run(current or {})
+        with mock.patch('apps.network.services.routing.subprocess.run', side_effect=run):
+            self.assertEqual(self.routing._nft_apply(list(enumerate(ops))), set())
+        return scripts[0]
+
+    def test_setup_keys_marks_by_interface(self):
+        marks = [
+            op for table_id, interface in ((1000, 'ppp0'), (1001, 'ppp1'))
+            for op in self.routing._setup_ops(table_id, SERVER_IP, f'10.0.0.{table_id - 990}', interface)[0]
+            if op[0] == 'mark_set'
+        ]
+        self.assertEqual(marks, [('mark_set', 1000, 'ppp0'), ('mark_set', 1001, 'ppp1')])
+
+    def test_shared_server_ip_keeps_every_account(self):
+        script = self._apply([('mark_set', 1000, 'ppp0'), ('mark_set', 1001, 'ppp1')])
+        self.assertIn('{ "ppp0" : 1000 }', script)
+        self.assertIn('{ "ppp1" : 1001 }', script)
+        self.assertNotIn('delete element', script)
+        self.assertIn('meta oifname map @oif_marks', script)
+
+    def test_remap_interface_replaces_element(self):
+        script = self._apply([('mark_set', 1001, 'ppp0')], current={'ppp0': 1000})
+        self.assertIn('delete element inet socks_proxy_route oif_marks { "ppp0" }', script)
+        self.assertIn('{ "ppp0" : 1001 }', script)
+
+    def test_unset_without_interface_removes_only_that_table(self):
+        script = self._apply([('mark_unset', 1000, None)], current={'ppp0': 1000, 'ppp1': 1001})
+        self.assertIn('{ "ppp0" }', script)
+        self.assertNotIn('{ "ppp1" }', script)
+
+    def test_unset_skips_interface_reused_by_other_account(self):
+        script = self._apply([('mark_unset', 1000, 'ppp0')], current={'ppp0': 1001})
+        self.assertNotIn('delete element', script)
+
+
+class FwmarkDesiredStateTests(TestCase):
+
+    def test_sessions_sharing_server_ip_get_separate_marks(self):
+        for i in range(2):
+            account = L2TPAccount.objects.create(username=f'u{i}', password='x', assigned_ip=f'10.0.0.{10 + i}')
+            ProxyConfig.objects.create(account=account, listen_port=10800 + i, is_running=True)
+            RoutingTable.objects.create(account=account, table_id=1000 + i, table_name=f'rt_user_{account.id}')
+            Connection.connect(account, interface=f'ppp{i}', peer_ip=SERVER_IP, local_ip=f'10.0.0.{10 + i}')
+
+        rules, routes, marks, _ = RoutingReconciler(RoutingService(mode='fwmark')).desired_state()
+        self.assertEqual(marks, {'ppp0': 1000, 'ppp1': 1001})
+        self.assertEqual(rules, {(1000, 1000), (1001, 1001)})
+        self.assertEqual(routes, {1000: ('10.0.0.10', 'ppp0'), 1001: ('10.0.0.11', 'ppp1')})
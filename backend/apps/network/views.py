@@ -1,5 +1,6 @@
 """网络配置视图"""
 
+from django.conf import settings
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, status, viewsets
 from rest_framework.decorators import action
@@ -10,15 +11,40 @@ from apps.accounts.models import L2TPAccount
 from apps.connections.models import Connection
 from apps.logs.models import SystemLog
 
-from .models import ProxyConfig, RoutingTable, ServerConfig
+from .models import ExitIPHistory, ProxyConfig, RoutingTable, ServerConfig
 from .serializers import (
     DashboardStatsSerializer,
+    ExitIPHistorySerializer,
     ProxyConfigCreateSerializer,
     ProxyConfigSerializer,
     RoutingTableSerializer,
     ServerConfigSerializer,
 )
-from .services import GostService, IPDetectService, RoutingService
+from .services import (
+    BulkProxyService,
+    ExitIPProber,
+    IPDetectService,
+    InterfaceInventory,
+    ProxyProbe,
+    RoutingReconciler,
+    RoutingService,
+    get_proxy_service,
+)
+
+
+def _flag(request, name: str) -> bool:
+    """解析请求中的布尔参数 (1/true/yes，不区分大小写)"""
+    return str(request.data.get(name, '')).lower() in ('1', 'true', 'yes')
+
+
+def _detect_exit_ips_async(proxy_ids: list):
+    """提交出口 IP 检测任务（不阻塞请求）"""
+    from .tasks import detect_exit_ips
+
+    try:
+        detect_exit_ips.apply_async((proxy_ids,), retry=False)
+    except Exception as e:
+        SystemLog.log_error('proxy', f'提交出口 IP 检测任务失败: {e}', details={'proxy_ids': proxy_ids})
 
 
 class ProxyConfigViewSet(viewsets.ModelViewSet):
@@ -36,7 +62,7 @@ class ProxyConfigViewSet(viewsets.ModelViewSet):
         return ProxyConfigSerializer
 
     def get_queryset(self):
-        return super().get_queryset().select_related('account')
+        return super().get_queryset().select_related('account__current_connection')
 
     @action(detail=True, methods=['post'])
     def start(self, request, pk=None):
@@ -70,35 +96,30 @@ class ProxyConfigViewSet(viewsets.ModelViewSet):
                 peer_ip=client_ip
             )
 
-            # 2. 启动 Gost，绑定到服务器 PPP IP
-            gost_service = GostService()
-            pid = gost_service.start(
+            # 2. 启动代理，绑定到服务器 PPP IP
+            proxy_service = get_proxy_service(proxy.backend)
+            pid = proxy_service.start(
                 port=proxy.listen_port,
                 bind_ip=server_ppp_ip,
                 interface=connection.interface
             )
 
             proxy.gost_pid = pid
+            proxy.gost_worker = proxy_service.get_worker(proxy.listen_port)
             proxy.is_running = True
             proxy.save()
 
-            # 3. 检测出口 IP（延迟执行以确保代理已就绪）
-            import time
-            exit_ip = None
-            for attempt in range(3):
-                time.sleep(2)
-                exit_ip = IPDetectService.get_exit_ip_via_proxy(proxy.listen_port)
-                if exit_ip:
-                    proxy.exit_ip = exit_ip
-                    proxy.save(update_fields=['exit_ip'])
-                    break
+            # 3. 等待监听就绪，出口 IP 由后台任务检测
+            ready = ProxyProbe.wait_ready(proxy.listen_port)
+            _detect_exit_ips_async([proxy.id])
 
             return Response({
                 'message': '代理启动成功',
                 'pid': pid,
                 'port': proxy.listen_port,
                 'bind_ip': server_ppp_ip,
-                'exit_ip': exit_ip,
+                'ready': ready,
+                'exit_ip': proxy.exit_ip,
                 'exit_via': client_ip
             })
 
@@ -116,9 +137,9 @@ class ProxyConfigViewSet(viewsets.ModelViewSet):
             return Response({'error': '代理未在运行'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # 1. 停止 Gost
-            gost_service = GostService()
-            gost_service.stop(proxy.listen_port)
+            # 1. 停止代理
+            proxy_service = get_proxy_service(proxy.backend)
+            proxy_service.stop(proxy.listen_port)
 
             # 2. 清理策略路由
             try:
@@ -135,6 +156,7 @@ class ProxyConfigViewSet(viewsets.ModelViewSet):
                 pass  # 路由清理失败不影响停止操作
 
             proxy.gost_pid = None
+            proxy.gost_worker = None
             proxy.is_running = False
             proxy.exit_ip = None
             proxy.save()
@@ -171,34 +193,29 @@ class ProxyConfigViewSet(viewsets.ModelViewSet):
                 peer_ip=client_ip
             )
 
-            # 2. 重启 Gost
-            gost_service = GostService()
-            pid = gost_service.restart(
+            # 2. 重启代理
+            proxy_service = get_proxy_service(proxy.backend)
+            pid = proxy_service.restart(
                 port=proxy.listen_port,
                 bind_ip=server_ppp_ip,
                 interface=connection.interface
             )
 
             proxy.gost_pid = pid
+            proxy.gost_worker = proxy_service.get_worker(proxy.listen_port)
             proxy.is_running = True
             proxy.save()
 
-            # 3. 检测出口 IP
-            import time
-            exit_ip = None
-            for attempt in range(3):
-                time.sleep(2)
-                exit_ip = IPDetectService.get_exit_ip_via_proxy(proxy.listen_port)
-                if exit_ip:
-                    proxy.exit_ip = exit_ip
-                    proxy.save(update_fields=['exit_ip'])
-                    break
+            # 3. 等待监听就绪，出口 IP 由后台任务检测
+            ready = ProxyProbe.wait_ready(proxy.listen_port)
+            _detect_exit_ips_async([proxy.id])
 
             return Response({
                 'message': '代理重启成功',
                 'pid': pid,
                 'bind_ip': server_ppp_ip,
-                'exit_ip': exit_ip,
+                'ready': ready,
+                'exit_ip': proxy.exit_ip,
                 'exit_via': client_ip
             })
 
@@ -210,13 +227,14 @@ class ProxyConfigViewSet(viewsets.ModelViewSet):
     def status(self, request, pk=None):
         """获取代理状态"""
         proxy = self.get_object()
-        gost_service = GostService()
-        status_info = gost_service.get_status(proxy.listen_port)
+        proxy_service = get_proxy_service(proxy.backend)
+        status_info = proxy_service.get_status(proxy.listen_port)
 
         # 同步状态
         if status_info['running'] != proxy.is_running:
             proxy.is_running = status_info['running']
             proxy.gost_pid = status_info['pid']
+            proxy.gost_worker = status_info.get('worker') if status_info['running'] else None
             proxy.save()
 
         return Response(status_info)
@@ -230,99 +248,54 @@ class ProxyConfigViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def start_all(self, request):
-        """启动所有可用代理"""
-        import time
-        gost_service = GostService()
-        routing_service = RoutingService()
-        started = 0
-        failed = 0
-        started_proxies = []
-
-        for proxy in ProxyConfig.objects.filter(is_running=False, auto_start=True):
-            account = proxy.account
-            if not account.is_online:
-                continue
+        """批量启动所有可用代理，返回任务 ID 与逐代理结果"""
+        job = BulkProxyService().start(ProxyConfig.objects.filter(is_running=False, auto_start=True))
 
-            try:
-                connection = account.current_connection
-                routing_table = account.routing_table
-                server_ppp_ip = connection.peer_ip
-                client_ip = connection.local_ip
-
-                # 配置策略路由
-                routing_service.setup_source_routing(
-                    interface=connection.interface,
-                    table_id=routing_table.table_id,
-                    table_name=routing_table.table_name,
-                    local_ip=server_ppp_ip,
-                    peer_ip=client_ip
-                )
-
-                # 启动 Gost
-                pid = gost_service.start(
-                    port=proxy.listen_port,
-                    bind_ip=server_ppp_ip,
-                    interface=connection.interface
-                )
-                proxy.gost_pid = pid
-                proxy.is_running = True
-                proxy.save()
-                started += 1
-                started_proxies.append(proxy)
-            except Exception:
-                failed += 1
-
-        # 等待代理就绪后检测出口 IP
-        if started_proxies:
-            time.sleep(3)
-            for proxy in started_proxies:
-                try:
-                    exit_ip = IPDetectService.get_exit_ip_via_proxy(proxy.listen_port)
-                    if exit_ip:
-                        proxy.exit_ip = exit_ip
-                        proxy.save(update_fields=['exit_ip'])
-                except Exception:
-                    pass
-
-        return Response({'started': started, 'failed': failed})
+        # 出口 IP 由后台任务在代理就绪后检测
+        started_ids = [r['id'] for r in job['results'] if r['status'] == 'started']
+        if started_ids:
+            _detect_exit_ips_async(started_ids)
 
-    @action(detail=False, methods=['post'])
-    def stop_all(self, request):
-        """停止所有运行中的代理"""
-        gost_service = GostService()
-        stopped = 0
+        return Response(job)
 
-        for proxy in ProxyConfig.objects.filter(is_running=True):
-            try:
-                gost_service.stop(proxy.listen_port)
-                proxy.gost_pid = None
-                proxy.is_running = False
-                proxy.save()
-                stopped += 1
-            except Exception:
-                pass
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[0-9a-f]{32})')
+    def job(self, request, job_id=None):
+        """查询批量任务结果"""
+        job = BulkProxyService.get_job(job_id)
+        if job is None:
+            return Response({'error': '任务不存在或已过期'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job)
 
-        return Response({'stopped': stopped})
+    @action(detail=False, methods=['post'])
+    def stop_all(self, request):
+        """批量停止所有运行中的代理并清理源路由，返回任务 ID 与逐代理结果"""
+        return Response(BulkProxyService().stop(ProxyConfig.objects.filter(is_running=True)))
 
     @action(detail=False, methods=['post'])
     def refresh_exit_ips(self, request):
-        """刷新所有运行中代理的出口 IP"""
-        updated = 0
-        failed = 0
+        """刷新所有运行中代理的出口 IP（并发检测，一次写回；force=true 时忽略缓存）"""
+        force = _flag(request, 'force')
+        result = ExitIPProber().refresh(ProxyConfig.objects.filter(is_running=True), force=force)
 
-        for proxy in ProxyConfig.objects.filter(is_running=True):
-            try:
-                exit_ip = IPDetectService.get_exit_ip_via_proxy(proxy.listen_port)
-                if exit_ip:
-                    proxy.exit_ip = exit_ip
-                    proxy.save(update_fields=['exit_ip'])
-                    updated += 1
-                else:
-                    failed += 1
-            except Exception:
-                failed += 1
+        return Response(result)
+
+    @action(detail=False, methods=['get'])
+    def shared_exit_ips(self, request):
+        """当前被多个代理共用的出口 IP"""
+        from datetime import timedelta
 
-        return Response({'updated': updated, 'failed': failed})
+        from django.utils import timezone
+
+        since = timezone.now() - timedelta(seconds=settings.EXIT_IP_CACHE_TTL)
+        return Response(ExitIPHistory.shared_ips(since))
+
+    @action(detail=True, methods=['get'])
+    def exit_ip_history(self, request, pk=None):
+        """代理出口 IP 变更历史"""
+        proxy = self.get_object()
+        history = proxy.exit_ip_history.order_by('-first_seen')
+        serializer = ExitIPHistorySerializer(history, many=True)
+        return Response({'count': len(serializer.data), 'results': serializer.data})
 
 
 class RoutingTableViewSet(viewsets.ReadOnlyModelViewSet):
@@ -336,6 +309,12 @@ class RoutingTableViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         return super().get_queryset().select_related('account')
 
+    @action(detail=False, methods=['post'])
+    def reconcile(self, request):
+        """按数据库状态同步内核策略路由，dry_run 时只返回差异"""
+        dry_run = _flag(request, 'dry_run')
+        return Response(RoutingReconciler().reconcile(dry_run=dry_run))
+
 
 class DashboardView(APIView):
     """看板数据接口"""
@@ -350,8 +329,7 @@ class DashboardView(APIView):
         # 获取 PPP 接口列表（容器内可能没有 ip 命令，需要捕获异常）
         ppp_interfaces = []
         try:
-            routing_service = RoutingService()
-            ppp_interfaces = routing_service.list_ppp_interfaces()
+            ppp_interfaces = InterfaceInventory().names()
         except Exception:
             # 在 Docker 容器中可能没有网络工具，忽略错误
             pass
@@ -1,4 +1,8 @@
 """L2TP Socks5 代理池管理系统 - 后端配置"""
 
+from .celery import app as celery_app
+
 __version__ = "1.1.0"
 __author__ = "L2TP Socks5 Proxy Pool"
+
+__all__ = ['celery_app']
@@ -3,6 +3,7 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_process_shutdown
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
@@ -14,3 +15,11 @@ app.autodiscover_tasks()
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
+
+
+@worker_process_shutdown.connect
+def flush_system_logs(**kwargs):
+    """prefork 子进程退出时不执行 atexit，在此写入缓冲中的系统日志"""
+    from apps.logs.buffer import get_log_buffer
+
+    get_log_buffer().flush()
@@ -3,6 +3,7 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -126,13 +127,88 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'prune-traffic-history': {
+        'task': 'apps.network.tasks.prune_traffic_history',
+        'schedule': 3600,
+    },
+}
+# 策略路由定时同步间隔 (秒)，0 关闭；由 netmon 执行
+ROUTING_RECONCILE_INTERVAL = int(os.getenv('ROUTING_RECONCILE_INTERVAL', '60'))
+
+# PPP 接口清单缓存有效期 (秒)；netmon 在 netlink 不可用时扫描 sysfs 的间隔 (秒)
+INTERFACE_CACHE_TTL = int(os.getenv('INTERFACE_CACHE_TTL', '10'))
+INTERFACE_SCAN_INTERVAL = float(os.getenv('INTERFACE_SCAN_INTERVAL', '2'))
+# 接口流量采样间隔 (秒)、每个接口保留的样本数、速率计算窗口 (秒)
+TRAFFIC_SAMPLE_INTERVAL = float(os.getenv('TRAFFIC_SAMPLE_INTERVAL', '2'))
+TRAFFIC_RING_SIZE = int(os.getenv('TRAFFIC_RING_SIZE', '150'))
+TRAFFIC_RATE_WINDOW = float(os.getenv('TRAFFIC_RATE_WINDOW', '10'))
+# 流量历史：原始采样点间隔 (秒)；原始点与分钟/小时/天汇总的保留天数，0 为永久
+TRAFFIC_RAW_INTERVAL = int(os.getenv('TRAFFIC_RAW_INTERVAL', '10'))
+TRAFFIC_RAW_RETENTION_DAYS = int(os.getenv('TRAFFIC_RAW_RETENTION_DAYS', '1'))
+TRAFFIC_MINUTE_RETENTION_DAYS = int(os.getenv('TRAFFIC_MINUTE_RETENTION_DAYS', '7'))
+TRAFFIC_HOUR_RETENTION_DAYS = int(os.getenv('TRAFFIC_HOUR_RETENTION_DAYS', '180'))
+TRAFFIC_DAY_RETENTION_DAYS = int(os.getenv('TRAFFIC_DAY_RETENTION_DAYS', '0'))
+# 系统日志缓冲写入：队列上限 (0 为每条同步写入)、每批写入条数、最长写入间隔 (秒)
+LOG_BUFFER_SIZE = int(os.getenv('LOG_BUFFER_SIZE', '10000'))
+LOG_BUFFER_BATCH = int(os.getenv('LOG_BUFFER_BATCH', '500'))
+LOG_BUFFER_INTERVAL = float(os.getenv('LOG_BUFFER_INTERVAL', '1'))
+# 队列积压策略: drop (队列满后丢弃) | sample (积压过半后 info/debug 日志每 LOG_BUFFER_SAMPLE 条保留 1 条)
+LOG_BUFFER_POLICY = os.getenv('LOG_BUFFER_POLICY', 'sample')
+LOG_BUFFER_SAMPLE = int(os.getenv('LOG_BUFFER_SAMPLE', '10'))
+
+# Cache (批量任务结果、流量速率、接口状态)，须为各进程共享的 Redis；
+# 进程内缓存无法跨 worker / 容器读取，仅 DEBUG 下未设置 CACHE_URL 时使用
+CACHE_URL = os.getenv('CACHE_URL', '')
+if not CACHE_URL and not DEBUG:
+    raise ImproperlyConfigured('CACHE_URL 未设置：生产环境须使用共享缓存 (如 redis://localhost:6379/1)')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
 
 # Proxy Pool Settings
 PROXY_IP_POOL_START = os.getenv('PROXY_IP_POOL_START', '10.0.0.2')
 PROXY_IP_POOL_END = os.getenv('PROXY_IP_POOL_END', '10.0.3.254')
+# 账号 IP 地址池 (逗号分隔，起止范围或 CIDR)，留空使用 PROXY_IP_POOL_START - PROXY_IP_POOL_END
+PROXY_IP_POOLS = [
+    pool.strip() for pool in os.getenv('PROXY_IP_POOLS', '').split(',') if pool.strip()
+] or [f'{PROXY_IP_POOL_START}-{PROXY_IP_POOL_END}']
 PROXY_PORT_START = int(os.getenv('PROXY_PORT_START', '10800'))
 PROXY_PORT_END = int(os.getenv('PROXY_PORT_END', '11900'))
 PROXY_LOCAL_IP = os.getenv('PROXY_LOCAL_IP', '10.0.0.1')
+# 策略路由表 ID 范围 (数字表直接使用，无需写入 rt_tables；上限受数据库 integer 限制)
+ROUTING_TABLE_ID_START = int(os.getenv('ROUTING_TABLE_ID_START', '100'))
+ROUTING_TABLE_ID_END = int(os.getenv('ROUTING_TABLE_ID_END', '2147483647'))
+# 策略路由变更方式: netlink (rtnetlink 套接字) | iproute2 (调用 ip 命令)
+ROUTING_BACKEND = os.getenv('ROUTING_BACKEND', 'netlink')
+# 出口路由表匹配方式: source (每账号一条源地址规则) | fwmark (nftables 按出口 PPP 接口打标记，每账号一条 mark 规则选表)
+ROUTING_MODE = os.getenv('ROUTING_MODE', 'source')
+# 启动代理后等待监听可用 (Socks5 握手成功) 的最长秒数
+PROXY_READY_TIMEOUT = float(os.getenv('PROXY_READY_TIMEOUT', '5'))
+# 批量停止代理时等待进程退出的最长秒数，超时后强制结束
+PROXY_STOP_TIMEOUT = float(os.getenv('PROXY_STOP_TIMEOUT', '5'))
+
+# 出口 IP 检测：经代理并发请求的 IP 回显地址 (逗号分隔，返回纯文本 IP)
+EXIT_IP_ECHO_URLS = [u.strip() for u in (
+    os.getenv('EXIT_IP_ECHO_URLS')
+    or 'https://ifconfig.me/ip,https://icanhazip.com,https://ipecho.net/plain,'
+       'https://checkip.amazonaws.com,https://api.ipify.org,https://ip.3322.net'
+).split(',') if u.strip()]
+# 同时检测的代理数
+EXIT_IP_CONCURRENCY = int(os.getenv('EXIT_IP_CONCURRENCY', '64'))
+# 单个代理的检测超时 (秒)
+EXIT_IP_TIMEOUT = float(os.getenv('EXIT_IP_TIMEOUT', '10'))
+# 出口 IP 缓存有效期 (秒)：PPP 会话未变化且未过期时不重新检测
+EXIT_IP_CACHE_TTL = int(os.getenv('EXIT_IP_CACHE_TTL', '3600'))
+
+# 批量启动：并发启动监听的线程数、任务结果保留秒数
+BULK_START_WORKERS = int(os.getenv('BULK_START_WORKERS', '32'))
+BULK_JOB_TTL = int(os.getenv('BULK_JOB_TTL', '3600'))
 
 # PPP Hook Token
 PPP_HOOK_TOKEN = os.getenv('PPP_HOOK_TOKEN', 'your-secret-token-change-me')
@@ -141,6 +217,29 @@ PPP_HOOK_TOKEN = os.getenv('PPP_HOOK_TOKEN', 'your-secret-token-change-me')
 GOST_BIN_PATH = os.getenv('GOST_BIN_PATH', '/usr/local/bin/gost')
 GOST_LOG_DIR = os.getenv('GOST_LOG_DIR', '/var/log/gost')
 GOST_PID_DIR = os.getenv('GOST_PID_DIR', '/var/run/gost')
+# 运行模式: process = 每个端口一个 Gost 进程; cluster = 少量 Worker 进程承载全部端口
+GOST_MODE = os.getenv('GOST_MODE', 'process')
+GOST_WORKERS = int(os.getenv('GOST_WORKERS', '0')) or os.cpu_count() or 1
+GOST_API_PORT_START = int(os.getenv('GOST_API_PORT_START', '18080'))
+# 进程监管服务 Socket (manage.py gost_supervisor)，为空则由 Web/Celery 进程直接派生 Gost
+GOST_SUPERVISOR_SOCKET = os.getenv('GOST_SUPERVISOR_SOCKET', '')
+GOST_RESTART_BACKOFF_BASE = float(os.getenv('GOST_RESTART_BACKOFF_BASE', '1'))
+GOST_RESTART_BACKOFF_MAX = float(os.getenv('GOST_RESTART_BACKOFF_MAX', '60'))
+
+# 内置 Socks5 引擎 (manage.py socks5_server)，ProxyConfig.backend = socks5 时使用
+SOCKS5_RUN_DIR = os.getenv('SOCKS5_RUN_DIR', '/var/run/socks5')
+SOCKS5_WORKERS = int(os.getenv('SOCKS5_WORKERS', '0')) or os.cpu_count() or 1
+# 每个监听端口每个 Worker 的最大并发连接数，0 表示不限制
+SOCKS5_MAX_CONNECTIONS = int(os.getenv('SOCKS5_MAX_CONNECTIONS', '0'))
+SOCKS5_HANDSHAKE_TIMEOUT = float(os.getenv('SOCKS5_HANDSHAKE_TIMEOUT', '10'))
+SOCKS5_CONNECT_TIMEOUT = float(os.getenv('SOCKS5_CONNECT_TIMEOUT', '10'))
+# 数据转发模式: auto (支持时使用 splice) / splice (零拷贝) / copy (用户态缓冲区复用)
+SOCKS5_RELAY_MODE = os.getenv('SOCKS5_RELAY_MODE', 'auto')
+
+# 代理端口防火墙后端: ipset (端口集合 + 单条 iptables 规则) / nft (nftables 集合) / iptables (每端口一条规则)
+FIREWALL_BACKEND = os.getenv('FIREWALL_BACKEND', 'ipset')
+# nft 后端插入匹配规则的主机输入过滤链: "<family> <table> <chain>"
+FIREWALL_NFT_CHAIN = os.getenv('FIREWALL_NFT_CHAIN', 'inet filter input')
 
 # Logging
 LOGGING = {
@@ -44,6 +44,7 @@ install_dependencies() {
         libstrongswan-extra-plugins \
         ppp \
         iptables \
+        ipset \
         iproute2 \
         curl \
         wget \
@@ -1,5 +1,5 @@
 import request from '@/utils/request'
-import type { ProxyConfig, PaginatedResponse, ServerConfig } from '@/types'
+import type { BulkJob, ProxyConfig, PaginatedResponse, ServerConfig } from '@/types'
 
 export const serverConfigApi = {
   get: () =>
@@ -29,13 +29,13 @@ export const proxyApi = {
     request.delete(`/api/proxies/${id}/`),
 
   start: (id: number) =>
-    request.post<any, { message: string; pid: number; port: number; exit_ip: string | null }>(`/api/proxies/${id}/start/`),
+    request.post<any, { message: string; pid: number; port: number; ready: boolean; exit_ip: string | null }>(`/api/proxies/${id}/start/`),
 
   stop: (id: number) =>
     request.post<any, { message: string }>(`/api/proxies/${id}/stop/`),
 
   restart: (id: number) =>
-    request.post<any, { message: string; pid: number; exit_ip: string | null }>(`/api/proxies/${id}/restart/`),
+    request.post<any, { message: string; pid: number; ready: boolean; exit_ip: string | null }>(`/api/proxies/${id}/restart/`),
 
   getStatus: (id: number) =>
     request.get<any, { port: number; running: boolean; pid: number | null }>(`/api/proxies/${id}/status/`),
@@ -44,11 +44,14 @@ export const proxyApi = {
     request.get<any, ProxyConfig[]>('/api/proxies/running/'),
 
   startAll: () =>
-    request.post<any, { started: number; failed: number }>('/api/proxies/start_all/'),
+    request.post<any, BulkJob>('/api/proxies/start_all/'),
+
+  getJob: (jobId: string) =>
+    request.get<any, BulkJob>(`/api/proxies/jobs/${jobId}/`),
 
   stopAll: () =>
-    request.post<any, { stopped: number }>('/api/proxies/stop_all/'),
+    request.post<any, BulkJob>('/api/proxies/stop_all/'),
 
-  refreshExitIPs: () =>
-    request.post<any, { updated: number; failed: number }>('/api/proxies/refresh_exit_ips/')
+  refreshExitIPs: (force = false) =>
+    request.post<any, { updated: number; cached: number; failed: number }>('/api/proxies/refresh_exit_ips/', { force })
 }
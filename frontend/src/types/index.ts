@@ -56,6 +56,8 @@ export interface AccountConnectionSummary {
   total_bytes_sent: number
   total_bytes_received: number
   total_bytes: number
+  send_rate: number
+  receive_rate: number
   connection_count: number
 }
 
@@ -66,8 +68,10 @@ export interface ProxyConfig {
   username: string
   assigned_ip: string
   listen_port: number
+  backend: 'gost' | 'socks5'
   is_running: boolean
   gost_pid: number | null
+  gost_worker: number | null
   exit_ip: string | null
   auto_start: boolean
   is_online: boolean
@@ -75,6 +79,24 @@ export interface ProxyConfig {
   updated_at: string
 }
 
+// 批量操作结果
+export interface BulkJobResult {
+  id: number
+  port: number
+  account: string
+  status: 'started' | 'stopped' | 'failed' | 'skipped'
+  error: string
+}
+
+export interface BulkJob {
+  job_id: string
+  started?: number
+  stopped?: number
+  failed: number
+  skipped?: number
+  results: BulkJobResult[]
+}
+
 // 路由表相关类型
 export interface RoutingTable {
   id: number
@@ -46,6 +46,7 @@ install_dependencies() {
         libstrongswan-extra-plugins \
         ppp \
         iptables \
+        ipset \
         iproute2 \
         curl \
         wget \